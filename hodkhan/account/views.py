@@ -1,9 +1,8 @@
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from app.models import Article, Feed
+from app import event_log, user_stats
 from django.shortcuts import render, redirect
 from .forms import SignupForm, LoginForm
-import sqlite3
 import os
 
 
@@ -78,31 +77,14 @@ def csrf_failure(requests, reason=""):
 
 @login_required(login_url='/account/login')
 def account(requests):
-    article = len(Article.objects.all())
-    feed = len(Feed.objects.all())
-    from pathlib import Path
-    DB_PATH = Path(__file__).resolve().parent.parent / 'db.sqlite3'
-    conn = sqlite3.connect(DB_PATH)
-    q = (
-        "SELECT i.article_id FROM app_interaction i "
-        "LEFT JOIN auth_user u ON i.user_id = u.id "
-        "WHERE u.username = ? AND i.type = 'read' OR i.type = 'view'"
-    )
-    viewed = conn.execute(q, (requests.user.username,))
-    viewed = len(viewed.fetchall())
-    q = (
-        "SELECT i.article_id FROM app_interaction i "
-        "LEFT JOIN auth_user u ON i.user_id = u.id "
-        "WHERE u.username = ? AND i.type = 'like'"
-    )
-    liked = conn.execute(q, (requests.user.username,))
-    liked = len(liked.fetchall())
+    stats = user_stats.get(requests.user)
     return render(
         requests,
         "account.html",
         context={
-            "viewed": viewed,
-            "liked": liked
+            "viewed": stats.viewed,
+            "liked": stats.liked,
+            "followed_feeds": stats.followed_feeds,
         },
     )
 
@@ -110,17 +92,7 @@ def account(requests):
 @login_required(login_url='/account/login')
 def deleteFeed(requests):
     username = requests.user.username
-    from pathlib import Path
-    DB_PATH = Path(__file__).resolve().parent.parent / 'db.sqlite3'
-    conn = sqlite3.connect(DB_PATH)
-    sql = (
-        "DELETE FROM app_interaction WHERE user_id IN (SELECT id FROM auth_user "
-        "WHERE username = ?) "
-        "AND type = 'view'"
-    )
-    conn.execute(sql, (username,))
-    conn.commit()
-    conn.close()
+    event_log.forget_views([requests.user.pk])
     if os.path.exists(f"./../pickles/{username}_MLP.pkl"):
         # os.remove(f"./../pickles/{username}_agency.pkl")
         os.remove(f"./../pickles/{username}_MLP.pkl")
@@ -1,4 +1,4 @@
-from .models import Article, Keyword, Feed, Interaction, UserFeed
+from .models import Article, ArticleContent, Keyword, Feed, Interaction, UserFeed
 from django.contrib import admin
 
 admin.site.register(Feed)
@@ -6,3 +6,4 @@ admin.site.register(Keyword)
 admin.site.register(Article)
 admin.site.register(Interaction)
 admin.site.register(UserFeed)
+admin.site.register(ArticleContent)
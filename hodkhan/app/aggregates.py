@@ -0,0 +1,59 @@
+"""
+Running centroids of article embeddings per feed and per keyword.
+
+``Feed.vector`` / ``Keyword.vector`` hold the mean of every embedding folded
+in so far and ``vector_count`` how many that was, so a new article updates
+a centroid in O(1) with the streaming mean ``m += (x - m) / n``.
+"""
+from collections import defaultdict
+
+import numpy as np
+
+from app.models import Article, Feed, Keyword
+from app.vector_index import format_vector, parse_vector
+
+
+def fold(obj, total, count):
+    """Fold ``count`` new vectors summing to ``total`` into ``obj``'s running mean."""
+    mean = parse_vector(obj.vector) if obj.vector_count else None
+    if mean is None or len(mean) != len(total):
+        mean, obj.vector_count = np.zeros_like(total), 0
+    n = obj.vector_count + count
+    mean += (total - count * mean) / n
+    obj.vector = format_vector(mean)
+    obj.vector_count = n
+
+
+def _accumulate(pairs):
+    sums, counts = {}, defaultdict(int)
+    for key, vector in pairs:
+        key = str(key)
+        sums[key] = sums[key] + vector if key in sums else np.array(vector, dtype=np.float32)
+        counts[key] += 1
+    return sums, counts
+
+
+def _apply(model, sums, counts):
+    objs = list(model.objects.filter(id__in=list(sums)))
+    for obj in objs:
+        fold(obj, sums[str(obj.id)], counts[str(obj.id)])
+    model.objects.bulk_update(objs, ['vector', 'vector_count'])
+    return len(objs)
+
+
+def update_centroids(articles):
+    """
+    Fold saved articles carrying an ``embedding`` into their feed and keyword
+    centroids.  One read and one bulk update per model, however many articles.
+    """
+    articles = [a for a in articles if getattr(a, 'embedding', None) is not None]
+    if not articles:
+        return 0, 0
+    embedding_of = {str(a.id): np.asarray(a.embedding, dtype=np.float32) for a in articles}
+
+    feed_sums, feed_counts = _accumulate((a.feed_id, embedding_of[str(a.id)]) for a in articles)
+    links = Article.keyword.through.objects.filter(article_id__in=list(embedding_of)) \
+        .values_list('article_id', 'keyword_id')
+    keyword_sums, keyword_counts = _accumulate((k, embedding_of[str(a)]) for a, k in links)
+
+    return _apply(Feed, feed_sums, feed_counts), _apply(Keyword, keyword_sums, keyword_counts)
@@ -6,3 +6,7 @@ class AppConfig(Config):
     name = 'app'
     label = 'app'
 
+
+    def ready(self):
+        from app import databases  # noqa: F401  registers the SQLite connection setup
+        from app import response_cache  # noqa: F401  registers the shared cache check
@@ -0,0 +1,75 @@
+"""
+Retention: old articles move out of the hot tables.
+
+The feed, search and the vector index only look at recent articles, but
+``Article`` kept every row ever crawled together with its embedding as
+text.  ``archive`` moves articles published before the retention window to
+``ArchivedArticle``: the text fields stay so old links keep resolving,
+keywords are flattened to their names and the embedding is quantized to
+int8 (a quarter of float32, a small fraction of the text form).  Each
+user's engagement with them moves to ``ArchivedAggregate`` so the
+regressor's training data and the account counters survive; the raw
+interaction history, cached reader HTML and keyword links are dropped with
+the article.
+"""
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from app.models import ArchivedAggregate, ArchivedArticle, Article, InteractionAggregate
+from app.stories import promote_duplicates
+from app.vector_index import parse_vector
+
+
+def quantize(vector):
+    """``(bytes, scale)`` of ``vector`` as symmetric int8, or ``(None, None)`` without a vector."""
+    if vector is None:
+        return None, None
+    vector = np.asarray(vector, dtype=np.float32)
+    scale = float(np.abs(vector).max()) / 127 or 1.0
+    return np.round(vector / scale).astype(np.int8).tobytes(), scale
+
+
+def dequantize(data, scale):
+    if data is None:
+        return None
+    return np.frombuffer(bytes(data), dtype=np.int8).astype(np.float32) * scale
+
+
+def retention_cutoff(days=None):
+    days = settings.ARTICLE_RETENTION_DAYS if days is None else days
+    return int(time.time()) - int(days * 86400)
+
+
+def archive(before, batch_size=500):
+    """
+    Move up to ``batch_size`` articles published before ``before`` to the
+    archive in one transaction.  Returns how many were moved; call until 0.
+    """
+    with transaction.atomic():
+        articles = list(Article.objects.filter(published__lt=before).order_by('id')
+                        .prefetch_related('keyword')[:batch_size])
+        if not articles:
+            return 0
+        ids = [a.id for a in articles]
+
+        archived = []
+        for a in articles:
+            vector, scale = quantize(parse_vector(a.vector))
+            archived.append(ArchivedArticle(
+                id=a.id, public_id=a.public_id, title=a.title, abstract=a.abstract, feed_id=a.feed_id,
+                keywords=[k.name for k in a.keyword.all()], link=a.link, published=a.published, cover=a.cover,
+                vector=vector, vector_scale=scale,
+            ))
+        # Conflicts only happen when a previous run died between these inserts and the delete
+        ArchivedArticle.objects.bulk_create(archived, batch_size=500, ignore_conflicts=True)
+        ArchivedAggregate.objects.bulk_create([
+            ArchivedAggregate(user_id=g.user_id, article_id=g.article_id, liked=g.liked, read=g.read, view=g.view,
+                              reads=g.reads, views=g.views)
+            for g in InteractionAggregate.objects.filter(article_id__in=ids)
+        ], batch_size=500, ignore_conflicts=True)
+        promote_duplicates(ids)
+        Article.objects.filter(id__in=ids).delete()
+    return len(articles)
@@ -0,0 +1,105 @@
+"""
+Store of extracted reader HTML for articles.
+
+The article page is fetched and run through ``process_html`` once; the
+result is kept zlib-compressed in ``ArticleContent`` and served from there.
+After ``READER_CONTENT_MAX_AGE`` seconds the stored copy is still served and
+the source is revalidated in the background with a conditional GET, only
+re-extracted when it actually changed.
+"""
+import hashlib
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from app import http_client
+from app.models import ArticleContent
+
+# Background revalidation: each stale article is queued at most once
+_revalidator = ThreadPoolExecutor(max_workers=2, thread_name_prefix='revalidate')
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+
+def _decode(content):
+    return zlib.decompress(bytes(content.html)).decode('utf-8')
+
+
+def _fetch(url, content=None):
+    headers = {}
+    if content is not None:
+        if content.etag:
+            headers['If-None-Match'] = content.etag
+        if content.last_modified:
+            headers['If-Modified-Since'] = content.last_modified
+    return http_client.get(url, headers=headers)
+
+
+def refresh(article, content=None):
+    """Fetch the source page and (re-)extract it unless it is unchanged."""
+    response = _fetch(article.link, content)
+    now = timezone.now()
+    if content is not None and response.status_code == 304:
+        ArticleContent.objects.filter(pk=content.pk).update(checked_at=now)
+        return _decode(content)
+    response.raise_for_status()
+
+    digest = hashlib.sha256(response.content).hexdigest()
+    if content is not None and content.digest == digest:
+        ArticleContent.objects.filter(pk=content.pk).update(checked_at=now)
+        return _decode(content)
+    return store(article, response, digest)
+
+
+def store(article, response, digest=None):
+    """Extract and store an already fetched source page of ``article``."""
+    from app.management.commands.crawler_tool import process_html
+
+    html = process_html(response.text).strip()
+    ArticleContent.objects.update_or_create(article=article, defaults={
+        'html': zlib.compress(html.encode('utf-8'), 6),
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'digest': digest or hashlib.sha256(response.content).hexdigest(),
+        'checked_at': timezone.now(),
+    })
+    return html
+
+
+def _revalidate(article, content):
+    try:
+        refresh(article, content)
+    except requests.RequestException:
+        pass
+    finally:
+        with _revalidating_lock:
+            _revalidating.discard(article.pk)
+        connection.close()
+
+
+def revalidate_later(article, content):
+    """Queue a background revalidation of ``article`` unless one is already pending."""
+    with _revalidating_lock:
+        if article.pk in _revalidating:
+            return
+        _revalidating.add(article.pk)
+    _revalidator.submit(_revalidate, article, content)
+
+
+def get_reader_html(article, max_age=None):
+    """
+    Reader HTML for ``article``: from the store, revalidated in the background
+    once older than ``max_age``.  Only the first view fetches the page.
+    """
+    max_age = settings.READER_CONTENT_MAX_AGE if max_age is None else max_age
+    content = ArticleContent.objects.filter(article=article).first()
+    if content is None:
+        return refresh(article)
+    if (timezone.now() - content.checked_at).total_seconds() >= max_age:
+        revalidate_later(article, content)
+    return _decode(content)
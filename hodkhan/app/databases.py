@@ -0,0 +1,73 @@
+"""
+SQLite tuning and the read-only connection.
+
+Every new SQLite connection gets ``SQLITE_PRAGMAS`` (WAL, relaxed fsync,
+memory-mapped reads, a bigger page cache, a busy timeout) through the
+``connection_created`` signal.  The ``readonly`` alias opens the same file
+read-only; views wrapped in ``read_only`` send their queries there through
+``ReadOnlyRouter``, so page reads never queue behind the crawler's write
+transactions on the default connection.  With PostgreSQL the alias can point
+at a replica (``DB_READ_HOST``) or be left out.
+"""
+import contextvars
+import functools
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+READ_ALIAS = 'readonly'
+
+_reading = contextvars.ContextVar('read_only', default=False)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            if name == 'journal_mode' and connection.alias == READ_ALIAS:
+                continue  # Persistent in the file; a read-only connection can not change it
+            cursor.execute(f'PRAGMA {name} = {value}')
+        if connection.alias == READ_ALIAS:
+            cursor.execute('PRAGMA query_only = 1')
+
+
+def read_only(view):
+    """Run ``view``'s queries on the read-only connection when one is configured."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _reading.set(True)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _reading.reset(token)
+    return wrapper
+
+
+def has_read_alias():
+    if READ_ALIAS not in connections.settings:
+        return False
+    read, default = connections[READ_ALIAS].settings_dict, connections['default'].settings_dict
+    # As a test mirror the alias points at the default database itself, and a second connection
+    # would not see the test's uncommitted rows
+    return (read['NAME'], read['HOST']) != (default['NAME'], default['HOST'])
+
+
+class ReadOnlyRouter:
+    def db_for_read(self, model, **hints):
+        if _reading.get() and has_read_alias():
+            return READ_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != READ_ALIAS
@@ -0,0 +1,179 @@
+"""
+Append-only log of raw interaction events and its compaction.
+
+Request handlers never write interactions to the database.  Each flush of
+the interaction buffer becomes one immutable segment file of JSON lines
+under ``INTERACTION_LOG_DIR`` (written to a temporary name and renamed, so
+readers only ever see complete segments).  ``compact`` periodically folds
+the closed segments into ``InteractionAggregate`` -- one row per (user,
+article) with the like flag and the latest read/view dwell times, which is
+what the regressor reads -- updates the users' account counters, appends
+the events to the ``Interaction`` history in the same transaction and
+deletes the segments.
+
+Compaction is at-least-once: a crash after the commit but before the
+segments are deleted folds them in again, which only bumps the counters.
+History rows keep the event's time, so events already there are skipped.
+"""
+import datetime
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from app import user_stats
+from app.models import ArchivedAggregate, Article, Interaction, InteractionAggregate
+
+SUFFIX = '.jsonl'
+TYPES = ('view', 'read', 'like')
+
+
+def event(user_id, article_id, type_, value=None, at=None):
+    return {'user': user_id, 'article': article_id, 'type': type_, 'value': value,
+            'at': time.time() if at is None else at}
+
+
+def append(events):
+    """Write ``events`` as a new segment; returns its path (None when there is nothing to write)."""
+    if not events:
+        return None
+    directory = settings.INTERACTION_LOG_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f'{time.time_ns():020d}-{os.getpid()}-{threading.get_ident()}'
+    tmp = directory / f'{name}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.writelines(json.dumps(e, ensure_ascii=False) + '\n' for e in events)
+    path = directory / f'{name}{SUFFIX}'
+    os.replace(tmp, path)
+    return path
+
+
+def segments(limit=None):
+    """Closed segments, oldest first."""
+    directory = settings.INTERACTION_LOG_DIR
+    if not directory.exists():
+        return []
+    paths = sorted(p for p in directory.iterdir() if p.name.endswith(SUFFIX))
+    return paths[:limit] if limit else paths
+
+
+def read(paths):
+    events = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    e = json.loads(line)
+                except ValueError:
+                    continue
+                # Segments logged before articles had integer keys carry UUID strings; they are dropped
+                if e.get('type') in TYPES and e.get('user') and isinstance(e.get('article'), int):
+                    events.append(e)
+    events.sort(key=lambda e: e.get('at') or 0)
+    return events
+
+
+def _logged_at(e):
+    return datetime.datetime.fromtimestamp(e.get('at') or time.time(), tz=datetime.timezone.utc)
+
+
+def _new_history(events):
+    """``events`` as ``Interaction`` rows, minus those a previous compaction of the same segments inserted."""
+    rows = [Interaction(user_id=e['user'], article_id=e['article'], type=e['type'], value=e['value'],
+                        created_at=_logged_at(e)) for e in events]
+    if not rows:
+        return rows
+    stored = set(Interaction.objects.filter(
+        user_id__in={r.user_id for r in rows}, article_id__in={r.article_id for r in rows},
+        created_at__range=(min(r.created_at for r in rows), max(r.created_at for r in rows)),
+    ).values_list('user_id', 'article_id', 'type', 'created_at'))
+    return [r for r in rows if (r.user_id, r.article_id, r.type, r.created_at) not in stored]
+
+
+def _viewed(aggregate):
+    return aggregate.views > 0 or aggregate.reads > 0
+
+
+def _fold(aggregate, e):
+    if e['type'] == 'like':
+        aggregate.liked = True
+    elif e['type'] == 'read':
+        aggregate.read = e['value']
+        aggregate.reads += 1
+    else:
+        aggregate.view = e['value']
+        aggregate.views += 1
+    aggregate.is_trained = False
+
+
+def compact(limit=None):
+    """
+    Fold up to ``limit`` closed segments into the aggregates and the
+    interaction history.  Returns ``(events, aggregates)`` written.
+    """
+    paths = segments(limit)
+    events = read(paths)
+    # Drop events of articles or users deleted since they were logged
+    articles = set(Article.objects.filter(id__in={e['article'] for e in events}).values_list('id', flat=True))
+    users = set(get_user_model().objects.filter(id__in={e['user'] for e in events}).values_list('id', flat=True))
+    events = [e for e in events if e['article'] in articles and e['user'] in users]
+    now = timezone.now()
+
+    with transaction.atomic():
+        keys = {(e['user'], e['article']) for e in events}
+        existing = InteractionAggregate.objects.filter(user_id__in={u for u, _ in keys},
+                                                       article_id__in={a for _, a in keys})
+        aggregates = {(a.user_id, a.article_id): a for a in existing if (a.user_id, a.article_id) in keys}
+        before = {key: (_viewed(a), a.liked) for key, a in aggregates.items()}
+        created = []
+        for e in events:
+            key = (e['user'], e['article'])
+            if key not in aggregates:
+                aggregates[key] = InteractionAggregate(user_id=key[0], article_id=key[1])
+                created.append(aggregates[key])
+            _fold(aggregates[key], e)
+            aggregates[key].updated_at = now
+
+        updated = [a for a in aggregates.values() if a.pk is not None]
+        InteractionAggregate.objects.bulk_create(created, batch_size=500)
+        InteractionAggregate.objects.bulk_update(updated, ['liked', 'read', 'view', 'reads', 'views', 'is_trained',
+                                                           'updated_at'], batch_size=500)
+        Interaction.objects.bulk_create(_new_history(events), batch_size=500)
+
+        deltas = defaultdict(lambda: {'viewed': 0, 'liked': 0})
+        for key, aggregate in aggregates.items():
+            was_viewed, was_liked = before.get(key, (False, False))
+            deltas[key[0]]['viewed'] += _viewed(aggregate) - was_viewed
+            deltas[key[0]]['liked'] += aggregate.liked - was_liked
+        user_stats.add(deltas)
+
+    for path in paths:
+        path.unlink(missing_ok=True)
+    return len(events), len(aggregates)
+
+
+def forget_views(user_ids=None):
+    """
+    Delete the feed view history of ``user_ids`` (everyone when None) and
+    reset the view part of their aggregates, so the regressor starts over.
+    """
+    interactions = Interaction.objects.filter(type='view')
+    aggregates = InteractionAggregate.objects.all()
+    archived = ArchivedAggregate.objects.all()
+    if user_ids is not None:
+        interactions, aggregates = interactions.filter(user_id__in=user_ids), aggregates.filter(user_id__in=user_ids)
+        archived = archived.filter(user_id__in=user_ids)
+    with transaction.atomic():
+        interactions.delete()
+        aggregates.update(view=None, views=0, is_trained=False)
+        archived.update(view=None, views=0)
+        # Rows left with nothing else are dropped
+        aggregates.filter(liked=False, reads=0).delete()
+        archived.filter(liked=False, reads=0).delete()
+    user_stats.reconcile(user_ids)
@@ -0,0 +1,92 @@
+"""
+Shared outbound HTTP client for the crawler, the content store and views.
+
+One ``requests.Session`` per process keeps connections alive per host
+(``HTTPAdapter`` pools), asks for compressed bodies, and every request has
+explicit connect/read timeouts and a cap on the body size, so a slow or
+huge page can not hold a worker forever.  Settings: ``HTTP_TIMEOUT``
+(connect, read), ``HTTP_MAX_BYTES``, ``HTTP_POOL_MAXSIZE``, ``HTTP_RETRIES``.
+"""
+import threading
+
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import brotli  # noqa: F401  urllib3 decodes br only when a brotli package is installed
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = 'gzip, deflate, br'
+    except ImportError:
+        ACCEPT_ENCODING = 'gzip, deflate'
+
+USER_AGENT = 'Ruzify/1.0'
+CHUNK_SIZE = 64 * 1024
+
+_session = None
+_lock = threading.Lock()
+
+
+class ResponseTooLarge(requests.RequestException):
+    pass
+
+
+def _build_session():
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT, 'Accept-Encoding': ACCEPT_ENCODING})
+    retries = Retry(total=settings.HTTP_RETRIES, read=False, backoff_factor=0.3,
+                    status_forcelist=(502, 503, 504), allowed_methods=('GET', 'HEAD'), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=settings.HTTP_POOL_MAXSIZE, pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+                          max_retries=retries)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+@receiver(setting_changed)
+def reset_session(setting=None, **kwargs):
+    """Drop the pooled session (tests overriding ``HTTP_*`` settings get a fresh one)."""
+    global _session
+    if setting is not None and not setting.startswith('HTTP_'):
+        return
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+def get(url, headers=None, timeout=None, max_bytes=None, **kwargs):
+    """
+    GET ``url`` through the shared session and read the body, at most
+    ``max_bytes`` of it (``ResponseTooLarge`` otherwise).  The returned
+    response behaves like a normal one: ``.content`` / ``.text`` are loaded.
+    """
+    max_bytes = settings.HTTP_MAX_BYTES if max_bytes is None else max_bytes
+    response = get_session().get(url, headers=headers, timeout=timeout or settings.HTTP_TIMEOUT,
+                                 stream=True, **kwargs)
+    with response:
+        length = response.headers.get('Content-Length')
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise ResponseTooLarge(f'{url}: {length} bytes is over the {max_bytes} byte limit', response=response)
+        body = bytearray()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            body += chunk
+            if len(body) > max_bytes:
+                raise ResponseTooLarge(f'{url}: body is over the {max_bytes} byte limit', response=response)
+        response._content = bytes(body)
+    return response
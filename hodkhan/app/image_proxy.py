@@ -0,0 +1,140 @@
+"""
+Local proxy for article covers and feed favicons.
+
+Templates and the feed API link to ``proxy_url(url, size)`` instead of the
+agency's server.  The first request fetches the original through the shared
+HTTP client, resizes it with Pillow to one of ``SIZES`` and stores it as
+WebP under ``IMAGE_CACHE_DIR``; later requests are served from disk with a
+year-long ``Cache-Control``.  A cache hit touches the file's mtime and the
+least recently used files are evicted once ``IMAGE_CACHE_MAX_BYTES`` is
+exceeded.  URLs are HMAC-signed so the proxy only fetches images we linked.
+"""
+import base64
+import hashlib
+import io
+import os
+import threading
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+from PIL import Image, ImageOps
+
+from app import http_client
+
+# Max width per size name; height follows the aspect ratio
+SIZES = {'icon': 64, 'thumb': 240, 'card': 480, 'large': 960}
+WEBP_QUALITY = 80
+EVICT_EVERY = 100
+
+_writes = 0
+_evict_lock = threading.Lock()
+
+
+def _signature(url, size):
+    return salted_hmac('app.image_proxy', f'{size}:{url}').hexdigest()[:16]
+
+
+def _encode(url):
+    return base64.urlsafe_b64encode(url.encode()).decode().rstrip('=')
+
+
+def decode_url(encoded):
+    return base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)).decode()
+
+
+def verify(url, size, signature):
+    return size in SIZES and constant_time_compare(_signature(url, size), signature)
+
+
+def proxy_url(url, size='card'):
+    """Proxied URL of an external image, or ``url`` unchanged if it is not an http(s) URL."""
+    if not url or not url.startswith(('http://', 'https://')):
+        return url
+    return reverse('image_proxy', args=[size, _signature(url, size), _encode(url)])
+
+
+def cache_path(url, size):
+    name = hashlib.sha256(f'{size}:{url}'.encode()).hexdigest()
+    return settings.IMAGE_CACHE_DIR / name[:2] / f'{name}.webp'
+
+
+def resize(data, size):
+    """Downscale image bytes to ``SIZES[size]`` wide and encode them as WebP."""
+    width = SIZES[size]
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft('RGB', (width, width * 4))  # JPEG decodes at a reduced scale directly
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return out.getvalue()
+
+
+def get_image(url, size):
+    """Path of the cached WebP rendition, fetching and resizing the original on a miss."""
+    global _writes
+    path = cache_path(url, size)
+    if path.exists():
+        os.utime(path)
+        return path
+
+    response = http_client.get(url)
+    response.raise_for_status()
+    data = resize(response.content, size)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+    _writes += 1
+    if _writes % EVICT_EVERY == 0:
+        evict()
+    return path
+
+
+def evict(max_bytes=None):
+    """Delete least recently used renditions until the cache is under ``max_bytes``."""
+    max_bytes = settings.IMAGE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if not _evict_lock.acquire(blocking=False):
+        return 0
+    try:
+        entries, total = [], 0
+        for root, _, files in os.walk(settings.IMAGE_CACHE_DIR):
+            for name in files:
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+                total += stat.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+    finally:
+        _evict_lock.release()
+
+
+def warm(urls, sizes=('card',)):
+    """Pre-render ``urls`` (e.g. covers of newly crawled articles); returns how many were cached."""
+    warmed = 0
+    for url in urls:
+        if not url or not url.startswith(('http://', 'https://')):
+            continue
+        for size in sizes:
+            try:
+                get_image(url, size)
+                warmed += 1
+            except Exception:
+                pass
+    return warmed
@@ -0,0 +1,73 @@
+"""
+Buffered writes of user interactions.
+
+Feed scrolling produces a steady stream of small "view" events; saving each
+one in its own request takes the SQLite write lock every time.  Events are
+collected in a per-process buffer instead and appended to the event log as
+one segment (see app/event_log.py) once ``INTERACTION_BUFFER_SIZE`` events
+are waiting or ``INTERACTION_FLUSH_MS`` after the first one arrived,
+whichever comes first.  Whatever is left is flushed at interpreter exit.
+"""
+import atexit
+import threading
+
+from django.conf import settings
+
+from app import event_log
+
+
+class InteractionBuffer:
+    def __init__(self, max_events=None, max_delay_ms=None):
+        self.max_events = settings.INTERACTION_BUFFER_SIZE if max_events is None else max_events
+        self.max_delay_ms = settings.INTERACTION_FLUSH_MS if max_delay_ms is None else max_delay_ms
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, events):
+        """Queue events (``event_log.event``); flushes inline once the buffer is full."""
+        with self._lock:
+            self._pending.extend(events)
+            full = len(self._pending) >= self.max_events
+            if not full and self._pending and self._timer is None:
+                self._timer = threading.Timer(self.max_delay_ms / 1000, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write everything queued so far; returns the number of events written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if pending:
+                event_log.append(pending)
+            return len(pending)
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print("Error flushing interactions:", e)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = InteractionBuffer()
+                atexit.register(_buffer.flush)
+    return _buffer
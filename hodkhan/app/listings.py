@@ -0,0 +1,38 @@
+"""
+Cached topic and feed listing pages.
+
+Each page of a listing is serialized once and kept in the cache under a key
+that embeds the global content version (see ``app.response_cache``).  The
+crawler bumps the version after inserting articles, so every cached page is
+invalidated at once without tracking which listings the new articles belong
+to.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from app.models import Article
+from app.response_cache import versioned_key
+
+PAGE_SIZE = 24
+
+
+def _page(kind, name, page, articles, serialize):
+    key = versioned_key('listings', kind, name, page)
+    result = cache.get(key)
+    if result is None:
+        offset = (page - 1) * PAGE_SIZE
+        rows = articles.select_related('feed').order_by('-published', '-id')[offset:offset + PAGE_SIZE + 1]
+        result = [serialize(article) for article in rows]
+        cache.set(key, result, settings.LISTING_CACHE_TIMEOUT)
+    # One extra row is fetched to know whether there is a next page
+    return result[:PAGE_SIZE], len(result) > PAGE_SIZE
+
+
+def topic_page(name, page, serialize):
+    """``(articles, has_next)`` for the topic (keyword) ``name``, newest first."""
+    return _page('topic', name, page, Article.objects.filter(keyword__name=name), serialize)
+
+
+def feed_page(name, page, serialize):
+    """``(articles, has_next)`` for the feed ``name``, newest first."""
+    return _page('feed', name, page, Article.objects.filter(feed__name=name), serialize)
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from app.aggregates import update_centroids
+from app.models import Article, Feed, Keyword
+from app.vector_index import parse_vector
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute Feed.vector and Keyword.vector centroids from scratch. '
+        'crawl_feeds keeps them up to date incrementally; use this after a backfill.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Articles folded into the centroids per batch',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options.get('batch_size')
+
+        Feed.objects.update(vector=None, vector_count=0)
+        Keyword.objects.update(vector=None, vector_count=0)
+
+        batch, total = [], 0
+        qs = Article.objects.filter(vector__isnull=False).only('id', 'feed_id', 'vector')
+        for article in qs.iterator(chunk_size=batch_size):
+            article.embedding = parse_vector(article.vector)
+            batch.append(article)
+            if len(batch) >= batch_size:
+                update_centroids(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            update_centroids(batch)
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Aggregated {total} article vectors.'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from app.archive import archive, retention_cutoff
+from app.response_cache import bump_content_version
+
+
+class Command(BaseCommand):
+    help = 'Move articles past the retention window to the archive tables. Run periodically (e.g. daily from cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=float, default=None,
+            help='Keep articles published within this many days (defaults to ARTICLE_RETENTION_DAYS)',
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Articles moved per transaction')
+
+    def handle(self, *args, **options):
+        cutoff = retention_cutoff(options.get('days'))
+        total = 0
+        while True:
+            moved = archive(cutoff, options['batch_size'])
+            if not moved:
+                break
+            total += moved
+            self.stdout.write(f'Archived {total} articles...')
+        if total:
+            # Listings and search results drop the archived articles
+            bump_content_version()
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} articles published before {cutoff}.'))
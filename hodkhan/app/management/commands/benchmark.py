@@ -0,0 +1,268 @@
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.test.utils import override_settings
+
+from app.databases import READ_ALIAS
+from app.management.commands.crawler_tool import clean_caption, process_html
+from app.models import ArchivedArticle, Article, Feed, InteractionAggregate
+from app.vector_index import VectorIndex, format_vector
+
+TESTDATA_DIR = Path(__file__).resolve().parents[2] / 'testdata'
+PAGES_DIR = TESTDATA_DIR / 'pages'
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _summary(timings):
+    p50 = timings[len(timings) // 2]
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return f'p50 {p50:.2f}ms  p95 {p95:.2f}ms'
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmarks for hot paths. Targets: vector_search, extraction, clean_caption, sqlite_concurrency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=['vector_search', 'extraction', 'clean_caption', 'sqlite_concurrency'])
+        parser.add_argument('--n', type=int, default=1_000_000, help='Number of synthetic vectors')
+        parser.add_argument('--dim', type=int, default=768, help='Vector dimension (Gemma is 768)')
+        parser.add_argument('--queries', type=int, default=50, help='Number of timed queries')
+        parser.add_argument('--k', type=int, default=24)
+        parser.add_argument('--nprobe', type=int, default=16)
+        parser.add_argument('--pages', type=str, default=str(PAGES_DIR), help='Directory of saved HTML pages')
+        parser.add_argument('--seconds', type=float, default=10.0, help='Duration of each concurrency run')
+        parser.add_argument('--readers', type=int, default=4, help='Concurrent web reader threads')
+
+    def handle(self, *args, **options):
+        getattr(self, f"bench_{options['target']}")(options)
+
+    def bench_vector_search(self, options):
+        n, dim, k = options['n'], options['dim'], options['k']
+        rng = np.random.default_rng(42)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            self.stdout.write(f'Building index of {n} x {dim} synthetic vectors in {tmp} ...')
+            index = VectorIndex.open(tmp, dim=dim, writable=True)
+            # Clustered data, so IVF recall is meaningful
+            topics = rng.normal(size=(256, dim)).astype(np.float32)
+            start = time.perf_counter()
+            for offset in range(0, n, 100_000):
+                size = min(100_000, n - offset)
+                vectors = topics[rng.integers(0, len(topics), size)] + \
+                    0.5 * rng.normal(size=(size, dim)).astype(np.float32)
+                index.add(list(range(offset, offset + size)), vectors, [0] * size, retrain=False)
+            index.train()
+            index.save()
+            self.stdout.write(f'  build + train: {time.perf_counter() - start:.1f}s, '
+                              f'{len(index.centroids)} cells')
+
+            queries = topics[rng.integers(0, len(topics), options['queries'])] + \
+                0.5 * rng.normal(size=(options['queries'], dim)).astype(np.float32)
+
+            reader = VectorIndex.open(tmp)
+            exact, exact_ms = [], []
+            approx, approx_ms = [], []
+            for q in queries:
+                result, timing = _timed(lambda: reader.search(q, k=k, nprobe=None))
+                exact.append({article_id for article_id, _ in result})
+                exact_ms.append(timing)
+                result, timing = _timed(lambda: reader.search(q, k=k, nprobe=options['nprobe']))
+                approx.append({article_id for article_id, _ in result})
+                approx_ms.append(timing)
+            exact_ms.sort()
+            approx_ms.sort()
+
+            recall = np.mean([len(a & e) / len(e) for a, e in zip(approx, exact)])
+            self.stdout.write(f'  exact scan:        {_summary(exact_ms)}')
+            self.stdout.write(f'  IVF nprobe={options["nprobe"]}:    {_summary(approx_ms)}  recall@{k} {recall:.3f}')
+
+    def bench_extraction(self, options):
+        pages = sorted(Path(options['pages']).glob('*.html'))
+        total = []
+        for page in pages:
+            html = page.read_text(encoding='utf-8')
+            process_html(html)
+            timings = sorted(_timed(lambda: process_html(html))[1] for _ in range(options['queries']))
+            total.extend(timings)
+            self.stdout.write(f'  {page.name:<24} {page.stat().st_size // 1024:>4}KB  {_summary(timings)}')
+        total.sort()
+        self.stdout.write(f'  all {len(pages)} pages:{"":>17}{_summary(total)}')
+
+    def bench_clean_caption(self, options):
+        captions = [case['caption'] for case in json.loads((TESTDATA_DIR / 'captions.json').read_text(encoding='utf-8'))]
+        size = sum(len(caption.encode()) for caption in captions)
+        timings = []
+        for _ in range(options['queries']):
+            _, timing = _timed(lambda: [clean_caption(caption) for caption in captions])
+            timings.append(timing)
+        timings.sort()
+        best = timings[0] / 1000
+        self.stdout.write(f'  {len(captions)} captions ({size // 1024}KB) per round: {_summary(timings)}')
+        self.stdout.write(f'  throughput: {len(captions) / best:,.0f} captions/s, {size / best / 2 ** 20:.1f}MB/s')
+
+    def bench_sqlite_concurrency(self, options):
+        """
+        The crawler's inserts, the regressor's training reads and updates and
+        feed listing pages at the same time, through the ORM on a scratch
+        database: first with SQLite's defaults on one connection per thread,
+        then with the configured ``SQLITE_PRAGMAS``, transaction mode and
+        ``readonly`` connection for the listings.
+        """
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('sqlite_concurrency needs the SQLite backend')
+        saved = {alias: connections.settings[alias] for alias in ('default', READ_ALIAS)}
+        # Listings would be served from the cache after the first request
+        no_cache = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        try:
+            for profile in ('default', 'tuned'):
+                with tempfile.TemporaryDirectory() as tmp:
+                    path = Path(tmp) / 'bench.sqlite3'
+                    pragmas = settings.SQLITE_PRAGMAS if profile == 'tuned' else {}
+                    with override_settings(SQLITE_PRAGMAS=pragmas, CACHES=no_cache):
+                        self._use_database(path, profile, saved)
+                        call_command('migrate', verbosity=0, interactive=False)
+                        self._seed()
+                        stats = self._run_concurrently(options)
+                        connections.close_all()
+                reads = sorted(stats['read_ms'])
+                self.stdout.write(
+                    f'  {profile:<8} reads {len(reads) / options["seconds"]:>7,.0f}/s  {_summary(reads)}  '
+                    f'max {reads[-1]:.1f}ms  crawler inserts {stats["crawler"]}  '
+                    f'regressor runs {stats["regressor"]}  locked errors {stats["locked"]}')
+        finally:
+            for alias, settings_dict in saved.items():
+                self._configure(alias, settings_dict)
+
+    @staticmethod
+    def _configure(alias, settings_dict):
+        connections[alias].close()
+        # Drop this thread's connection object; the next one is built from the new settings
+        del connections[alias]
+        connections.settings[alias] = settings_dict
+
+    def _use_database(self, path, profile, saved):
+        """Point both aliases at ``path``; the default profile has no read-only connection."""
+        default = {**saved['default'], 'NAME': path}
+        if profile == 'default':
+            default['OPTIONS'] = {}
+            readonly = default  # Same database, so ReadOnlyRouter keeps reads on the default alias
+        else:
+            readonly = {**saved[READ_ALIAS], 'NAME': f'{path.resolve().as_uri()}?mode=ro'}
+        for alias, settings_dict in (('default', default), (READ_ALIAS, readonly)):
+            self._configure(alias, settings_dict)
+
+    @staticmethod
+    def _seed(articles=20_000, users=50, feeds=40):
+        rng = np.random.default_rng(42)
+        vector = format_vector(rng.normal(size=256))
+        User = get_user_model()
+        User.objects.bulk_create(User(username=f'reader{i}') for i in range(users))
+        Feed.objects.bulk_create(Feed(name=f'feed {i}', address=f'http://example.com/{i}/rss', favicon='', type='rss')
+                                 for i in range(feeds))
+        user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+        feed_ids = list(Feed.objects.order_by('id').values_list('id', flat=True))
+        Article.objects.bulk_create((Article(title=f'title {i}', feed_id=feed_ids[i % feeds], link=f'seed/{i}',
+                                             published=i, vector=vector) for i in range(articles)), batch_size=1000)
+        article_ids = Article.objects.order_by('id').values_list('id', flat=True)
+        InteractionAggregate.objects.bulk_create(
+            (InteractionAggregate(user_id=user_ids[i % users], article_id=article_id, liked=i % 7 == 0,
+                                  view=float(i % 30), views=1) for i, article_id in enumerate(article_ids[::4])),
+            batch_size=1000)
+
+    def _run_concurrently(self, options):
+        from app.aggregates import update_centroids
+        from app.databases import read_only
+        from app.listings import feed_page
+
+        stop = threading.Event()
+        stats = {'read_ms': [], 'crawler': 0, 'regressor': 0, 'locked': 0}
+        lock = threading.Lock()
+        embedding = np.full(256, 0.123456, dtype=np.float32)
+        feeds = list(Feed.objects.order_by('id'))
+        usernames = list(get_user_model().objects.order_by('id').values_list('username', flat=True))
+
+        def guarded(work):
+            def loop():
+                try:
+                    while not stop.is_set():
+                        try:
+                            work()
+                        except OperationalError:
+                            # The ORM has rolled the failed transaction back
+                            with lock:
+                                stats['locked'] += 1
+                finally:
+                    connections.close_all()
+            return loop
+
+        cycle = [0]
+
+        def crawler():
+            # crawl_feeds for one feed: look the links up, save each new article, fold it into the centroids
+            cycle[0] += 1
+            feed = feeds[cycle[0] % len(feeds)]
+            links = [f'crawl/{cycle[0]}/{i}' for i in range(50)]
+            existing = set()
+            for model in (Article, ArchivedArticle):
+                existing.update(model.objects.filter(link__in=links).values_list('link', flat=True))
+            saved = []
+            for link in links:
+                if link not in existing:
+                    article = Article(title='new', feed=feed, link=link, published=10 ** 6 + cycle[0],
+                                      vector=format_vector(embedding))
+                    article.save()
+                    article.embedding = embedding
+                    saved.append(article)
+            update_centroids(saved)
+            with lock:
+                stats['crawler'] += len(saved)
+            time.sleep(0.02)
+
+        turn = [0]
+
+        def regressor():
+            # regressor.py's training read and is_trained update, one user at a time
+            turn[0] += 1
+            username = usernames[turn[0] % len(usernames)]
+            rows = InteractionAggregate.objects.filter(user__username=username)
+            list(rows.values_list('user__username', 'article_id', 'is_trained', 'liked', 'read', 'view',
+                                  'article__vector'))
+            rows.update(is_trained=True)
+            with lock:
+                stats['regressor'] += 1
+
+        def reader():
+            page = read_only(feed_page)
+            turn = [0]
+
+            def read():
+                turn[0] += 1
+                name = feeds[turn[0] % len(feeds)].name
+                _, timing = _timed(lambda: page(name, 1 + turn[0] % 5, lambda article: article.title))
+                with lock:
+                    stats['read_ms'].append(timing)
+            return guarded(read)
+
+        threads = [threading.Thread(target=guarded(crawler)), threading.Thread(target=guarded(regressor))]
+        threads += [threading.Thread(target=reader()) for _ in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return stats
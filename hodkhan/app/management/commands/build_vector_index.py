@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+
+from app.models import Article
+from app.vector_index import VectorIndex, parse_vector, recent_cutoff, write_lock
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the approximate nearest-neighbour index from recent Article vectors.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=float, default=None,
+            help='How many days of articles to index (defaults to VECTOR_INDEX_DAYS)',
+        )
+        parser.add_argument(
+            '--cells', type=int, default=None,
+            help='Number of IVF cells (defaults to sqrt of the row count)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Rows read from the database per batch',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = recent_cutoff(options.get('days'))
+        batch_size = options.get('batch_size')
+
+        qs = (Article.objects.filter(published__gte=cutoff, vector__isnull=False)
+              .order_by('published')
+              .values_list('id', 'vector', 'published'))
+
+        with write_lock() as path:
+            index = self.build(path, qs, batch_size)
+            if index is None:
+                self.stdout.write(self.style.WARNING('No article vectors found; index not built.'))
+                return
+            index.train(n_cells=options.get('cells'))
+            index.save()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {len(index)} articles into {path}.'))
+
+    def build(self, path, qs, batch_size):
+        index = None
+        ids, vectors, published = [], [], []
+
+        def flush():
+            index.add(ids, vectors, published, retrain=False)
+            ids.clear()
+            vectors.clear()
+            published.clear()
+
+        for article_id, vector_str, pub in qs.iterator(chunk_size=batch_size):
+            vector = parse_vector(vector_str)
+            if vector is None:
+                continue
+            if index is None:
+                VectorIndex.create(path, dim=len(vector))
+                index = VectorIndex.open(path, writable=True)
+            if len(vector) != index.dim:
+                self.stdout.write(f'Skipping {article_id}: dimension {len(vector)} != {index.dim}')
+                continue
+            ids.append(article_id)
+            vectors.append(vector)
+            published.append(pub)
+            if len(ids) >= batch_size:
+                flush()
+
+        if ids:
+            flush()
+        return index
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app import event_log
+
+
+class Command(BaseCommand):
+    help = 'Fold logged interaction events into per-(user, article) aggregates and the interaction history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--segments', type=int, default=1000, help='Segments compacted per transaction')
+        parser.add_argument('--sleep', type=float, default=60.0, help='Sleep time between cycles in seconds')
+        parser.add_argument('--once', action='store_true', help='Run a single cycle and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                while True:
+                    events, aggregates = event_log.compact(options['segments'])
+                    self.stdout.write(f'Compacted {events} events into {aggregates} aggregates')
+                    if not event_log.segments():
+                        break
+            except Exception as e:
+                self.stdout.write(f'Unexpected error in compaction cycle: {e}')
+            if options['once']:
+                return
+            time.sleep(options['sleep'])
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from app.vector_index import index_writer, recent_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Drop expired rows from the article vector index. Run periodically (e.g. hourly from cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=float, default=None,
+            help='Keep articles published within this many days (defaults to VECTOR_INDEX_DAYS)',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = recent_cutoff(options.get('days'))
+        try:
+            with index_writer() as index:
+                dropped = index.compact(cutoff)
+                remaining = len(index)
+        except FileNotFoundError:
+            self.stdout.write(self.style.WARNING('No vector index found; run build_vector_index first.'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Dropped {dropped} expired rows, {remaining} remain.'))
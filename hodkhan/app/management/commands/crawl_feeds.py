@@ -3,18 +3,23 @@ import uuid
 import markdownify
 import signal
 import time
+from collections import Counter
 from django.core.management.base import BaseCommand
 
-from app.management.commands.crawler_tool import get_cover, clean_caption, get_first_text_from_url, \
+from app.management.commands.crawler_tool import resolve_cover, clean_caption, get_first_text_from_url, \
     fetch_and_process_html
-from app.models import Feed, Article
+from app.models import ArchivedArticle, Feed, Article
 import feedparser
 import requests
 import re
 import os
-from hazm import Normalizer, word_tokenize
-import pickle
 from app.management.commands.gemma_embedding import GemmaEmbedding
+from app.vector_index import index_writer, get_index
+from app.stories import assign_stories
+from app.aggregates import update_centroids
+from app.topics import TopicClassifier, assign_topics
+from app.response_cache import bump_content_version
+from app import content_store, http_client, image_proxy
 
 
 class TimeoutException(Exception):
@@ -50,6 +55,10 @@ class Command(BaseCommand):
             '--sleep', type=float, default=30.0,
             help='Sleep time between cycles in seconds',
         )
+        parser.add_argument(
+            '--warm-images', action='store_true',
+            help='Pre-render card thumbnails of new covers in the image proxy cache',
+        )
 
     def handle(self, *args, **options):
         limit = options.get('limit')
@@ -57,15 +66,12 @@ class Command(BaseCommand):
         batch_size = options.get('batch_size', 32)
         timeout = options.get('timeout', 300)
         sleep_time = options.get('sleep', 1.0)
+        warm_images = options.get('warm_images', False)
 
         # Load models outside the main loop
-        vectorizer = None
-        model = None
+        topic_classifier = None
         try:
-            with open('app/management/commands/models/hazm/vectorizer.pkl', 'rb') as f:
-                vectorizer = pickle.load(f)
-            with open('app/management/commands/models/hazm/logistic_regression.pkl', 'rb') as f:
-                model = pickle.load(f)
+            topic_classifier = TopicClassifier.load()
         except Exception as e:
             self.stdout.write(f'Warning: classifier/vectorizer not available: {e}')
 
@@ -88,14 +94,6 @@ class Command(BaseCommand):
                 return None
             return embedding_model.get_sentence_vector(text)
 
-        def classifier(text):
-            if not vectorizer or not model:
-                return None
-            normalizer = Normalizer()
-            new_text_processed = ' '.join(word_tokenize(normalizer.normalize(text)))
-            new_text_tfidf = vectorizer.transform([new_text_processed])
-            return model.predict(new_text_tfidf)[0]
-
         def extract_entry_data(entry, source):
             # Keep a subset of legacy extraction logic; best-effort
             try:
@@ -138,9 +136,12 @@ class Command(BaseCommand):
                 self.stdout.write('Crawler is running...')
                 signal.alarm(timeout)  # Set timeout for this cycle
 
-                existing_links = set(Article.objects.values_list('link', flat=True))
+                existing_links = set()
                 articles_to_embed = []
                 articles_to_save = []
+                articles_to_classify = []
+                fetched_pages = []
+                cover_strategies = Counter()
 
                 feeds = Feed.objects.all()
                 if not feeds.exists():
@@ -152,8 +153,17 @@ class Command(BaseCommand):
                 for feed in feeds:
                     try:
                         self.stdout.write(f'Processing feed: {feed.name} ({feed.address})')
-                        parsed = feedparser.parse(feed.address)
+                        response = http_client.get(feed.address)
+                        response.raise_for_status()
+                        parsed = feedparser.parse(response.content, response_headers={
+                            'content-location': response.url,
+                            'content-type': response.headers.get('Content-Type', ''),
+                        })
                         entries = parsed.entries[:limit] if limit else parsed.entries
+                        # Only this feed's links are looked up (link is indexed), archived articles included
+                        links = [e.get('link') for e in entries]
+                        for model in (Article, ArchivedArticle):
+                            existing_links.update(model.objects.filter(link__in=links).values_list('link', flat=True))
 
                         for entry in entries:
                             try:
@@ -162,18 +172,8 @@ class Command(BaseCommand):
 
                                 data = extract_entry_data(entry, feed.name)
 
-                                # classification (best-effort)
-                                try:
-                                    classifier(entry.title + "\n" + data['abstract'])
-                                except Exception:
-                                    pass
-
-                                # determine a new id: use incrementing numeric id
-                                # based on existing max
-                                max_id = Article.objects.all().order_by('-id').first()
-                                new_id = str(int(max_id.id) + 1) if max_id and str(max_id.id).isdigit() else str(int(time.time()))[:10]
-
-                                cover = get_cover(entry.link)
+                                cover, strategy, page = resolve_cover(entry)
+                                cover_strategies[strategy] += 1
                                 abstract = clean_caption(entry.summary)
 
                                 article = Article(
@@ -187,7 +187,10 @@ class Command(BaseCommand):
                                 )
 
                                 articles_to_embed.append((article, entry.title + ' ' + abstract))
+                                articles_to_classify.append((article, entry.title + "\n" + data['abstract']))
                                 articles_to_save.append(article)
+                                if page is not None:
+                                    fetched_pages.append((article, page))
 
                             except Exception as e:
                                 self.stdout.write(f'Error processing entry: {e}')
@@ -205,21 +208,78 @@ class Command(BaseCommand):
                         embeddings = embedding_model.get_embeddings(texts)
                         for (article, _), embedding in zip(articles_to_embed, embeddings):
                             if embedding is not None:
+                                article.embedding = embedding
                                 vector_str = ','.join(map(str, embedding.tolist() if hasattr(embedding, 'tolist') else embedding))
                                 article.vector = vector_str
                     except Exception as e:
                         self.stdout.write(f'Error generating embeddings: {e}')
 
+                # Group republished copies of the same wire story
+                try:
+                    clustered = assign_stories(articles_to_save, get_index())
+                    if clustered:
+                        self.stdout.write(f'{clustered} articles joined an existing story')
+                except Exception as e:
+                    self.stdout.write(f'Error clustering stories: {e}')
+
                 # Save articles
                 added = 0
+                saved = []
                 for article in articles_to_save:
                     try:
                         article.save()
                         existing_links.add(article.link)
+                        saved.append(article)
                         added += 1
                     except Exception as e:
                         self.stdout.write(f'Error saving article: {e}')
 
+                # Keep the pages fetched for covers so the first view needs no fetch
+                for article, page in fetched_pages:
+                    if article.pk is not None:
+                        try:
+                            content_store.store(article, page)
+                        except Exception as e:
+                            self.stdout.write(f'Error storing article content: {e}')
+
+                # Classify the cycle's articles in one batch and store the topic as a keyword
+                saved_ids = {a.pk for a in saved}
+                to_classify = [(a, text) for a, text in articles_to_classify if a.pk in saved_ids]
+                if topic_classifier and to_classify:
+                    try:
+                        topics = topic_classifier.predict([text for _, text in to_classify])
+                        assign_topics([a for a, _ in to_classify], topics)
+                        self.stdout.write(f'Classified {len(topics)} articles')
+                    except Exception as e:
+                        self.stdout.write(f'Error classifying articles: {e}')
+
+                # Append the new vectors to the nearest-neighbour index
+                indexed = [a for a in saved if getattr(a, 'embedding', None) is not None]
+                if indexed:
+                    try:
+                        with index_writer(dim=len(indexed[0].embedding)) as index:
+                            index.add([a.id for a in indexed], [a.embedding for a in indexed],
+                                      [a.published for a in indexed])
+                    except Exception as e:
+                        self.stdout.write(f'Error updating vector index: {e}')
+                    try:
+                        update_centroids(indexed)
+                    except Exception as e:
+                        self.stdout.write(f'Error updating feed/keyword centroids: {e}')
+
+                if saved:
+                    bump_content_version()
+
+                if warm_images and saved:
+                    try:
+                        warmed = image_proxy.warm(a.cover for a in saved)
+                        self.stdout.write(f'Warmed {warmed} cover thumbnails')
+                    except Exception as e:
+                        self.stdout.write(f'Error warming cover thumbnails: {e}')
+
+                if cover_strategies:
+                    self.stdout.write('Cover sources: ' + ', '.join(
+                        f'{strategy}={count}' for strategy, count in cover_strategies.most_common()))
                 self.stdout.write(f'Cycle completed: Added {added} articles')
 
                 # Clear alarm and embedding cache
@@ -1,28 +1,78 @@
+import copy
 import re
+from html.parser import HTMLParser
 from http.client import HTTPException
 from readability import Document
 from django.core.management.base import BaseCommand
 import requests
 from bs4 import BeautifulSoup
 import feedparser
+import lxml.html
+from readability.htmls import utf8_parser
+
+from app import http_client
+
+
+def fetch_page(url: str):
+    response = http_client.get(url)
+    response.raise_for_status()
+    return response
 
 
 def get_cover(url: str):
     try:
-        response = requests.get(url, allow_redirects=True)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'lxml')
-        og_image = soup.find('meta', property='og:image')
-        if og_image and 'content' in og_image.attrs:
-            return og_image['content']
-        cover = soup.find('img')
-        if cover and 'src' in cover.attrs:
-            return cover['src']
+        return extract_cover(parse_html(fetch_page(url).text))
     except requests.RequestException as e:
         print(f"Error fetching main image: {e}")
     return None
 
 
+def _is_image(media):
+    kind = media.get('medium') or media.get('type') or 'image'
+    return kind == 'image' or kind.startswith('image/')
+
+
+def cover_from_entry(entry):
+    """
+    Cover image carried by the feed entry itself, without fetching anything.
+    Returns ``(url, strategy)`` or ``(None, None)``.
+    """
+    for media in entry.get('media_content') or ():
+        if media.get('url') and _is_image(media):
+            return media['url'], 'media_content'
+    for enclosure in entry.get('enclosures') or ():
+        if enclosure.get('href') and enclosure.get('type', '').startswith('image/'):
+            return enclosure['href'], 'enclosure'
+    for thumbnail in entry.get('media_thumbnail') or ():
+        if thumbnail.get('url'):
+            return thumbnail['url'], 'media_thumbnail'
+    summary = entry.get('summary') or ''
+    if '<img' in summary:
+        for src in lxml.html.fragment_fromstring(summary, create_parent='div').xpath('.//img/@src'):
+            return src, 'summary'
+    return None, None
+
+
+def resolve_cover(entry):
+    """
+    Cover for a new feed entry: free sources in the entry first, and only
+    then a page fetch.
+    Returns ``(url, strategy, page)``; strategy is ``'none'`` when nothing was
+    found and ``page`` is the fetched response, if any, for
+    ``content_store.store`` to keep once the article is saved.
+    """
+    cover, strategy = cover_from_entry(entry)
+    if cover:
+        return cover, strategy, None
+    try:
+        page = fetch_page(entry.link)
+    except requests.RequestException as e:
+        print(f"Error fetching main image: {e}")
+        return None, 'none', None
+    cover = extract_cover(parse_html(page.text))
+    return cover, 'page' if cover else 'none', page
+
+
 def estimate_reading_time(markdown_string, words_per_minute=250):
     plain_text = re.sub(r'\*\*.*?\*\*|__.*?__|`.*?`|!$$.*?$$$.*?$|$$.*?$$$.*?$', '', markdown_string)
     plain_text = re.sub(r'\#\s*|\*\s*|\-\s*', '', plain_text)
@@ -33,13 +83,8 @@ def estimate_reading_time(markdown_string, words_per_minute=250):
     return reading_time_minutes
 
 
-def html_to_text(html: str) -> str:
-    return BeautifulSoup(html, 'html.parser').get_text()
-
-
 def get_first_text_from_url(url: str) -> str:
-    headers = {'User-Agent': 'Ruzify/1.0'}
-    response = requests.get(url, headers=headers, allow_redirects=True)
+    response = http_client.get(url)
     if response.status_code != 200:
         return ""
     html = response.text
@@ -51,17 +96,36 @@ def get_first_text_from_url(url: str) -> str:
 
 
 def fetch_and_process_html(url: str) -> str:
-    headers = {'User-Agent': 'Ruzify/1.0'}
-    response = requests.get(url, headers=headers)
+    response = http_client.get(url)
     response.raise_for_status()
-    html = response.text
-    video_urls = extract_video_urls(html)
-    video, is_frame = determine_primary_video(video_urls, html)
-    doc = Document(html)
-    main_content = doc.summary()
-    soup = BeautifulSoup(main_content, 'html.parser')
-    main_content = str(soup)
-    title = doc.title()
+    return process_html(response.text)
+
+
+class _TreeDocument(Document):
+    """readability ``Document`` over an already parsed tree.
+
+    ``summary()`` mutates the tree and re-parses the input when the first
+    (ruthless) pass fails, so every parse works on a copy of the tree instead.
+    """
+
+    def _parse(self, input):
+        return super()._parse(copy.deepcopy(input))
+
+
+_NON_SPACE_WHITESPACE = ''.join(chr(c) for c in range(0x3001) if chr(c).isspace() and c != 0x20)
+_WHITESPACE_RUN = re.compile(r'\s+')
+_APARAT_EMBED = 'https://www.aparat.com/embed/'
+
+
+def parse_html(html: str):
+    return lxml.html.document_fromstring(html.encode('utf-8', 'replace'), parser=utf8_parser)
+
+
+def process_html(html: str) -> str:
+    if not html.strip():
+        return ''
+    tree = parse_html(html)
+    video, is_frame = determine_primary_video(extract_video_urls(tree))
     code = f""""""
     if video:
         if is_frame:
@@ -77,16 +141,10 @@ def fetch_and_process_html(url: str) -> str:
                         </video>
                         """
     else:
-        soup = BeautifulSoup(html, 'lxml')
-        og_image = soup.find('meta', property='og:image')
-        cover_image = og_image['content'] if og_image and 'content' in og_image.attrs else None
+        cover_image = extract_cover(tree)
         if cover_image:
             code += f"""<img src="{cover_image}" alt="Cover Image" style="max-width: 100%; height: auto;">"""
-        else:
-            main_image = soup.find('img')
-            if main_image and 'src' in main_image.attrs:
-                cover_image = main_image['src']
-                code += f"""<img src="{cover_image}" alt="Cover Image" style="max-width: 100%; height: auto;">"""
+    main_content = _TreeDocument(tree).summary()
     main_content = main_content.replace("sizes=", "dsize=")
     main_content = main_content.replace("<button", "<div").replace("</button>", "</div>")
     code += f"""{main_content}
@@ -94,52 +152,187 @@ def fetch_and_process_html(url: str) -> str:
     return minify_html(code)
 
 
-def extract_video_urls(html: str):
+def extract_cover(tree):
+    for content in tree.xpath('//meta[@property="og:image"]/@content'):
+        return content
+    for src in tree.xpath('//img/@src'):
+        return src
+    return None
+
+
+def extract_video_urls(tree):
+    """Embedded iframes and <source> elements in document order, then aparat embeds found in any attribute."""
     video_urls = []
-    iframes = re.findall(r'<iframe.*?src="(.*?)"', html)
-    videos = re.findall(r'<source.*?src="(.*?)"', html)
-    for iframe in iframes:
-        if '/embed' in iframe:
-            video_urls.append(iframe)
-    video_urls.extend(videos)
-    aparat_urls = re.findall(r'"https://www.aparat.com/embed/(.*?)"', html)
-    for aparat_url in aparat_urls:
-        video_urls.append(
-            'https://www.aparat.com/video/video/embed/videohash/' + aparat_url.split('?')[0] + '/vt/frame')
+    for element in tree.iter('iframe', 'source'):
+        src = element.get('src') or element.get('data-src')
+        if src and (element.tag == 'source' or '/embed' in src):
+            video_urls.append(src)
+    for value in tree.xpath(f'//@*[starts-with(., "{_APARAT_EMBED}")]'):
+        video_urls.append('https://www.aparat.com/video/video/embed/videohash/' +
+                          value[len(_APARAT_EMBED):].split('?')[0] + '/vt/frame')
     return video_urls
 
 
+def _collapse_whitespace(match):
+    run, text = match.group(), match.string
+    if match.start() and text[match.start() - 1] == '>':
+        run = run.lstrip(_NON_SPACE_WHITESPACE)
+    if text.startswith('<', match.end()):
+        run = run.rstrip(_NON_SPACE_WHITESPACE)
+    return run[-1:]
+
+
 def minify_html(html: str) -> str:
-    search = [r'\>[^\S ]+', r'[^\S ]+\<', r'(\s)+', '']
-    replace = ['>', '<', r'\1']
-    for s, r in zip(search, replace):
-        html = re.sub(s, r, html)
-    return html
+    """Drop newlines/tabs next to tags and collapse other whitespace runs, in one pass."""
+    return _WHITESPACE_RUN.sub(_collapse_whitespace, html)
 
 
-def determine_primary_video(video_urls, html):
+def determine_primary_video(video_urls):
+    """The first video in the page; ``video_urls`` is already in document order."""
     if not video_urls:
         return '', 0
-    if len(video_urls) == 1:
-        return video_urls[0], 1 if '/embed' in video_urls[0] else 0
-    min_offset = float('inf')
-    primary_video = ''
-    for url in video_urls:
-        offset = html.find(url)
-        if offset != -1 and offset < min_offset:
-            min_offset = offset
-            primary_video = url
-    return primary_video, 1 if '/embed' in primary_video else 0
+    return video_urls[0], 1 if '/embed' in video_urls[0] else 0
+
+
+class _FirstLine(Exception):
+    pass
+
+
+class _CaptionParser(HTMLParser):
+    """
+    Streaming text extractor behind ``clean_caption``.
+
+    It reproduces what the former BeautifulSoup implementation returned:
+    parse, drop <img> and ``href``, serialize with <a> renamed to <p>, parse
+    again, ``get_text()``.  Both parses are tracked on the fly: ``stack`` is
+    the first parse, ``stack2`` what the second parse sees.  Text comes in
+    segments between tags and a segment of only ASCII whitespace collapses
+    to a newline or a space, once per parse.  Character references are
+    decoded by ``HTMLParser`` itself (``html.unescape``, the HTML5 rules).  Events that do not survive
+    serialization (<img> and everything inside it, stray end tags) only end
+    a first-parse segment.  Text inside script/style/template/rt/rp is left
+    out.  Parsing stops at the first newline of the output.
+    """
+    ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+    SKIPPED = {'script', 'style', 'template', 'rt', 'rp'}
+    PRESERVE = {'pre', 'textarea'}
+    VOID = {'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr', 'image', 'img',
+            'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer',
+            'track', 'wbr'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.closers = []  # end tag each open element gets when serialized, None if it is dropped
+        self.stack2 = []
+        self.closed = []  # void tags whose explicit end tag is ignored
+        self.data = []
+        self.segments = []
+        self.text = []
+
+    @classmethod
+    def _collapse(cls, text, stack):
+        if text.strip(cls.ASCII_SPACES) or any(tag in cls.PRESERVE for tag in stack):
+            return text
+        return '\n' if '\n' in text else ' '
+
+    def _end_data(self):
+        if self.data:
+            if 'img' not in self.stack:
+                self.segments.append(self._collapse(''.join(self.data), self.stack))
+            self.data = []
+
+    def _end_segment(self, included=None):
+        self._end_data()
+        if self.segments:
+            text = self._collapse(''.join(self.segments), self.stack2)
+            self.segments = []
+            if included if included is not None else not any(tag in self.SKIPPED for tag in self.stack2):
+                self.text.append(text)
+                if '\n' in text:
+                    raise _FirstLine
+
+    def _boundary(self, tag=None):
+        """End the segment, unless the event disappears with a dropped <img>."""
+        if tag == 'img' or 'img' in self.stack:
+            self._end_data()
+            return False
+        self._end_segment()
+        return True
+
+    @staticmethod
+    def _pop(stack, tag):
+        del stack[len(stack) - 1 - stack[::-1].index(tag):]
+
+    def _start(self, tag, attrs, close_void):
+        kept = self._boundary(tag)
+        if close_void and tag in self.VOID:
+            self.closed.append(tag)
+            return
+        self.stack.append(tag)
+        if not kept:
+            self.closers.append(None)
+        elif tag == 'a':
+            self.stack2.append('p' if any(name != 'href' for name, _ in attrs) else 'a')
+            self.closers.append('p')
+        else:
+            self.stack2.append(tag)
+            self.closers.append(tag)
+
+    def _end(self, tag):
+        if tag not in self.stack:
+            self._end_data()
+            return
+        self._boundary(tag)
+        depth = len(self.stack) - 1 - self.stack[::-1].index(tag)
+        for closer in reversed(self.closers[depth:]):
+            if closer in self.stack2:
+                self._pop(self.stack2, closer)
+        del self.stack[depth:], self.closers[depth:]
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs, True)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs, False)
+        self._end(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.closed:
+            self.closed.remove(tag)
+        else:
+            self._end(tag)
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_comment(self, data):
+        self._boundary()
+
+    def handle_pi(self, data):
+        self._boundary()
+
+    def handle_decl(self, decl):
+        if self._boundary():
+            self.segments.append('\n')  # a doctype is serialized followed by a newline
+
+    def unknown_decl(self, data):
+        if self._boundary() and data.upper().startswith('CDATA['):
+            # CDATA is serialized verbatim, so the <a> renaming reaches into it
+            self.data.append(data[len('CDATA['):].replace('<a ', '<p ').replace('</a>', '</p>'))
+            self._end_segment(included=True)
 
 
 def clean_caption(caption: str) -> str:
-    soup = BeautifulSoup(caption, 'html.parser')
-    for img in soup.find_all('img'):
-        img.decompose()
-    for a in soup.find_all('a'):
-        del a['href']
-    caption = str(soup).replace('<a ', '<p ').replace('</a>', '</p>')
-    return html_to_text(caption).split("\n")[0].strip()
+    """First line of the text of an entry summary, without images and links."""
+    parser = _CaptionParser()
+    try:
+        parser.feed(caption)
+        parser.close()
+        parser._end_segment()
+    except _FirstLine:
+        pass
+    return ''.join(parser.text).split('\n')[0].strip()
 
 
 class Command(BaseCommand):
@@ -167,7 +360,7 @@ class Command(BaseCommand):
             return
 
         if feed:
-            parsed = feedparser.parse(feed)
+            parsed = feedparser.parse(http_client.get(feed).content)
             for e in parsed.entries[:20]:
                 self.stdout.write(f'- {e.title}')
             return
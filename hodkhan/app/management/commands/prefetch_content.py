@@ -0,0 +1,109 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from app.content_store import refresh
+from app.models import Article, ArticleContent, Interaction
+from app.stories import collapse_stories
+
+
+class HostThrottle:
+    """Politeness limits: at most ``per_host`` requests in flight and ``delay`` seconds between starts per host."""
+
+    def __init__(self, per_host, delay):
+        self.per_host = per_host
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.slots = {}
+        self.next_start = {}
+
+    def __call__(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            slot = self.slots.setdefault(host, threading.BoundedSemaphore(self.per_host))
+        slot.acquire()
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start.get(host, now))
+            self.next_start[host] = start + self.delay
+        time.sleep(start - now)
+        return slot
+
+
+class Command(BaseCommand):
+    help = 'Continuously prefetch reader content for trending and top feed articles before anyone clicks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent fetches')
+        parser.add_argument('--per-host', type=int, default=2, help='Concurrent fetches per host')
+        parser.add_argument('--delay', type=float, default=1.0, help='Seconds between fetches to the same host')
+        parser.add_argument('--window', type=int, default=3600, help='Engagement window in seconds')
+        parser.add_argument('--trending', type=int, default=50, help='Trending articles per cycle')
+        parser.add_argument('--top', type=int, default=50,
+                            help="Most read and viewed articles of the last day per cycle, one per story")
+        parser.add_argument('--sleep', type=float, default=60.0, help='Sleep time between cycles in seconds')
+        parser.add_argument('--once', action='store_true', help='Run a single cycle and exit')
+
+    def handle(self, *args, **options):
+        throttle = HostThrottle(options['per_host'], options['delay'])
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                try:
+                    ids = self.candidates(options)
+                    self.stdout.write(f'Prefetching {len(ids)} articles...')
+                    articles = Article.objects.filter(id__in=ids).exclude(link__isnull=True)
+                    results = list(pool.map(lambda a: self.prefetch(a, throttle), articles))
+                    self.stdout.write(f'Cycle completed: prefetched {sum(results)} of {len(results)}')
+                except Exception as e:
+                    self.stdout.write(f'Unexpected error in prefetch cycle: {e}')
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+
+    def candidates(self, options):
+        """
+        Articles climbing in view/read engagement, then the day's most engaged
+        stories (the top of every reader's feed), minus fresh cache entries.
+        """
+        window = timedelta(seconds=options['window'])
+        now = timezone.now()
+        engagement = (Interaction.objects
+                      .filter(type__in=['view', 'read'], article__isnull=False, created_at__gte=now - 2 * window)
+                      .values('article_id')
+                      .annotate(recent=Count('id', filter=Q(created_at__gte=now - window)),
+                                before=Count('id', filter=Q(created_at__lt=now - window))))
+        climbing = sorted((row for row in engagement if row['recent'] > row['before']),
+                          key=lambda row: (row['recent'] - row['before'], row['recent']), reverse=True)
+        ids = [row['article_id'] for row in climbing[:options['trending']]]
+
+        top = list(Article.objects.filter(published__gte=int(time.time()) - 86400)
+                   .annotate(engagement=Coalesce(Sum(F('aggregates__reads') + F('aggregates__views')), 0))
+                   .order_by('-engagement', '-published').values_list('id', flat=True)[:options['top'] * 4])
+        ids += [i for i in collapse_stories(top, options['top']) if i not in ids]
+
+        fresh = set(ArticleContent.objects.filter(
+            article_id__in=ids,
+            checked_at__gte=now - timedelta(seconds=settings.READER_CONTENT_MAX_AGE),
+        ).values_list('article_id', flat=True))
+        return [i for i in ids if i not in fresh]
+
+    def prefetch(self, article, throttle):
+        slot = throttle(article.link)
+        try:
+            refresh(article, ArticleContent.objects.filter(article=article).first())
+            return True
+        except Exception as e:
+            self.stdout.write(f'Error prefetching {article.link}: {e}')
+            return False
+        finally:
+            slot.release()
+            connection.close()
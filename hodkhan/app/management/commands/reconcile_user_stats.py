@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app import user_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-user engagement counters from the interaction aggregates and feed follows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Only this user id (repeatable)')
+
+    def handle(self, *args, **options):
+        changed = user_stats.reconcile(options['users'])
+        self.stdout.write(f'Reconciled user stats: {changed} rows changed')
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_article_story'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feed',
+            name='vector_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='keyword',
+            name='vector_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_feed_keyword_vector_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleContent',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='content', serialize=False, to='app.article')),
+                ('html', models.BinaryField()),
+                ('etag', models.CharField(blank=True, max_length=300, null=True)),
+                ('last_modified', models.CharField(blank=True, max_length=100, null=True)),
+                ('digest', models.CharField(max_length=64)),
+                ('checked_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
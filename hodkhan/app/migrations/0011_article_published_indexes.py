@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_articlecontent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['published'], name='app_article_publish_d6d7b7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['feed', 'published'], name='app_article_feed_id_c3ae99_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    """Build the aggregates from the interaction history recorded so far."""
+    Interaction = apps.get_model('app', 'Interaction')
+    InteractionAggregate = apps.get_model('app', 'InteractionAggregate')
+    aggregates = {}
+    rows = (Interaction.objects.filter(user__isnull=False, article__isnull=False, type__in=('view', 'read', 'like'))
+            .order_by('created_at').values_list('user_id', 'article_id', 'type', 'value', 'is_trained'))
+    for user_id, article_id, type_, value, is_trained in rows.iterator(chunk_size=2000):
+        aggregate = aggregates.get((user_id, article_id))
+        if aggregate is None:
+            aggregate = aggregates[(user_id, article_id)] = InteractionAggregate(
+                user_id=user_id, article_id=article_id, is_trained=True)
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            value = None
+        if type_ == 'like':
+            aggregate.liked = True
+        elif type_ == 'read':
+            aggregate.read, aggregate.reads = value, aggregate.reads + 1
+        else:
+            aggregate.view, aggregate.views = value, aggregate.views + 1
+            # The regressor only ever marked view rows as trained
+            aggregate.is_trained = aggregate.is_trained and is_trained
+    InteractionAggregate.objects.bulk_create(aggregates.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_article_published_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InteractionAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('liked', models.BooleanField(default=False)),
+                ('read', models.FloatField(blank=True, null=True)),
+                ('view', models.FloatField(blank=True, null=True)),
+                ('reads', models.IntegerField(default=0)),
+                ('views', models.IntegerField(default=0)),
+                ('is_trained', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aggregates', to='app.article')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'is_trained'], name='app_interac_user_id_05e815_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'article'), name='unique_user_article_aggregate')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_interactionaggregate'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('viewed', models.IntegerField(default=0)),
+                ('liked', models.IntegerField(default=0)),
+                ('followed_feeds', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
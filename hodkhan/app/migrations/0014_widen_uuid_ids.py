@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:22
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_userstats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='article',
+            name='id',
+            field=models.CharField(default=uuid.uuid4, editable=False, max_length=36, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='feed',
+            name='id',
+            field=models.CharField(default=uuid.uuid4, editable=False, max_length=36, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='interaction',
+            name='id',
+            field=models.CharField(default=uuid.uuid4, editable=False, max_length=36, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='keyword',
+            name='id',
+            field=models.CharField(default=uuid.uuid4, editable=False, max_length=36, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='userfeed',
+            name='id',
+            field=models.CharField(default=uuid.uuid4, editable=False, max_length=36, primary_key=True, serialize=False),
+        ),
+    ]
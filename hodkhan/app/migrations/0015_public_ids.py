@@ -0,0 +1,92 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:28
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Substr
+
+# New keys are written as '#<n>' first so they can never collide with an old key
+# that happens to be numeric, then the prefix is stripped from every column at once.
+PREFIX = '#'
+
+
+def _number(queryset):
+    ids = list(queryset.values_list('id', flat=True))
+    for n, old in enumerate(ids, start=1):
+        queryset.model.objects.filter(id=old).update(id=f'{PREFIX}{n}')
+
+
+def _strip(model, *columns):
+    model.objects.update(**{column: Substr(column, len(PREFIX) + 1) for column in columns})
+
+
+def renumber(apps, schema_editor):
+    """
+    Keep the current keys of keywords, feeds and articles as their public
+    ids and renumber the rows 1..n (articles in publish order), rewriting
+    every column that refers to them.  Interactions and feed follows are
+    renumbered too; nothing refers to those.
+    """
+    Keyword = apps.get_model('app', 'Keyword')
+    Feed = apps.get_model('app', 'Feed')
+    Article = apps.get_model('app', 'Article')
+    Link = Article.keyword.through
+    ArticleContent = apps.get_model('app', 'ArticleContent')
+    Interaction = apps.get_model('app', 'Interaction')
+    InteractionAggregate = apps.get_model('app', 'InteractionAggregate')
+    UserFeed = apps.get_model('app', 'UserFeed')
+
+    for model in (Keyword, Feed, Article):
+        model.objects.update(public_id=models.F('id'))
+    _number(Keyword.objects.order_by('id'))
+    _number(Feed.objects.order_by('id'))
+    _number(Article.objects.order_by('published', 'id'))
+    _number(Interaction.objects.order_by('created_at', 'id'))
+    _number(UserFeed.objects.order_by('created_at', 'id'))
+
+    def new_key(model, column):
+        return Subquery(model.objects.filter(public_id=OuterRef(column)).values('id')[:1])
+
+    Article.objects.update(feed_id=new_key(Feed, 'feed_id'), story_id=new_key(Article, 'story_id'))
+    Link.objects.update(article_id=new_key(Article, 'article_id'), keyword_id=new_key(Keyword, 'keyword_id'))
+    ArticleContent.objects.update(article_id=new_key(Article, 'article_id'))
+    Interaction.objects.update(article_id=new_key(Article, 'article_id'), feed_id=new_key(Feed, 'feed_id'),
+                               keyword_id=new_key(Keyword, 'keyword_id'))
+    InteractionAggregate.objects.update(article_id=new_key(Article, 'article_id'))
+    UserFeed.objects.update(feed_id=new_key(Feed, 'feed_id'))
+
+    for model in (Keyword, Feed, Interaction, UserFeed):
+        _strip(model, 'id')
+    _strip(Article, 'id', 'feed_id', 'story_id')
+    _strip(Link, 'article_id', 'keyword_id')
+    _strip(ArticleContent, 'article_id')
+    _strip(Interaction, 'article_id', 'feed_id', 'keyword_id')
+    _strip(InteractionAggregate, 'article_id')
+    _strip(UserFeed, 'feed_id')
+
+
+# The key columns are still text here; 0016 changes their type.  Kept apart so PostgreSQL
+# checks the rewritten (deferred) foreign keys before the columns are altered.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_widen_uuid_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='public_id',
+            field=models.CharField(editable=False, max_length=36, null=True),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='public_id',
+            field=models.CharField(editable=False, max_length=36, null=True),
+        ),
+        migrations.AddField(
+            model_name='keyword',
+            name='public_id',
+            field=models.CharField(editable=False, max_length=36, null=True),
+        ),
+        migrations.RunPython(renumber, migrations.RunPython.noop, elidable=False),
+    ]
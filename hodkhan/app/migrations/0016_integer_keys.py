@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:28
+
+import app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_public_ids'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='article',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AlterField(
+            model_name='feed',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AlterField(
+            model_name='interaction',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AlterField(
+            model_name='keyword',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AlterField(
+            model_name='userfeed',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='public_id',
+            field=models.CharField(default=app.models.new_public_id, editable=False, max_length=36, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='feed',
+            name='public_id',
+            field=models.CharField(default=app.models.new_public_id, editable=False, max_length=36, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='keyword',
+            name='public_id',
+            field=models.CharField(default=app.models.new_public_id, editable=False, max_length=36, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['link'], name='app_article_link_31fc0a_idx'),
+        ),
+    ]
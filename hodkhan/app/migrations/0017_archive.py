@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_integer_keys'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedArticle',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('public_id', models.CharField(max_length=36, unique=True)),
+                ('title', models.CharField(max_length=500)),
+                ('abstract', models.TextField(null=True)),
+                ('keywords', models.JSONField(default=list)),
+                ('link', models.CharField(max_length=1000, null=True)),
+                ('published', models.IntegerField(null=True)),
+                ('cover', models.CharField(max_length=1000, null=True)),
+                ('vector', models.BinaryField(null=True)),
+                ('vector_scale', models.FloatField(null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('feed', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_articles', to='app.feed')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('liked', models.BooleanField(default=False)),
+                ('read', models.FloatField(blank=True, null=True)),
+                ('view', models.FloatField(blank=True, null=True)),
+                ('reads', models.IntegerField(default=0)),
+                ('views', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aggregates', to='app.archivedarticle')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedarticle',
+            index=models.Index(fields=['published'], name='app_archive_publish_cd5f76_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedarticle',
+            index=models.Index(fields=['link'], name='app_archive_link_1245ad_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='archivedaggregate',
+            constraint=models.UniqueConstraint(fields=('user', 'article'), name='unique_user_archived_article'),
+        ),
+    ]
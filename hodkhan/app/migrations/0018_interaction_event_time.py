@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:49
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0017_archive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='interaction',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,31 +1,40 @@
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from uuid import uuid4
 
 
+def new_public_id():
+    return str(uuid4())
+
+
 class Keyword(models.Model):
-    id = models.CharField(max_length=15, primary_key=True, default=uuid4, editable=False)
+    public_id = models.CharField(max_length=36, unique=True, default=new_public_id, editable=False)
     name = models.CharField(max_length=100)
     vector = models.TextField(null=True, blank=True)
+    # Number of article embeddings averaged into ``vector``
+    vector_count = models.IntegerField(default=0)
 
     def __str__(self):
         return self.name
 
 
 class Feed(models.Model):
-    id = models.CharField(max_length=15, primary_key=True, default=uuid4, editable=False)
+    public_id = models.CharField(max_length=36, unique=True, default=new_public_id, editable=False)
     name = models.CharField(max_length=300)
     address = models.CharField(max_length=500)
     favicon = models.CharField(max_length=500)
     type = models.CharField(max_length=500)
     vector = models.TextField(null=True, blank=True)
+    vector_count = models.IntegerField(default=0)
 
     def __str__(self):
         return self.name
 
 
 class Article(models.Model):
-    id = models.CharField(max_length=15, primary_key=True, default=uuid4, editable=False)
+    # Stable identifier used in URLs and the API; ``id`` is an internal integer key, as on Feed and Keyword
+    public_id = models.CharField(max_length=36, unique=True, default=new_public_id, editable=False)
     title = models.CharField(max_length=500)
     abstract = models.TextField(null=True)
     feed = models.ForeignKey(Feed, on_delete=models.CASCADE)
@@ -34,13 +43,37 @@ class Article(models.Model):
     published = models.IntegerField(null=True)
     cover = models.CharField(max_length=1000, null=True)
     vector = models.TextField(null=True, blank=True)
+    # Lead article of the near-duplicate story this one belongs to (null when it is the lead)
+    story = models.ForeignKey('self', on_delete=models.SET_NULL, related_name='duplicates', null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["published"]), models.Index(fields=["feed", "published"]),
+                   models.Index(fields=["link"])]
+
+    @property
+    def story_key(self):
+        return self.story_id or self.id
 
     def __str__(self):
         return self.title
 
 
+class ArticleContent(models.Model):
+    """Reader HTML extracted from the article page, zlib-compressed (see app/content_store.py)."""
+    article = models.OneToOneField(Article, on_delete=models.CASCADE, primary_key=True, related_name='content')
+    html = models.BinaryField()
+    # Validators of the source page, used to revalidate with a conditional GET
+    etag = models.CharField(max_length=300, null=True, blank=True)
+    last_modified = models.CharField(max_length=100, null=True, blank=True)
+    digest = models.CharField(max_length=64)
+    checked_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Content of {self.article_id}"
+
+
 class UserFeed(models.Model):
-    id = models.CharField(max_length=15, primary_key=True, default=uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     feed = models.ForeignKey(Feed, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -62,7 +95,6 @@ class Interaction(models.Model):
         ("follow", "Follow"),
     ]
 
-    id = models.CharField(max_length=15, primary_key=True, default=uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
     article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='interaction_article', null=True,
                                 blank=True)
@@ -73,7 +105,8 @@ class Interaction(models.Model):
     value = models.TextField(null=True, blank=True)
     # star = models.IntegerField(null=True, blank=True, default=0)
     is_trained = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # When the event happened; the event log compactor passes the logged time
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         indexes = [models.Index(fields=["user", "type"]), models.Index(fields=["article"])]
@@ -82,3 +115,78 @@ class Interaction(models.Model):
         user = self.user.username if self.user else "anonymous"
         return f"{user}: {self.type} {self.article_id if self.article_id else ''}"
 
+
+class InteractionAggregate(models.Model):
+    """A user's engagement with one article, compacted from the event log (see app/event_log.py)."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='aggregates')
+    liked = models.BooleanField(default=False)
+    # Latest dwell time on the article page / on its feed card
+    read = models.FloatField(null=True, blank=True)
+    view = models.FloatField(null=True, blank=True)
+    reads = models.IntegerField(default=0)
+    views = models.IntegerField(default=0)
+    is_trained = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["user", "article"], name="unique_user_article_aggregate")]
+        indexes = [models.Index(fields=["user", "is_trained"])]
+
+    def __str__(self):
+        return f"{self.user_id} on {self.article_id}"
+
+
+class ArchivedArticle(models.Model):
+    """An article past the retention window, moved out of ``Article`` (see app/archive.py)."""
+    # Same key and public id as the live row it replaced
+    id = models.BigIntegerField(primary_key=True)
+    public_id = models.CharField(max_length=36, unique=True)
+    title = models.CharField(max_length=500)
+    abstract = models.TextField(null=True)
+    feed = models.ForeignKey(Feed, on_delete=models.CASCADE, related_name='archived_articles')
+    # Names of the article's keywords
+    keywords = models.JSONField(default=list)
+    link = models.CharField(max_length=1000, null=True)
+    published = models.IntegerField(null=True)
+    cover = models.CharField(max_length=1000, null=True)
+    # int8-quantized embedding and its scale
+    vector = models.BinaryField(null=True)
+    vector_scale = models.FloatField(null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["published"]), models.Index(fields=["link"])]
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedAggregate(models.Model):
+    """``InteractionAggregate`` of an archived article, kept for the regressor and the account counters."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    article = models.ForeignKey(ArchivedArticle, on_delete=models.CASCADE, related_name='aggregates')
+    liked = models.BooleanField(default=False)
+    read = models.FloatField(null=True, blank=True)
+    view = models.FloatField(null=True, blank=True)
+    reads = models.IntegerField(default=0)
+    views = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["user", "article"], name="unique_user_archived_article")]
+
+    def __str__(self):
+        return f"{self.user_id} on archived {self.article_id}"
+
+
+class UserStats(models.Model):
+    """Engagement counters of one user, kept up to date incrementally (see app/user_stats.py)."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True,
+                                related_name='stats')
+    # Distinct articles viewed or read, and liked
+    viewed = models.IntegerField(default=0)
+    liked = models.IntegerField(default=0)
+    followed_feeds = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats of {self.user_id}"
@@ -0,0 +1,127 @@
+"""
+Short-lived caching of public responses.
+
+All cached data is keyed by a global content version that the crawler bumps
+whenever it inserts articles, so nothing has to be invalidated one key at a
+time.  ``cached_response`` stores whole responses of GET views for
+anonymous visitors (most of the traffic, identical within a minute) and
+gives them an ETag and a Last-Modified (the time of the current version);
+``ConditionalGetMiddleware`` turns repeat requests into 304s.  Streamed
+responses are passed through as they are produced and stored once the last
+chunk has been sent, if they are small enough.
+"""
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.checks import Tags, Warning, register
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+VERSION_KEY = 'content:version'
+# Streamed responses larger than this are not stored
+STREAM_CACHE_BYTES = 1 << 20
+
+
+# Backends that keep their entries inside one process
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',
+                        'django.core.cache.backends.dummy.DummyCache')
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs=None, **kwargs):
+    """The content version only invalidates other processes' pages through a cache they all share."""
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHES:
+        return [Warning(
+            f'The default cache ({backend}) is not shared between processes, so web workers never see the '
+            f'content version the crawler bumps and serve stale pages until they expire.',
+            hint='Use the file-based default or set CACHE_BACKEND/CACHE_LOCATION to a shared backend.',
+            id='app.W001',
+        )]
+    return []
+
+
+def content_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(VERSION_KEY, version, None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def bump_content_version():
+    """Invalidate every cached page and listing (called by the crawler after inserts)."""
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def versioned_key(*parts):
+    digest = hashlib.sha1(':'.join(map(str, parts)).encode()).hexdigest()
+    return f'{parts[0]}:{digest}:{content_version()}'
+
+
+def _entry(content, content_type):
+    return {'content': content, 'content_type': content_type, 'etag': '"%s"' % hashlib.md5(content).hexdigest()}
+
+
+def _store_when_sent(chunks, key, content_type, timeout):
+    parts, size = [], 0
+    for chunk in chunks:
+        if parts is not None:
+            parts.append(chunk)
+            size += len(chunk)
+            if size > STREAM_CACHE_BYTES:
+                parts = None
+        yield chunk
+    if parts is not None:
+        cache.set(key, _entry(b''.join(parts), content_type), timeout)
+
+
+def _patch_headers(response, max_age, anonymous_only):
+    patch_cache_control(response, max_age=max_age)
+    patch_vary_headers(response, ['Accept', 'Cookie'] if anonymous_only else ['Accept'])
+    return response
+
+
+def cached_response(view=None, timeout=None, anonymous_only=True):
+    """
+    Cache successful GET responses of ``view`` per URL and Accept header for
+    ``timeout`` seconds (``RESPONSE_CACHE_TIMEOUT``).  With ``anonymous_only`` logged-in
+    users always get a fresh response.  Responses that set cookies are not
+    stored.
+    """
+    if view is None:
+        return functools.partial(cached_response, timeout=timeout, anonymous_only=anonymous_only)
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or (anonymous_only and request.user.is_authenticated):
+            return view(request, *args, **kwargs)
+
+        max_age = settings.RESPONSE_CACHE_TIMEOUT if timeout is None else timeout
+        version = content_version()
+        key = versioned_key('response', request.build_absolute_uri(), request.META.get('HTTP_ACCEPT', ''))
+        cached = cache.get(key)
+        if cached is None:
+            response = view(request, *args, **kwargs)
+            if callable(getattr(response, 'render', None)):
+                response = response.render()
+            if response.status_code != 200 or response.cookies:
+                return response
+            if response.streaming:
+                response.streaming_content = _store_when_sent(response.streaming_content, key,
+                                                              response['Content-Type'], max_age)
+                return _patch_headers(response, max_age, anonymous_only)
+            cached = _entry(response.content, response['Content-Type'])
+            cache.set(key, cached, max_age)
+
+        response = HttpResponse(cached['content'], content_type=cached['content_type'])
+        response['ETag'] = cached['etag']
+        response['Last-Modified'] = http_date(version / 1e9)
+        return _patch_headers(response, max_age, anonymous_only)
+
+    return wrapper
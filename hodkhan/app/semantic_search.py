@@ -0,0 +1,142 @@
+"""
+Embedding-backed article search.
+
+The query is embedded once with GemmaEmbedding (memoised in an LRU cache),
+candidates come from the article vector index, and results can be fused
+with the lexical ``icontains`` ranking by reciprocal rank fusion.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+from app.vector_index import get_index
+
+_model = None
+_model_state = 'idle'  # idle -> loading -> ready | failed
+_model_lock = threading.Lock()
+# Queries are embedded here so a request can stop waiting once its budget is
+# spent; the embedding still finishes and lands in the LRU cache.  At most
+# EMBED_QUEUE_SIZE embeddings are pending, beyond that queries go lexical.
+EMBED_QUEUE_SIZE = 4
+_embedder = ThreadPoolExecutor(max_workers=2, thread_name_prefix='embed')
+_embed_slots = threading.BoundedSemaphore(EMBED_QUEUE_SIZE)
+logger = logging.getLogger(__name__)
+
+
+def _load_model():
+    global _model, _model_state
+    try:
+        from app.management.commands.gemma_embedding import GemmaEmbedding
+        _model = GemmaEmbedding(
+            model_path=settings.EMBEDDING_MODEL_PATH,
+            device='auto',
+            normalize=True,
+            cache_embeddings=False,
+            seed=42,
+        )
+        _model_state = 'ready'
+        logger.info('Embedding model loaded from %s', settings.EMBEDDING_MODEL_PATH)
+    except Exception as e:
+        logger.warning('Semantic search disabled, embedding model not available: %s', e)
+        _model_state = 'failed'
+
+
+def get_model():
+    """
+    Return the embedding model, or None while it is still loading.
+
+    Loading takes seconds, so the first request starts it in the background
+    and falls back to lexical search instead of blocking.
+    """
+    global _model_state
+    with _model_lock:
+        if _model_state == 'idle':
+            _model_state = 'loading'
+            threading.Thread(target=_load_model, daemon=True).start()
+    return _model if _model_state == 'ready' else None
+
+
+@lru_cache(maxsize=1024)
+def _embed(text):
+    vector = np.asarray(_model.get_embedding(text), dtype=np.float32)
+    vector.setflags(write=False)
+    return vector
+
+
+def embed_query(text, timeout=None):
+    """
+    The query's vector, or None if the model is not loaded, the embedder is
+    saturated or ``timeout`` seconds pass first.
+    """
+    if get_model() is None:
+        return None
+    if not _embed_slots.acquire(blocking=False):
+        logger.info('Embedding queue full, serving lexical results')
+        return None
+    future = _embedder.submit(_embed, ' '.join(text.split()))
+    future.add_done_callback(lambda _: _embed_slots.release())
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        return None
+
+
+def semantic_search(query, k=24, since=None, budget_ms=None):
+    """
+    Return ``[(article_id, score), ...]`` for ``query`` or None when the
+    semantic path is unavailable or blew its latency budget, in which case
+    callers should serve lexical results only.
+    """
+    budget_ms = settings.SEMANTIC_SEARCH_BUDGET_MS if budget_ms is None else budget_ms
+    start = time.perf_counter()
+
+    index = get_index()
+    if index is None:
+        return None
+    remaining_ms = budget_ms - (time.perf_counter() - start) * 1000
+    if remaining_ms <= 0:
+        return None
+    vector = embed_query(query, timeout=remaining_ms / 1000)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if vector is None:
+        if elapsed_ms >= budget_ms:
+            logger.info('Semantic search over budget while embedding: %.1fms', elapsed_ms)
+        return None
+    if len(vector) != index.dim:
+        return None
+
+    # Spend less of the remaining budget on probing when embedding was slow.
+    nprobe = 16 if elapsed_ms < budget_ms / 2 else 4
+    return index.search(vector, k=k, nprobe=nprobe, since=since)
+
+
+def reciprocal_rank_fusion(*rankings, k=60):
+    """Fuse ranked id lists; ids found by several rankings float to the top."""
+    scores = {}
+    for ranking in rankings:
+        for rank, article_id in enumerate(ranking):
+            scores[article_id] = scores.get(article_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def search_ids(query, lexical_ids, mode='hybrid', k=24):
+    """
+    Rank article ids for ``query`` according to ``mode``:
+    ``lexical`` keeps ``lexical_ids``, ``semantic`` uses only the vector
+    index and ``hybrid`` fuses both.  Falls back to lexical when needed.
+    """
+    lexical_ids = list(lexical_ids)
+    if mode not in ('semantic', 'hybrid'):
+        return lexical_ids
+    hits = semantic_search(query, k=k)
+    if hits is None:
+        return lexical_ids
+    semantic_ids = [article_id for article_id, _ in hits]
+    if mode == 'semantic':
+        return semantic_ids
+    return reciprocal_rank_fusion(lexical_ids, semantic_ids)[:k]
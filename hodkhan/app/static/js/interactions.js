@@ -0,0 +1,52 @@
+// Collects view/read/like events and posts them to /api/interactions/ in batches
+(function () {
+    const MAX_EVENTS = 20;
+    const FLUSH_MS = 2000;
+    let queue = [];
+    let timer = null;
+
+    function csrfToken() {
+        const meta = document.querySelector('meta[name="csrf-token"]');
+        if (meta) {
+            return meta.getAttribute('content');
+        }
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? match[1] : '';
+    }
+
+    function flushInteractions() {
+        clearTimeout(timer);
+        timer = null;
+        if (!queue.length) {
+            return;
+        }
+        const events = queue;
+        queue = [];
+        fetch('/api/interactions/', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken()},
+            body: JSON.stringify(events),
+            credentials: 'same-origin',
+            keepalive: true,
+        }).catch(error => console.error('Error:', error));
+    }
+
+    function queueInteraction(type, article, value) {
+        queue.push({type: type, article: article, value: value});
+        if (queue.length >= MAX_EVENTS) {
+            flushInteractions();
+        } else if (timer === null) {
+            timer = setTimeout(flushInteractions, FLUSH_MS);
+        }
+    }
+
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'hidden') {
+            flushInteractions();
+        }
+    });
+    window.addEventListener('pagehide', flushInteractions);
+
+    window.queueInteraction = queueInteraction;
+    window.flushInteractions = flushInteractions;
+})();
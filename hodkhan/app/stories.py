@@ -0,0 +1,112 @@
+"""
+Near-duplicate story clustering.
+
+Agencies republish the same wire story within minutes.  At ingestion a new
+article joins the story of its most similar recent article (cosine
+similarity of the embeddings, looked up in the vector index and among the
+other articles of the same crawl cycle).  ``Article.story`` points at the
+story's lead article; readers collapse a story down to its best ranked copy.
+"""
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import Coalesce, RowNumber
+
+from app.models import Article
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def assign_stories(articles, index=None):
+    """
+    Set ``story`` on unsaved articles that carry an ``embedding``.  A lead
+    from the same batch is assigned as an unsaved instance, so articles must
+    be saved in the given order for leads to get their keys before their
+    duplicates.  Returns how many articles joined an existing story.
+    """
+    threshold = settings.STORY_SIMILARITY
+    since = int(time.time()) - settings.STORY_WINDOW_HOURS * 3600
+    articles = [a for a in articles if getattr(a, 'embedding', None) is not None]
+
+    nearest = {}
+    if index is not None and len(index):
+        for i, article in enumerate(articles):
+            if len(article.embedding) != index.dim:
+                continue
+            hits = index.search(article.embedding, k=1, since=since)
+            if hits and hits[0][1] >= threshold:
+                nearest[i] = hits[0]
+    lead_of = dict(Article.objects.filter(id__in=[hit for hit, _ in nearest.values()])
+                   .values_list('id', 'story_id'))
+
+    # Story lead of each batch article: a saved article's id or an article of this batch
+    batch_vectors, batch_leads = [], []
+    clustered = 0
+    for i, article in enumerate(articles):
+        vector = _unit(article.embedding)
+        best, lead = threshold, None
+        hit = nearest.get(i)
+        if hit and hit[0] in lead_of:
+            lead, best = lead_of[hit[0]] or hit[0], hit[1]
+        if batch_vectors:
+            scores = np.vstack(batch_vectors) @ vector
+            j = int(np.argmax(scores))
+            if scores[j] >= best:
+                lead = batch_leads[j]
+        if isinstance(lead, Article):
+            article.story = lead
+        else:
+            article.story_id = lead
+        batch_vectors.append(vector)
+        batch_leads.append(lead or article)
+        clustered += lead is not None
+    return clustered
+
+
+def collapse_stories(ids, limit=None, chunk=200):
+    """Keep only the first (best ranked) article of every story in ``ids``."""
+    kept, seen = [], set()
+    for start in range(0, len(ids), chunk):
+        part = ids[start:start + chunk]
+        story_of = dict(Article.objects.filter(id__in=part).values_list('id', 'story_id'))
+        for article_id in part:
+            key = story_of.get(article_id) or article_id
+            if key in seen:
+                continue
+            seen.add(key)
+            kept.append(article_id)
+            if limit and len(kept) >= limit:
+                return kept
+    return kept
+
+
+def promote_duplicates(lead_ids):
+    """
+    Called before the articles ``lead_ids`` are deleted: the oldest remaining
+    duplicate of each of their stories becomes its lead, so the story's other
+    copies keep pointing at one article instead of losing their story.
+    """
+    new_leads = {}
+    duplicates = (Article.objects.filter(story_id__in=lead_ids).exclude(id__in=lead_ids)
+                  .order_by('published', 'id').values_list('id', 'story_id'))
+    for article_id, story_id in duplicates:
+        new_leads.setdefault(story_id, article_id)
+    for old, new in new_leads.items():
+        Article.objects.filter(story_id=old).exclude(id__in=lead_ids).exclude(id=new).update(story_id=new)
+        Article.objects.filter(id=new).update(story_id=None)
+
+
+def collapse_queryset(articles):
+    """
+    Keep the newest article of every story in ``articles``, whether or not
+    the story's lead is among them.
+    """
+    return articles.annotate(story_rank=Window(
+        RowNumber(), partition_by=Coalesce('story_id', 'id'), order_by=[F('published').desc(), F('id').desc()],
+    )).filter(story_rank=1)
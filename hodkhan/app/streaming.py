@@ -0,0 +1,101 @@
+"""
+Incremental JSON responses.
+
+Rows are serialized one at a time as they come out of a server-side cursor
+(``QuerySet.iterator(chunk_size=...)``) instead of being collected into a
+list first, so memory stays flat whatever the size of the result and the
+first bytes leave as soon as the first rows are read.  Two encodings:
+NDJSON (one object per line, ``application/x-ndjson``) for bulk consumers,
+and a JSON object holding the rows as an array -- the same bytes
+``JsonResponse({'result': rows})`` would send -- for the browser.
+"""
+import contextvars
+import json
+import re
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+
+NDJSON = 'application/x-ndjson'
+CHUNK_SIZE = 2000
+# Serialized rows are sent in writes of about this size
+WRITE_BYTES = 64 * 1024
+
+
+def dumps(obj):
+    return json.dumps(obj, cls=DjangoJSONEncoder)
+
+
+def _buffered(pieces):
+    """Join text ``pieces`` into byte chunks; the first one is sent alone to keep the time to first byte low."""
+    buffer, size, first = [], 0, True
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if first or size >= WRITE_BYTES:
+            yield ''.join(buffer).encode()
+            buffer, size, first = [], 0, False
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def ndjson(rows):
+    return _buffered(dumps(row) + '\n' for row in rows)
+
+
+def json_array(rows, key='result'):
+    def pieces():
+        yield '{%s: [' % dumps(key)
+        for i, row in enumerate(rows):
+            yield (', ' if i else '') + dumps(row)
+        yield ']}'
+    return _buffered(pieces())
+
+
+def wants_ndjson(request):
+    return request.GET.get('format') == 'ndjson' or NDJSON in request.META.get('HTTP_ACCEPT', '')
+
+
+def accepts_gzip(request):
+    return bool(re.search(r'\bgzip\b', request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+
+def _in_context(chunks):
+    """
+    Iterate ``chunks`` in a copy of the caller's context.  The rows are only
+    read once the view has returned, and without this their queries would
+    lose the view's ``read_only`` routing.
+    """
+    context = contextvars.copy_context()
+    chunks = iter(chunks)
+    while True:
+        try:
+            yield context.run(next, chunks)
+        except StopIteration:
+            return
+
+
+def ndjson_response(rows, gzip=False):
+    """Stream ``rows`` as NDJSON, gzip-compressed on the fly with ``gzip``."""
+    chunks = ndjson(rows)
+    if gzip:
+        chunks = compress_sequence(chunks)
+    response = StreamingHttpResponse(_in_context(chunks), content_type=NDJSON)
+    if gzip:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def stream_rows(request, rows, key='result'):
+    """Stream ``rows`` (an iterable of dicts) as NDJSON when the client asks for it, else as ``{key: [...]}``."""
+    if wants_ndjson(request):
+        return ndjson_response(rows)
+    return StreamingHttpResponse(_in_context(json_array(rows, key)), content_type='application/json')
+
+
+def iterate(queryset, chunk_size=CHUNK_SIZE):
+    """``queryset`` read through a server-side cursor, ``chunk_size`` rows per fetch."""
+    return queryset.iterator(chunk_size=chunk_size)
@@ -0,0 +1,886 @@
+import gzip
+import json
+import io
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+
+import feedparser
+import numpy as np
+import requests
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import JsonResponse
+from django.db import DatabaseError, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from app import content_store, event_log, http_client, image_proxy, user_stats
+from app.archive import archive, dequantize
+from app.aggregates import update_centroids
+from app.content_store import get_reader_html
+from app.databases import READ_ALIAS, ReadOnlyRouter, read_only
+from app.interaction_buffer import InteractionBuffer
+from app.management.commands.crawler_tool import clean_caption, minify_html, process_html, resolve_cover
+from app.management.commands.prefetch_content import Command as PrefetchCommand
+from app.models import (ArchivedAggregate, ArchivedArticle, Article, ArticleContent, Feed, Interaction,
+                        InteractionAggregate, Keyword, UserFeed, UserStats)
+from app.response_cache import bump_content_version, check_shared_cache
+from app.stories import assign_stories, collapse_queryset, collapse_stories
+from app.streaming import NDJSON, json_array
+from app.topics import TopicClassifier, assign_topics
+from app.vector_index import VectorIndex, BRUTE_FORCE_LIMIT, format_vector, parse_vector
+
+
+def make_feed(name='ایسنا'):
+    return Feed.objects.create(name=name, address='http://example.com/rss', favicon='', type='rss')
+
+
+class TempDirMixin:
+    """Scratch directories removed after each test."""
+
+    def temp_dir(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        return Path(tmp.name)
+
+    def setting_in_temp_dir(self, name):
+        """Point the directory setting ``name`` at a scratch directory for this test and return it."""
+        path = self.temp_dir()
+        override = override_settings(**{name: path})
+        override.enable()
+        self.addCleanup(override.disable)
+        return path
+
+
+class VectorIndexTests(TempDirMixin, SimpleTestCase):
+    def setUp(self):
+        self.dir = self.temp_dir()
+        self.rng = np.random.default_rng(0)
+
+    def _index(self, n, dim=32):
+        index = VectorIndex.open(self.dir, dim=dim, writable=True)
+        vectors = self.rng.normal(size=(n, dim)).astype(np.float32)
+        index.add(list(range(n)), vectors, list(range(n)))
+        return index, vectors
+
+    def test_exact_match_is_first(self):
+        index, vectors = self._index(100)
+        hits = index.search(vectors[42], k=5)
+        self.assertEqual(hits[0][0], 42)
+        self.assertAlmostEqual(hits[0][1], 1.0, places=5)
+        self.assertEqual(len(hits), 5)
+
+    def test_duplicates_skipped_and_persisted(self):
+        index, vectors = self._index(10)
+        self.assertEqual(index.add([3], vectors[3:4], [3]), 0)
+        reader = VectorIndex.open(self.dir)
+        self.assertEqual(len(reader), 10)
+        np.testing.assert_allclose(reader.vector(3), vectors[3] / np.linalg.norm(vectors[3]), rtol=1e-6)
+
+    def test_ivf_recall(self):
+        index, vectors = self._index(BRUTE_FORCE_LIMIT * 2)
+        self.assertIsNotNone(index.centroids)
+        found = sum(index.search(vectors[i], k=1, nprobe=4)[0][0] == i for i in range(50))
+        self.assertGreaterEqual(found, 45)
+
+    def test_since_and_exclude(self):
+        index, vectors = self._index(50)
+        hits = index.search(vectors[10], k=50, since=20, exclude=[30])
+        ids = {article_id for article_id, _ in hits}
+        self.assertEqual(len(ids), 29)
+        self.assertNotIn(10, ids)
+        self.assertNotIn(30, ids)
+
+    def test_compact_keeps_recent_rows_contiguous(self):
+        index, vectors = self._index(100)
+        self.assertEqual(index.compact(before=60), 60)
+        ids, matrix = index.recent(since=80)
+        self.assertEqual(ids, list(range(80, 100)))
+        self.assertIsInstance(matrix, np.memmap)
+        reader = VectorIndex.open(self.dir)
+        self.assertEqual(len(reader), 40)
+        self.assertIsNone(reader.row_of(10))
+        self.assertEqual(reader.search(vectors[70], k=1)[0][0], 70)
+
+    def test_compaction_publishes_a_new_generation(self):
+        index, vectors = self._index(100)
+        reader = VectorIndex.open(self.dir)
+        index.compact(before=60)
+        # Readers keep their mapping of the old files; new ones open the new generation
+        self.assertEqual(reader.search(vectors[10], k=1)[0][0], 10)
+        self.assertEqual(VectorIndex.open(self.dir).search(vectors[70], k=1)[0][0], 70)
+        self.assertEqual(sorted(p.name for p in self.dir.iterdir() if p.suffix in ('.f32', '.npy')),
+                         ['cells.1.npy', 'ids.1.npy', 'published.1.npy', 'vectors.1.f32'])
+
+    def test_get_index_keeps_the_previous_index_when_opening_fails(self):
+        from app import vector_index
+        self._index(10)
+        with override_settings(VECTOR_INDEX_DIR=self.dir), mock.patch.object(vector_index, '_index', None):
+            index = vector_index.get_index()
+            meta = json.loads((self.dir / 'meta.json').read_text())
+            (self.dir / 'meta.json').write_text(json.dumps({**meta, 'generation': 7}))
+            os.utime(self.dir / 'meta.json', ns=(0, 1))
+            self.assertIs(vector_index.get_index(), index)
+
+    def test_index_of_string_ids_reads_as_empty(self):
+        index, vectors = self._index(10)
+        np.save(self.dir / 'ids.npy', np.array([str(i) for i in range(10)], dtype='U36'))
+        index = VectorIndex.open(self.dir, writable=True)
+        self.assertEqual((len(index), index.search(vectors[3], k=1)), (0, []))
+        index.add([3], vectors[3:4], [3])
+        self.assertEqual(VectorIndex.open(self.dir).search(vectors[3], k=1)[0][0], 3)
+
+
+class SemanticSearchTests(TempDirMixin, SimpleTestCase):
+    def test_reciprocal_rank_fusion(self):
+        from app.semantic_search import reciprocal_rank_fusion
+        fused = reciprocal_rank_fusion(['a', 'b', 'c'], ['c', 'd'])
+        self.assertEqual(fused[0], 'c')
+        self.assertEqual(set(fused), {'a', 'b', 'c', 'd'})
+
+    def test_lexical_mode_passthrough(self):
+        from app.semantic_search import search_ids
+        self.assertEqual(search_ids('خبر', ['x', 'y'], mode='lexical'), ['x', 'y'])
+
+    def _stub_model(self, embed):
+        vectors = np.eye(8, dtype=np.float32)
+        index = VectorIndex.open(self.temp_dir(), dim=8, writable=True)
+        index.add(list(range(8)), vectors, list(range(8)))
+        for patch in (mock.patch('app.semantic_search.get_index', return_value=index),
+                      mock.patch('app.semantic_search.get_model', return_value=object()),
+                      mock.patch('app.semantic_search._embed', side_effect=embed)):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_hybrid_fuses_both_rankings(self):
+        from app.semantic_search import search_ids
+        query = np.eye(8, dtype=np.float32)[3] + 0.5 * np.eye(8, dtype=np.float32)[6]
+        self._stub_model(lambda text: query)
+        self.assertEqual(search_ids('خبر', [6], mode='semantic', k=2), [3, 6])
+        # 6 is found by both rankings, so it leads; 3 outranks the second lexical hit
+        self.assertEqual(search_ids('خبر', [6, 5], mode='hybrid', k=3), [6, 3, 5])
+
+    @override_settings(SEMANTIC_SEARCH_BUDGET_MS=50)
+    def test_slow_embedding_falls_back_to_lexical(self):
+        from app.semantic_search import search_ids
+
+        def slow(text):
+            time.sleep(0.5)
+            return np.eye(8, dtype=np.float32)[0]
+        self._stub_model(slow)
+        start = time.perf_counter()
+        self.assertEqual(search_ids('خبر', [5, 6], mode='hybrid'), [5, 6])
+        self.assertLess(time.perf_counter() - start, 0.4)
+
+    def test_saturated_embedder_falls_back_without_queueing(self):
+        from app import semantic_search
+
+        release = threading.Event()
+        self._stub_model(lambda text: release.wait() and np.eye(8, dtype=np.float32)[0])
+        self.addCleanup(release.set)
+        for i in range(semantic_search.EMBED_QUEUE_SIZE):
+            self.assertIsNone(semantic_search.embed_query(f'خبر {i}', timeout=0))
+        with mock.patch.object(semantic_search._embedder, 'submit') as submit:
+            self.assertIsNone(semantic_search.embed_query('خبر', timeout=1))
+        submit.assert_not_called()
+
+        release.set()
+        semantic_search._embedder.submit(lambda: None).result()
+        self.assertIsNotNone(semantic_search.embed_query('خبر', timeout=1))
+
+
+class RankRecentTests(TempDirMixin, TestCase):
+    def setUp(self):
+        feed = make_feed()
+        self.vectors = np.eye(4, dtype=np.float32)
+        self.articles = [Article.objects.create(title='t', feed=feed, link=str(i), published=int(time.time()),
+                                                vector=format_vector(self.vectors[i])) for i in range(3)]
+        self.index = VectorIndex.open(self.temp_dir(), dim=4, writable=True)
+        patch = mock.patch('app.vector_index.get_index', return_value=self.index)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def _rank(self):
+        from app.views import rank_recent
+        mlp = mock.Mock(predict=lambda matrix: np.asarray(matrix) @ np.arange(4))
+        return rank_recent(mlp, cutoff=0)
+
+    def test_articles_missing_from_the_index_are_read_from_the_db(self):
+        # An empty index, e.g. one built on the old string ids
+        ids = [a.id for a in self.articles]
+        self.assertEqual(self._rank(), (ids[::-1], [2, 1, 0]))
+        # Only the article whose add failed during the crawl comes from the DB
+        self.index.add(ids[:2], self.vectors[:2], [a.published for a in self.articles[:2]])
+        self.assertEqual(self._rank(), (ids[::-1], [2, 1, 0]))
+
+
+class StoryTests(TestCase):
+    def setUp(self):
+        self.feed = make_feed('ایرنا')
+
+    def _article(self, title, vector, **kwargs):
+        article = Article(title=title, abstract='', feed=self.feed, link=f'http://example.com/{title}',
+                          published=int(time.time()), **kwargs)
+        article.embedding = np.asarray(vector, dtype=np.float32)
+        return article
+
+    @override_settings(STORY_SIMILARITY=0.9, STORY_WINDOW_HOURS=12)
+    def test_same_cycle_duplicates_share_a_story(self):
+        lead = self._article('a', [1, 0, 0])
+        copy = self._article('b', [0.99, 0.05, 0])
+        other = self._article('c', [0, 1, 0])
+        self.assertEqual(assign_stories([lead, copy, other]), 1)
+        for article in (lead, copy, other):
+            article.save()
+        lead, copy, other = (Article.objects.get(link=a.link) for a in (lead, copy, other))
+        self.assertIsNone(lead.story_id)
+        self.assertEqual(copy.story_id, lead.id)
+        self.assertIsNone(other.story_id)
+        self.assertEqual(collapse_stories([copy.id, other.id, lead.id]), [copy.id, other.id])
+
+    def test_collapse_keeps_one_article_per_story(self):
+        lead = Article.objects.create(title='a', feed=self.feed, link='a', published=1)
+        copies = [Article.objects.create(title='b', feed=self.feed, link=f'b{i}', published=2 + i, story=lead)
+                  for i in range(3)]
+        other = Article.objects.create(title='c', feed=self.feed, link='c', published=2)
+        window = Article.objects.filter(published__gte=2)
+        self.assertEqual(sorted(collapse_queryset(window).values_list('id', flat=True)), [copies[2].id, other.id])
+        # Archiving the lead hands the story to its oldest copy
+        archive(before=2)
+        self.assertEqual(set(Article.objects.filter(story__isnull=False).values_list('story_id', flat=True)),
+                         {copies[0].id})
+        self.assertEqual(collapse_queryset(Article.objects.all()).count(), 2)
+
+
+class CentroidTests(TestCase):
+    def test_streaming_mean_matches_full_mean(self):
+        feed = make_feed()
+        keyword = Keyword.objects.create(name='ورزش')
+        vectors = np.random.default_rng(1).normal(size=(7, 4)).astype(np.float32)
+        for start, end in ((0, 3), (3, 4), (4, 7)):
+            batch = []
+            for vector in vectors[start:end]:
+                article = Article.objects.create(title='t', feed=feed, link=str(vector[0]), published=0)
+                article.keyword.add(keyword)
+                article.embedding = vector
+                batch.append(article)
+            self.assertEqual(update_centroids(batch), (1, 1))
+
+        for obj in (Feed.objects.get(), Keyword.objects.get()):
+            self.assertEqual(obj.vector_count, 7)
+            np.testing.assert_allclose(parse_vector(obj.vector), vectors.mean(axis=0), rtol=1e-5, atol=1e-6)
+
+
+class ContentStoreTests(TestCase):
+    PAGE = '<html><head><title>t</title></head><body><article><p>' + 'متن خبر ' * 50 + '</p></article></body></html>'
+
+    def setUp(self):
+        feed = make_feed('ایرنا')
+        self.article = Article.objects.create(title='t', feed=feed, link='http://example.com/1', published=0)
+
+    def _response(self, status=200, body=PAGE):
+        response = mock.Mock(status_code=status, text=body, content=body.encode(), headers={'ETag': '"v1"'})
+        response.raise_for_status = mock.Mock()
+        return response
+
+    def test_extracts_once_and_revalidates(self):
+        with mock.patch('app.content_store.http_client.get', return_value=self._response()) as get:
+            first = get_reader_html(self.article)
+            self.assertIn('متن خبر', first)
+            self.assertEqual(get_reader_html(self.article), first)
+            self.assertEqual(get.call_count, 1)
+
+        with mock.patch('app.content_store.http_client.get') as get, \
+                mock.patch.object(content_store._revalidator, 'submit') as submit:
+            self.assertEqual(get_reader_html(self.article, max_age=0), first)
+            self.assertEqual(get_reader_html(self.article, max_age=0), first)
+            get.assert_not_called()
+        submit.assert_called_once()
+
+        with mock.patch('app.content_store.http_client.get', return_value=self._response(304, '')) as get, \
+                mock.patch('app.management.commands.crawler_tool.process_html') as process, \
+                mock.patch('app.content_store.connection'):
+            submit.call_args.args[0](*submit.call_args.args[1:])
+            self.assertEqual(get.call_args.kwargs['headers']['If-None-Match'], '"v1"')
+            process.assert_not_called()
+        self.assertNotIn(self.article.pk, content_store._revalidating)
+
+
+class PrefetchTests(TestCase):
+    def test_candidates_rank_climbing_articles_and_skip_fresh_content(self):
+        feed = make_feed('ایرنا')
+        hot, cooling, cached = (Article.objects.create(title='t', feed=feed, link=f'http://example.com/{i}', published=0)
+                                for i in range(3))
+        earlier = timezone.now() - timedelta(minutes=90)
+        for article, recent, before in ((hot, 5, 1), (cooling, 1, 4), (cached, 3, 0)):
+            for _ in range(recent):
+                Interaction.objects.create(article=article, type='read')
+            for _ in range(before):
+                Interaction.objects.filter(pk=Interaction.objects.create(article=article, type='view').pk) \
+                    .update(created_at=earlier)
+        ArticleContent.objects.create(article=cached, html=b'', checked_at=timezone.now())
+
+        ids = PrefetchCommand().candidates({'window': 3600, 'trending': 10, 'top': 0})
+        self.assertEqual(ids, [hot.id])
+
+    def test_top_candidates_are_the_most_engaged_stories(self):
+        feed = make_feed('ایرنا')
+        now = int(time.time())
+        quiet, popular, copy, newest = (Article.objects.create(title='t', feed=feed, link=str(i), published=now - 10 + i)
+                                        for i in range(4))
+        copy.story = popular
+        copy.save()
+        reader = User.objects.create_user('reader')
+        InteractionAggregate.objects.create(user=reader, article=popular, reads=3, views=5)
+        InteractionAggregate.objects.create(user=reader, article=copy, reads=1)
+        InteractionAggregate.objects.create(user=reader, article=quiet, views=1)
+        ids = PrefetchCommand().candidates({'window': 3600, 'trending': 0, 'top': 3})
+        self.assertEqual(ids, [popular.id, quiet.id, newest.id])
+
+
+class ExtractionTests(SimpleTestCase):
+    PAGES = Path(__file__).resolve().parent / 'testdata' / 'pages'
+
+    def _process(self, name):
+        return process_html((self.PAGES / name).read_text(encoding='utf-8'))
+
+    def test_primary_video_and_cover(self):
+        self.assertIn('<div id="iframe"> <iframe style="background: rgba(0,0,0,.1)" '
+                      'src="https://www.aparat.com/embed/Xk3Pq?data[rnddiv]=v1"', self._process('aparat_video.html'))
+        self.assertIn('<video controls> <source src="https://example.com/media/flood.mp4">',
+                      self._process('source_video.html'))
+        self.assertTrue(self._process('og_image.html').startswith(
+            '<img src="https://example.com/images/cabinet.jpg" alt="Cover Image"'))
+        self.assertTrue(self._process('first_image.html').startswith(
+            '<img src="https://example.com/images/gold.jpg" alt="Cover Image"'))
+
+    def test_main_content_only(self):
+        html = self._process('og_image.html')
+        self.assertIn('نشست هیئت دولت صبح امروز', html)
+        self.assertNotIn('خبر مرتبط شماره', html)
+        self.assertNotIn('dataLayer', html)
+        self.assertNotIn('\n', html)
+
+    def test_minify(self):
+        self.assertEqual(minify_html('<p>\n  a \t\n b\n</p>\n\n<p>c</p>'), '<p> a b</p><p>c</p>')
+        self.assertEqual(process_html('  '), '')
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    clients = set()
+
+    def do_GET(self):
+        self.clients.add(self.client_address)
+        if self.path == '/slow':
+            time.sleep(1)
+        body = 'سلام'.encode() * (1000 if self.path == '/big' else 1)
+        self.send_response(200)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(HTTP_TIMEOUT=(1, 0.3), HTTP_MAX_BYTES=1024, HTTP_RETRIES=0)
+class HttpClientTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _StandInHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_keep_alive_and_gzip(self):
+        _StandInHandler.clients.clear()
+        for _ in range(3):
+            self.assertEqual(http_client.get(self.base + '/').text, 'سلام')
+        self.assertEqual(len(_StandInHandler.clients), 1)
+
+    def test_size_cap_and_timeout(self):
+        with self.assertRaises(http_client.ResponseTooLarge):
+            http_client.get(self.base + '/big', headers={'Accept-Encoding': 'identity'})
+        with self.assertRaises(requests.Timeout):
+            http_client.get(self.base + '/slow')
+
+
+class CoverTests(TestCase):
+    FEED = '''<?xml version="1.0"?>
+<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/"><channel><title>t</title>
+<item><title>a</title><link>http://example.com/a</link><media:content url="http://example.com/a.jpg" medium="image"/></item>
+<item><title>b</title><link>http://example.com/b</link><enclosure url="http://example.com/b.jpg" type="image/jpeg"/></item>
+<item><title>c</title><link>http://example.com/c</link><media:thumbnail url="http://example.com/c.jpg"/></item>
+<item><title>d</title><link>http://example.com/d</link><description>&lt;img src="http://example.com/d.jpg"&gt;</description></item>
+<item><title>e</title><link>http://example.com/e</link><description>متن</description></item>
+</channel></rss>'''
+
+    def test_feed_sources_before_page_fetch(self):
+        page = mock.Mock(text='<img src="http://example.com/e.jpg"><p>x</p>')
+        with mock.patch('app.management.commands.crawler_tool.fetch_page', return_value=page) as fetch:
+            covers = [resolve_cover(entry) for entry in feedparser.parse(self.FEED).entries]
+        self.assertEqual(covers, [
+            ('http://example.com/a.jpg', 'media_content', None),
+            ('http://example.com/b.jpg', 'enclosure', None),
+            ('http://example.com/c.jpg', 'media_thumbnail', None),
+            ('http://example.com/d.jpg', 'summary', None),
+            ('http://example.com/e.jpg', 'page', page),
+        ])
+        fetch.assert_called_once_with('http://example.com/e')
+
+    def test_fetched_page_is_stored_for_the_first_view(self):
+        body = ContentStoreTests.PAGE
+        page = mock.Mock(text=body, content=body.encode(), headers={'ETag': '"v1"'})
+        article = Article.objects.create(title='e', feed=make_feed('ایرنا'), link='http://example.com/e', published=0)
+        content_store.store(article, page)
+
+        with mock.patch('app.content_store.http_client.get') as get:
+            self.assertIn('متن خبر', get_reader_html(article))
+        get.assert_not_called()
+
+
+class ImageProxyTests(TempDirMixin, SimpleTestCase):
+    URL = 'https://example.com/cover.jpg'
+
+    def setUp(self):
+        self.setting_in_temp_dir('IMAGE_CACHE_DIR')
+        out = io.BytesIO()
+        Image.new('RGB', (1600, 900), 'red').save(out, 'JPEG')
+        self.original = mock.Mock(content=out.getvalue(), raise_for_status=mock.Mock())
+
+    def test_resized_webp_is_cached(self):
+        with mock.patch('app.image_proxy.http_client.get', return_value=self.original) as get:
+            for _ in range(2):
+                response = self.client.get(image_proxy.proxy_url(self.URL))
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('max-age=31536000', response['Cache-Control'])
+                with Image.open(io.BytesIO(b''.join(response.streaming_content))) as image:
+                    self.assertEqual((image.format, image.size), ('WEBP', (480, 270)))
+            get.assert_called_once_with(self.URL)
+
+    def test_rejects_unsigned_urls(self):
+        url = image_proxy.proxy_url(self.URL).replace('/card/', '/large/')
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_evicts_least_recently_used(self):
+        with mock.patch('app.image_proxy.http_client.get', return_value=self.original):
+            old, new = (image_proxy.get_image(f'https://example.com/{i}.jpg', 'card') for i in range(2))
+        os.utime(old, (0, 0))
+        self.assertEqual(image_proxy.evict(max_bytes=new.stat().st_size), 1)
+        self.assertFalse(old.exists())
+        self.assertTrue(new.exists())
+
+
+class CleanCaptionTests(SimpleTestCase):
+    # Where the HTML5 reference rules differ from the old BeautifulSoup output: an
+    # unknown entity keeps its semicolon, as in browsers
+    DIVERGENCES = {
+        'Tom &amp Jerry &copy 2024 &unknown; &#147;quoted&#148;': 'Tom & Jerry © 2024 &unknown; “quoted”',
+    }
+
+    def test_matches_the_beautifulsoup_implementation(self):
+        # Expected values were produced by the previous BeautifulSoup implementation
+        corpus = json.loads((Path(__file__).resolve().parent / 'testdata' / 'captions.json').read_text(encoding='utf-8'))
+        for case in corpus:
+            with self.subTest(caption=case['caption']):
+                expected = self.DIVERGENCES.get(case['caption'], case['expected'])
+                self.assertEqual(clean_caption(case['caption']), expected)
+
+
+class TopicTests(TestCase):
+    def test_batch_prediction_is_stored_as_keyword(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+
+        train = {'ورزش': ['تیم ملی فوتبال در بازی امروز برد', 'بازیکن فوتبال گل زد'],
+                 'اقتصاد': ['قیمت دلار در بازار ارز افزایش یافت', 'بورس و بازار سرمایه رشد کرد']}
+        texts = [text for group in train.values() for text in group]
+        vectorizer = TfidfVectorizer().fit(texts)
+        model = LogisticRegression().fit(vectorizer.transform(texts), [t for t, group in train.items() for _ in group])
+        classifier = TopicClassifier(vectorizer, model)
+
+        feed = make_feed('ایرنا')
+        Keyword.objects.create(name='ورزش')
+        articles = [Article.objects.create(title='t', feed=feed, link=str(i), published=0) for i in range(3)]
+        topics = classifier.predict(['گل دوم تیم فوتبال', 'رشد قیمت دلار در بازار', 'فوتبال'])
+        self.assertEqual(topics, ['ورزش', 'اقتصاد', 'ورزش'])
+
+        with self.assertNumQueries(3):
+            self.assertEqual(assign_topics(articles, topics), 3)
+        assign_topics(articles, topics)
+        self.assertEqual(Keyword.objects.count(), 2)
+        self.assertEqual(list(Article.objects.filter(keyword__name='ورزش').order_by('link').values_list('link', flat=True)),
+                         ['0', '2'])
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ListingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Logged in, so the listing cache is exercised rather than the anonymous response cache
+        self.client.force_login(User.objects.create_user('reader'))
+        self.feed = make_feed()
+        self.keyword = Keyword.objects.create(name='ورزش')
+        for i in range(30):
+            Article.objects.create(title=f'خبر {i}', feed=self.feed, link=str(i), published=i).keyword.add(self.keyword)
+
+    def _titles(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [article['title'] for article in response.context['articles']], response.context['next_page']
+
+    def test_pages_are_newest_first(self):
+        titles, next_page = self._titles('/topic/ورزش')
+        self.assertEqual((len(titles), titles[0], next_page), (24, 'خبر 29', 2))
+        titles, next_page = self._titles('/feed/ایسنا?page=2')
+        self.assertEqual((titles, next_page), ([f'خبر {i}' for i in range(5, -1, -1)], None))
+        self.assertEqual(self.client.get('/topic/سیاست').status_code, 404)
+
+    def test_cached_until_the_crawler_bumps_the_version(self):
+        self._titles('/topic/ورزش')
+        Article.objects.create(title='تازه', feed=self.feed, link='new', published=100).keyword.add(self.keyword)
+        self.assertEqual(self._titles('/topic/ورزش')[0][0], 'خبر 29')
+        bump_content_version()
+        self.assertEqual(self._titles('/topic/ورزش')[0][0], 'تازه')
+
+
+@override_settings(CACHES=LOCMEM_CACHES, RESPONSE_CACHE_TIMEOUT=60)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.feed = make_feed()
+        Article.objects.create(title='خبر اول', abstract='', feed=self.feed, link='1', published=1)
+
+    def _suggestions(self, **headers):
+        return self.client.get('/api/search-suggestions', {'q': 'خبر'}, **headers)
+
+    def test_anonymous_responses_are_cached_until_the_version_is_bumped(self):
+        first = self._suggestions()
+        Article.objects.create(title='خبر دوم', abstract='', feed=self.feed, link='2', published=2)
+        with self.assertNumQueries(0):
+            second = self._suggestions()
+        self.assertEqual((second.content, second['ETag']), (first.content, first['ETag']))
+        self.assertIn('max-age=60', second['Cache-Control'])
+
+        bump_content_version()
+        self.assertEqual(len(json.loads(self._suggestions().content)['suggestions']), 2)
+
+    def test_repeat_clients_get_not_modified(self):
+        first = self._suggestions()
+        self.assertEqual(self._suggestions(HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self._suggestions(HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+    def test_logged_in_users_are_not_served_from_the_cache(self):
+        self._suggestions()
+        Article.objects.create(title='خبر دوم', abstract='', feed=self.feed, link='2', published=2)
+        self.client.force_login(User.objects.create_user('reader'))
+        self.assertEqual(len(json.loads(self._suggestions().content)['suggestions']), 2)
+
+
+class SharedCacheTests(SimpleTestCase):
+    def test_configured_cache_is_shared_between_processes(self):
+        # The tests above swap in LocMemCache; the project setting must not be process-local
+        self.assertEqual(check_shared_cache(), [])
+        with override_settings(CACHES=LOCMEM_CACHES):
+            self.assertEqual([w.id for w in check_shared_cache()], ['app.W001'])
+
+
+class StreamingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        feed = make_feed()
+        now = int(time.time())
+        self.articles = [Article.objects.create(title=f'خبر {i}', abstract='', feed=feed, link=str(i), published=now - i)
+                         for i in range(3)]
+
+    def test_json_array_matches_json_response(self):
+        rows = [{'id': 1, 'title': 'خبر'}, {'id': 2, 'title': None}]
+        self.assertEqual(b''.join(json_array(iter(rows))), JsonResponse({'result': rows}).content)
+        self.assertEqual(b''.join(json_array(iter([]))), JsonResponse({'result': []}).content)
+
+    def test_feed_streams_and_the_stream_is_cached(self):
+        response = self.client.get('/api/feed/sampleUser/0')
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content)
+        self.assertEqual([row['id'] for row in json.loads(body)['result']], [a.public_id for a in self.articles])
+
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/feed/sampleUser/0')
+        self.assertEqual((cached.streaming, cached.content), (False, body))
+
+        lines = b''.join(self.client.get('/api/feed/sampleUser/0', {'format': 'ndjson'}).streaming_content)
+        self.assertEqual([json.loads(line)['id'] for line in lines.splitlines()], [a.public_id for a in self.articles])
+
+    def test_api_search_streams_every_match_as_ndjson(self):
+        response = self.client.get('/news_api/search/', {'q': 'خبر', 'page_size': 1}, HTTP_ACCEPT=NDJSON)
+        self.assertEqual(response['Content-Type'], NDJSON)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['link'] for row in rows], ['0', '1', '2'])
+        self.assertEqual(self.client.get('/news_api/search/', {'format': 'ndjson'}).content,
+                         b'{"error": "Missing \'q\' parameter"}\n')
+
+
+class InteractionBatchTests(TempDirMixin, TestCase):
+    def setUp(self):
+        feed = make_feed()
+        self.articles = [Article.objects.create(title='t', feed=feed, link=str(i), published=i) for i in range(2)]
+        self.client.force_login(User.objects.create_user('reader'))
+        self.setting_in_temp_dir('INTERACTION_LOG_DIR')
+        self.buffer = InteractionBuffer(max_events=10, max_delay_ms=60000)
+        patcher = mock.patch('app.views.get_buffer', return_value=self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _post(self, events):
+        return self.client.post('/api/interactions/', json.dumps(events), content_type='application/json')
+
+    def test_batch_is_validated_and_written_on_flush(self):
+        first, second = (article.public_id for article in self.articles)
+        response = self._post([
+            {'type': 'view', 'article': first, 'value': 12.5},
+            {'type': 'read', 'article': second, 'value': '3'},
+            {'type': 'like', 'article': first},
+            {'type': 'view', 'article': 'missing', 'value': 1},
+            {'type': 'view', 'article': first, 'value': 'x'},
+            {'type': 'comment', 'article': first},
+        ])
+        self.assertEqual(response.json(), {'accepted': 3, 'rejected': 3})
+        self.assertEqual(event_log.segments(), [])
+
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(len(event_log.segments()), 1)
+        self.assertEqual(event_log.compact(), (3, 2))
+        self.assertEqual(sorted(Interaction.objects.values_list('type', 'value')),
+                         [('like', None), ('read', '3.0'), ('view', '12.5')])
+
+    def test_full_buffer_flushes_inline(self):
+        self.buffer.max_events = 2
+        self._post([{'type': 'view', 'article': self.articles[0].public_id, 'value': 1}] * 3)
+        self.assertEqual((len(event_log.read(event_log.segments())), len(self.buffer)), (3, 0))
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self._post({'events': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/interactions/').status_code, 405)
+        self.client.logout()
+        self.assertEqual(self._post([]).status_code, 401)
+
+    def test_timer_flushes_after_the_delay(self):
+        buffer = InteractionBuffer(max_events=10, max_delay_ms=20)
+        with mock.patch('app.interaction_buffer.event_log.append') as append:
+            buffer.add([event_log.event(1, 1, 'view', 1.0)])
+            for _ in range(100):
+                if append.called:
+                    break
+                time.sleep(0.01)
+        self.assertEqual(len(append.call_args[0][0]), 1)
+
+
+class EventLogTests(TempDirMixin, TestCase):
+    def setUp(self):
+        self.setting_in_temp_dir('INTERACTION_LOG_DIR')
+        feed = make_feed()
+        self.article = Article.objects.create(title='t', feed=feed, link='1', published=1)
+        self.user = User.objects.create_user('reader')
+
+    def test_compaction_merges_into_one_row_per_user_and_article(self):
+        article = self.article.id
+        event_log.append([event_log.event(self.user.id, article, 'view', 2.0, at=1),
+                          event_log.event(self.user.id, article, 'read', 30.0, at=2)])
+        event_log.append([event_log.event(self.user.id, article, 'view', 5.0, at=3),
+                          event_log.event(self.user.id, article + 1, 'view', 1.0, at=3),
+                          event_log.event(self.user.id + 1, article, 'like', at=3)])
+        self.assertEqual(event_log.compact(), (3, 1))
+        event_log.append([event_log.event(self.user.id, article, 'like', at=4)])
+        self.assertEqual(event_log.compact(), (1, 1))
+
+        aggregate = InteractionAggregate.objects.get()
+        self.assertEqual((aggregate.liked, aggregate.read, aggregate.view, aggregate.reads, aggregate.views),
+                         (True, 30.0, 5.0, 1, 2))
+        self.assertEqual((Interaction.objects.count(), event_log.segments()), (4, []))
+
+    def test_history_keeps_event_times_and_skips_refolded_events(self):
+        at = time.time() - 3600
+        segment = event_log.append([event_log.event(self.user.id, self.article.id, 'read', 30.0, at=at)])
+        logged = segment.read_bytes()
+        event_log.compact()
+        # A crash between the commit and deleting the segment folds it in again
+        segment.write_bytes(logged)
+        event_log.compact()
+        self.assertEqual(list(Interaction.objects.values_list('created_at', flat=True)),
+                         [datetime.fromtimestamp(at, tz=dt_timezone.utc)])
+
+    def test_forgetting_views_keeps_likes_and_reads(self):
+        other = Article.objects.create(title='t', feed=self.article.feed, link='2', published=2)
+        InteractionAggregate.objects.create(user=self.user, article=self.article, view=4.0, views=2, liked=True)
+        InteractionAggregate.objects.create(user=self.user, article=other, view=1.0, views=1, is_trained=True)
+        Interaction.objects.create(user=self.user, article=self.article, type='view', value='4.0')
+        Interaction.objects.create(user=self.user, article=self.article, type='like')
+
+        self.client.force_login(self.user)
+        self.client.get('/account/deleteFeed/')
+        self.assertEqual(list(InteractionAggregate.objects.values_list('article_id', 'views', 'view', 'liked')),
+                         [(self.article.id, 0, None, True)])
+        self.assertEqual(list(Interaction.objects.values_list('type', flat=True)), ['like'])
+        self.assertEqual(UserStats.objects.get(pk=self.user.pk).viewed, 0)
+
+
+class UserStatsTests(TempDirMixin, TestCase):
+    def setUp(self):
+        self.setting_in_temp_dir('INTERACTION_LOG_DIR')
+        self.feed = make_feed()
+        self.articles = [Article.objects.create(title='t', feed=self.feed, link=str(i), published=i).id
+                         for i in range(2)]
+        self.user = User.objects.create_user('reader')
+        self.client.force_login(self.user)
+
+    def _stats(self):
+        stats = UserStats.objects.get(pk=self.user.pk)
+        return stats.viewed, stats.liked, stats.followed_feeds
+
+    def test_counters_follow_compaction_and_follows(self):
+        first, second = self.articles
+        event_log.append([event_log.event(self.user.id, first, 'view', 1.0),
+                          event_log.event(self.user.id, first, 'view', 2.0),
+                          event_log.event(self.user.id, second, 'like')])
+        event_log.compact()
+        event_log.append([event_log.event(self.user.id, second, 'read', 9.0),
+                          event_log.event(self.user.id, second, 'like')])
+        event_log.compact()
+        self.client.post('/api/follow_feed/', json.dumps({'feed_id': self.feed.public_id}),
+                         content_type='application/json')
+        self.assertEqual(self._stats(), (2, 1, 1))
+
+        self.client.post('/api/follow_feed/', json.dumps({'feed_id': self.feed.public_id}),
+                         content_type='application/json')
+        self.assertEqual(self._stats(), (2, 1, 0))
+
+    def test_history_from_before_the_counters_is_kept(self):
+        # Activity recorded before the user had a UserStats row
+        InteractionAggregate.objects.create(user=self.user, article_id=self.articles[0], views=1, liked=True)
+        InteractionAggregate.objects.create(user=self.user, article_id=self.articles[1], reads=1)
+        self.client.post('/api/follow_feed/', json.dumps({'feed_id': self.feed.public_id}),
+                         content_type='application/json')
+        self.assertEqual(self._stats(), (2, 1, 1))
+
+    def test_account_page_is_one_lookup_and_reconcile_repairs_drift(self):
+        InteractionAggregate.objects.create(user=self.user, article_id=self.articles[0], views=3, liked=True)
+        UserFeed.objects.create(user=self.user, feed=self.feed)
+        self.assertEqual(self.client.get('/account/').context['followed_feeds'], 1)
+
+        UserStats.objects.filter(pk=self.user.pk).update(viewed=40, liked=0)
+        call_command('reconcile_user_stats', stdout=io.StringIO())
+        self.assertEqual(self._stats(), (1, 1, 1))
+        with self.assertNumQueries(3):  # session, user, stats
+            response = self.client.get('/account/')
+        self.assertEqual((response.context['viewed'], response.context['liked']), (1, 1))
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        feed = make_feed()
+        self.vector = np.random.default_rng(2).normal(size=16).astype(np.float32)
+        self.old = Article.objects.create(title='old', abstract='', feed=feed, link='http://example.com/old',
+                                          published=int(time.time()) - 40 * 86400, vector=format_vector(self.vector))
+        self.old.keyword.add(Keyword.objects.create(name='ورزش'))
+        self.new = Article.objects.create(title='new', abstract='', feed=feed, link='http://example.com/new',
+                                          published=int(time.time()))
+        self.user = User.objects.create_user('reader')
+        InteractionAggregate.objects.create(user=self.user, article=self.old, views=1, view=3.0, liked=True)
+        Interaction.objects.create(user=self.user, article=self.old, type='like')
+
+    def test_old_articles_move_to_the_archive(self):
+        call_command('archive_articles', days=30, stdout=io.StringIO())
+        self.assertEqual(list(Article.objects.values_list('id', flat=True)), [self.new.id])
+        archived = ArchivedArticle.objects.get()
+        self.assertEqual((archived.id, archived.public_id, archived.keywords), (self.old.id, self.old.public_id, ['ورزش']))
+        np.testing.assert_allclose(dequantize(archived.vector, archived.vector_scale), self.vector,
+                                   atol=archived.vector_scale)
+        self.assertEqual(list(ArchivedAggregate.objects.values_list('article_id', 'liked', 'view')),
+                         [(self.old.id, True, 3.0)])
+        self.assertEqual((InteractionAggregate.objects.count(), Interaction.objects.count()), (0, 0))
+
+        user_stats.reconcile([self.user.pk])
+        self.assertEqual(UserStats.objects.get(pk=self.user.pk).liked, 1)
+        page = self.client.get(f'/article/{self.old.public_id}')
+        self.assertEqual((page.context['article']['id'], page.context['article']['html']), (self.old.public_id, ''))
+
+
+class PublicIdTests(TestCase):
+    def setUp(self):
+        self.feed = make_feed()
+        self.article = Article.objects.create(title='t', abstract='', feed=self.feed, link='1', published=1)
+
+    def test_urls_use_public_ids_over_integer_keys(self):
+        self.assertIsInstance(self.article.pk, int)
+        self.assertEqual(len(self.article.public_id), 36)
+        with mock.patch('app.content_store.get_reader_html', return_value=''):
+            page = self.client.get(f'/article/{self.article.public_id}')
+            self.assertEqual((page.context['article']['id'], page.context['article']['feed']['id']),
+                             (self.article.public_id, self.feed.public_id))
+            self.assertTemplateUsed(self.client.get(f'/article/{self.article.pk}'), '404.html')
+        self.assertEqual(self.client.get(f'/api/get/article/content/{self.article.pk}').status_code, 404)
+
+
+class SQLiteProfileTests(TempDirMixin, SimpleTestCase):
+    # Only standalone connections to a scratch file are opened
+    databases = {'default', READ_ALIAS}
+
+    def _connect(self, path, alias):
+        settings_dict = {**connections['default'].settings_dict, 'NAME': path}
+        if alias == READ_ALIAS:
+            settings_dict['NAME'] = f'{Path(path).as_uri()}?mode=ro'
+        wrapper = connections['default'].__class__(settings_dict, alias=alias)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def _pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_and_read_only_connection(self):
+        path = str(self.temp_dir() / 'db.sqlite3')
+        writer = self._connect(path, 'default')
+        self.assertEqual((self._pragma(writer, 'journal_mode'), self._pragma(writer, 'synchronous')), ('wal', 1))
+        with writer.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (x integer)')
+            cursor.execute('INSERT INTO t VALUES (1)')
+
+        reader = self._connect(path, READ_ALIAS)
+        self.assertEqual(self._pragma(reader, 'query_only'), 1)
+        with reader.cursor() as cursor:
+            cursor.execute('SELECT x FROM t')
+            self.assertEqual(cursor.fetchall(), [(1,)])
+            with self.assertRaises(DatabaseError):
+                cursor.execute('INSERT INTO t VALUES (2)')
+
+    def test_read_only_views_route_reads(self):
+        router = ReadOnlyRouter()
+        with mock.patch('app.databases.has_read_alias', return_value=True):
+            self.assertIsNone(router.db_for_read(Article))
+            self.assertEqual(read_only(lambda: router.db_for_read(Article))(), READ_ALIAS)
+            self.assertEqual(read_only(lambda: router.db_for_write(Article))(), 'default')
+        # Under test the alias mirrors the default database, so reads stay there
+        self.assertIsNone(read_only(lambda: router.db_for_read(Article))())
@@ -0,0 +1,62 @@
+"""
+Topic classification of newly crawled articles.
+
+A TF-IDF vectorizer and a logistic regression trained on hazm-tokenized
+text (pickled under ``TOPIC_MODEL_DIR``) predict one topic per article.
+The crawler classifies a whole cycle in one ``transform`` / ``predict``
+call and stores the topic as the article's ``Keyword``, which is what the
+topic pages list.
+"""
+import pickle
+
+from django.conf import settings
+from hazm import Normalizer, WordTokenizer
+
+from app.models import Article, Keyword
+
+
+class TopicClassifier:
+    def __init__(self, vectorizer, model):
+        self.vectorizer = vectorizer
+        self.model = model
+        self.normalizer = Normalizer()
+        self.tokenizer = WordTokenizer()
+
+    @classmethod
+    def load(cls, directory=None):
+        directory = settings.TOPIC_MODEL_DIR if directory is None else directory
+        with open(directory / 'vectorizer.pkl', 'rb') as f:
+            vectorizer = pickle.load(f)
+        with open(directory / 'logistic_regression.pkl', 'rb') as f:
+            model = pickle.load(f)
+        return cls(vectorizer, model)
+
+    def preprocess(self, text):
+        return ' '.join(self.tokenizer.tokenize(self.normalizer.normalize(text)))
+
+    def predict(self, texts):
+        """Topic name for every text, in order."""
+        if not texts:
+            return []
+        matrix = self.vectorizer.transform([self.preprocess(text) for text in texts])
+        return [str(topic) for topic in self.model.predict(matrix)]
+
+
+def assign_topics(articles, topics):
+    """
+    Link saved articles to the keyword named after their topic, creating
+    missing keywords.  A fixed number of queries however many articles.
+    """
+    pairs = [(article, topic) for article, topic in zip(articles, topics) if topic]
+    if not pairs:
+        return 0
+    names = {topic for _, topic in pairs}
+    keyword_of = {keyword.name: keyword for keyword in Keyword.objects.filter(name__in=names)}
+    missing = [Keyword(name=name) for name in names if name not in keyword_of]
+    Keyword.objects.bulk_create(missing)
+    keyword_of.update((keyword.name, keyword) for keyword in missing)
+
+    Link = Article.keyword.through
+    Link.objects.bulk_create([Link(article_id=article.pk, keyword_id=keyword_of[topic].pk) for article, topic in pairs],
+                             ignore_conflicts=True)
+    return len(pairs)
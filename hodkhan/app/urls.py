@@ -8,11 +8,15 @@ urlpatterns = [
     path("account/", views.account, name="account"),
     path("article/<id>", views.article, name="article"),
     path("topic/<topic>", views.topic, name="topic"),
+    path("feed/<feed>", views.feed, name="feed_articles"),
     path("dbToDjango/", views.dbToDjango, name="dbToDjango"),
     path('search/', views.search, name='search'),
     path('api/feed/<username>/<count>', views.stream_articles, name='feed'),
+    path('api/article/<id>/similar', views.similar_articles, name='similar_articles'),
+    path('img/<size>/<signature>/<encoded>', views.image_proxy, name='image_proxy'),
     path('api/get/article/content/<id>', views.getArticleContentView, name='article_content'),
     path('api/search-suggestions', views.search_suggestions, name='search_suggestions'),
     path("api/interaction/", views.interaction, name='interaction'),
+    path("api/interactions/", views.interactions, name='interactions'),
     path('api/follow_feed/', views.follow_feed, name='follow_feed'),
 ]
@@ -0,0 +1,81 @@
+"""
+Per-user engagement counters shown on the account page.
+
+``UserStats`` is updated incrementally: the interaction compactor adds the
+articles a user newly viewed or liked, following or unfollowing a feed
+adjusts ``followed_feeds``.  ``reconcile`` recomputes the counters from the
+aggregates and the follows (``manage.py reconcile_user_stats``) in case
+they drift, e.g. after rows were edited by hand.
+"""
+from django.db.models import Count, F, Q
+
+from app.models import ArchivedAggregate, InteractionAggregate, UserFeed, UserStats
+
+FIELDS = ('viewed', 'liked', 'followed_feeds')
+
+
+def add(deltas):
+    """
+    Apply ``{user_id: {field: delta}}``, called once the change they describe
+    is written; one update per user with changes.  Users without counters yet
+    (e.g. active before ``UserStats`` existed) get them computed from scratch
+    instead, which already includes the change.
+    """
+    deltas = {user_id: {f: d for f, d in changes.items() if d} for user_id, changes in deltas.items()}
+    deltas = {user_id: changes for user_id, changes in deltas.items() if changes}
+    if not deltas:
+        return
+    missing = set(deltas) - set(UserStats.objects.filter(pk__in=deltas).values_list('pk', flat=True))
+    if missing:
+        reconcile(list(missing))
+    for user_id, changes in deltas.items():
+        if user_id in missing:
+            continue
+        UserStats.objects.filter(pk=user_id).update(**{f: F(f) + d for f, d in changes.items()})
+
+
+def get(user):
+    """The user's counters: a primary-key lookup, computed on first access."""
+    try:
+        return UserStats.objects.get(pk=user.pk)
+    except UserStats.DoesNotExist:
+        reconcile([user.pk])
+        return UserStats.objects.get(pk=user.pk)
+
+
+def reconcile(user_ids=None):
+    """Recompute the counters of ``user_ids`` (everyone with activity when None); returns how many rows changed."""
+    # Engagement with archived articles still counts
+    aggregates = [InteractionAggregate.objects.all(), ArchivedAggregate.objects.all()]
+    follows = UserFeed.objects.all()
+    if user_ids is not None:
+        aggregates = [qs.filter(user_id__in=user_ids) for qs in aggregates]
+        follows = follows.filter(user_id__in=user_ids)
+    actual = {user_id: dict.fromkeys(FIELDS, 0) for user_id in (user_ids or ())}
+    for qs in aggregates:
+        for row in qs.values('user_id').annotate(viewed=Count('pk', filter=Q(views__gt=0) | Q(reads__gt=0)),
+                                                 liked=Count('pk', filter=Q(liked=True))):
+            counts = actual.setdefault(row['user_id'], dict.fromkeys(FIELDS, 0))
+            counts['viewed'] += row['viewed']
+            counts['liked'] += row['liked']
+    for row in follows.values('user_id').annotate(followed_feeds=Count('pk')):
+        actual.setdefault(row['user_id'], dict.fromkeys(FIELDS, 0))['followed_feeds'] = row['followed_feeds']
+
+    stored = UserStats.objects.all() if user_ids is None else UserStats.objects.filter(pk__in=user_ids)
+    stored = {stats.user_id: stats for stats in stored}
+    # Users whose activity disappeared entirely go back to zero
+    for user_id in stored:
+        actual.setdefault(user_id, dict.fromkeys(FIELDS, 0))
+
+    created, changed = [], []
+    for user_id, counts in actual.items():
+        stats = stored.get(user_id)
+        if stats is None:
+            created.append(UserStats(user_id=user_id, **counts))
+        elif any(getattr(stats, f) != counts[f] for f in FIELDS):
+            for f in FIELDS:
+                setattr(stats, f, counts[f])
+            changed.append(stats)
+    UserStats.objects.bulk_create(created, batch_size=500, ignore_conflicts=True)
+    UserStats.objects.bulk_update(changed, FIELDS, batch_size=500)
+    return len(created) + len(changed)
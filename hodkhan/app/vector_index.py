@@ -0,0 +1,449 @@
+"""
+In-process approximate nearest-neighbour index over article embeddings.
+
+Vectors are kept in a float32 memory-mapped matrix next to a few small
+numpy side arrays (article ids, publish timestamps and IVF cell
+assignments).  The crawler is the only writer; web workers open the files
+read-only and share the page cache.  Appends grow the current files in place
+and publish the new row count in ``meta.json`` last.  Rewrites (``create``,
+``compact``) write a new generation of every file next to the old one and
+switch ``meta.json`` to it, so a reader never pairs new ids with old vectors.  Search probes the ``nprobe`` closest
+k-means cells instead of scanning every row.
+"""
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+META_FILE = 'meta.json'
+VECTORS_FILE = 'vectors.f32'
+IDS_FILE = 'ids.npy'
+PUBLISHED_FILE = 'published.npy'
+CELLS_FILE = 'cells.npy'
+CENTROIDS_FILE = 'centroids.npy'
+LOCK_FILE = 'write.lock'
+
+# Below this many rows a full scan is cheaper than probing cells.
+BRUTE_FORCE_LIMIT = 4096
+# Retrain the coarse quantizer once the index has grown this much since the last training.
+RETRAIN_GROWTH = 2.0
+# Rows scored per block during an exact scan.
+SCAN_BLOCK = 65536
+
+
+def parse_vector(text):
+    """Parse a comma separated ``Article.vector`` string into a float32 array."""
+    if not text:
+        return None
+    vector = np.array(text.strip().rstrip(',').split(','), dtype=np.float32)
+    return vector if vector.size else None
+
+
+def _generation_file(name, generation):
+    """``vectors.f32`` for generation 0, ``vectors.3.f32`` for generation 3."""
+    if not generation:
+        return name
+    stem, _, ext = name.partition('.')
+    return f'{stem}.{generation}.{ext}'
+
+
+def format_vector(vector):
+    """Inverse of ``parse_vector``: the comma separated text stored in the DB."""
+    return ','.join(map(str, np.asarray(vector, dtype=np.float32).tolist()))
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def spherical_kmeans(sample, n_cells, iterations=10, seed=42):
+    """Cosine k-means: assign by dot product, re-normalise the cell means."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), size=n_cells, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        counts = np.bincount(assignment, minlength=n_cells)
+        used = np.flatnonzero(counts)
+        sums = np.empty_like(centroids)
+        sums[used] = np.add.reduceat(sample[order], (np.cumsum(counts) - counts)[used], axis=0)
+        # Re-seed empty cells with random points so every cell stays in use
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = sample[rng.choice(len(sample), size=len(empty))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+def _save_atomic(path, array):
+    tmp = path.with_name(path.name + '.tmp')
+    with open(tmp, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+class VectorIndex:
+    """
+    IVF index over L2-normalised article vectors (cosine similarity).
+
+    Usage:
+        index = VectorIndex.open(settings.VECTOR_INDEX_DIR, dim=768, writable=True)
+        index.add(ids, vectors, published)
+        index.search(query_vector, k=10)  ->  [(article_id, score), ...]
+    """
+
+    def __init__(self, path, meta, writable=False):
+        self.path = Path(path)
+        self.writable = writable
+        self.dim = meta['dim']
+        self.count = meta['count']
+        self.capacity = meta['capacity']
+        self.trained_count = meta.get('trained_count', 0)
+        self.version = meta.get('version', 0)
+        self.generation = meta.get('generation', 0)
+        self._load_arrays()
+
+    @classmethod
+    def open(cls, path, dim=None, writable=False):
+        """Open an index directory, creating an empty one if ``dim`` is given and nothing exists."""
+        path = Path(path)
+        meta_path = path / META_FILE
+        if not meta_path.exists():
+            if dim is None:
+                raise FileNotFoundError(f'No vector index at {path}')
+            cls.create(path, dim)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return cls(path, meta, writable=writable)
+
+    @classmethod
+    def create(cls, path, dim, capacity=1024):
+        """Create an empty index directory, replacing any previous one."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        previous, version = _published_generation(path)
+        generation = previous + 1 if (path / META_FILE).exists() else 0
+        with open(path / _generation_file(VECTORS_FILE, generation), 'wb') as f:
+            f.truncate(capacity * dim * 4)
+        _save_atomic(path / _generation_file(IDS_FILE, generation), np.array([], dtype=np.int64))
+        _save_atomic(path / _generation_file(PUBLISHED_FILE, generation), np.array([], dtype=np.int64))
+        _save_atomic(path / _generation_file(CELLS_FILE, generation), np.array([], dtype=np.int32))
+        cls._write_meta(path, {'dim': dim, 'count': 0, 'capacity': capacity, 'trained_count': 0,
+                               'version': version + 1, 'generation': generation})
+        if generation:
+            _remove_generation(path, previous)
+
+    @staticmethod
+    def _write_meta(path, meta):
+        tmp = path / (META_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, path / META_FILE)
+
+    def _file(self, name):
+        return self.path / _generation_file(name, self.generation)
+
+    def _load_arrays(self):
+        mode = 'r+' if self.writable else 'r'
+        self.vectors = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode=mode,
+                                 shape=(self.capacity, self.dim))
+        self.ids = np.load(self._file(IDS_FILE))[:self.count]
+        if self.ids.dtype.kind != 'i':
+            # Built when articles were keyed by UUID strings: reads as empty until rebuilt
+            # with ``build_vector_index``
+            self.count, self.ids = 0, np.array([], dtype=np.int64)
+        self.published = np.load(self._file(PUBLISHED_FILE))[:self.count]
+        self.cells = np.load(self._file(CELLS_FILE))[:self.count]
+        centroids_path = self._file(CENTROIDS_FILE)
+        self.centroids = np.load(centroids_path) if centroids_path.exists() else None
+        self._row_of = None
+        self._build_lists()
+
+    def _build_lists(self):
+        """Group rows by cell so a probe is a couple of contiguous slices."""
+        if self.centroids is None or not self.count:
+            self._order = self._offsets = None
+            return
+        self._order = np.argsort(self.cells, kind='stable')
+        self._offsets = np.searchsorted(self.cells[self._order], np.arange(len(self.centroids) + 1))
+
+    def save(self):
+        """Publish the current state; readers pick it up on their next ``get_index()``."""
+        self.vectors.flush()
+        _save_atomic(self._file(IDS_FILE), self.ids)
+        _save_atomic(self._file(PUBLISHED_FILE), self.published)
+        _save_atomic(self._file(CELLS_FILE), self.cells)
+        if self.centroids is not None:
+            _save_atomic(self._file(CENTROIDS_FILE), self.centroids)
+        self.version += 1
+        self._write_meta(self.path, {
+            'dim': self.dim,
+            'count': self.count,
+            'capacity': self.capacity,
+            'trained_count': self.trained_count,
+            'version': self.version,
+            'generation': self.generation,
+        })
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        self.vectors.flush()
+        del self.vectors
+        with open(self._file(VECTORS_FILE), 'r+b') as f:
+            f.truncate(capacity * self.dim * 4)
+        self.capacity = capacity
+        self.vectors = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode='r+',
+                                 shape=(self.capacity, self.dim))
+
+    def __len__(self):
+        return self.count
+
+    def row_of(self, article_id):
+        if self._row_of is None:
+            self._row_of = {article_id: row for row, article_id in enumerate(self.ids.tolist())}
+        return self._row_of.get(int(article_id))
+
+    def vector(self, article_id):
+        row = self.row_of(article_id)
+        return None if row is None else np.asarray(self.vectors[row])
+
+    def recent(self, since):
+        """
+        Ids and vectors of rows published at or after ``since``.  Rows are kept
+        in publish order, so this is normally a zero-copy slice of the map.
+        """
+        rows = np.flatnonzero(self.published >= since)
+        if not len(rows):
+            return [], np.empty((0, self.dim), dtype=np.float32)
+        if rows[-1] - rows[0] + 1 == len(rows):
+            matrix = self.vectors[rows[0]:rows[-1] + 1]
+        else:
+            matrix = self.vectors[rows]
+        return self.ids[rows].tolist(), matrix
+
+    def compact(self, before):
+        """
+        Drop rows published before ``before`` and rewrite the remaining ones in
+        publish order into a new generation of the files.  Readers keep their
+        old mapping until they notice the new version.  Returns the number of
+        rows dropped.
+        """
+        keep = np.flatnonzero(self.published >= before)
+        keep = keep[np.argsort(self.published[keep], kind='stable')]
+        capacity = 1024
+        while capacity < len(keep):
+            capacity *= 2
+
+        previous = self.generation
+        self.generation += 1
+        compacted = np.memmap(self._file(VECTORS_FILE), dtype=np.float32, mode='w+', shape=(capacity, self.dim))
+        for start in range(0, len(keep), SCAN_BLOCK):
+            block = keep[start:start + SCAN_BLOCK]
+            compacted[start:start + len(block)] = self.vectors[block]
+
+        dropped = self.count - len(keep)
+        self.vectors = compacted
+        self.capacity = capacity
+        self.count = len(keep)
+        self.ids = self.ids[keep]
+        self.published = self.published[keep]
+        self.cells = self.cells[keep]
+        self._row_of = None
+        self._build_lists()
+        self.save()
+        _remove_generation(self.path, previous)
+        return dropped
+
+    def add(self, ids, vectors, published, retrain=True):
+        """
+        Append vectors for new articles; rows already present are skipped.
+        Bulk loaders pass ``retrain=False`` and call ``train()`` once at the end.
+        """
+        if not self.writable:
+            raise RuntimeError('Vector index was opened read-only')
+        ids = [int(i) for i in ids]
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+        keep = [i for i, article_id in enumerate(ids) if self.row_of(article_id) is None]
+        if not keep:
+            return 0
+        ids = [ids[i] for i in keep]
+        vectors = vectors[keep]
+        published = np.array([published[i] or 0 for i in keep], dtype=np.int64)
+
+        start, end = self.count, self.count + len(ids)
+        if end > self.capacity:
+            self._grow(end)
+        self.vectors[start:end] = vectors
+
+        if self.centroids is not None:
+            cells = np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+        else:
+            cells = np.full(len(ids), -1, dtype=np.int32)
+
+        self.ids = np.concatenate([self.ids, np.array(ids, dtype=np.int64)])
+        self.published = np.concatenate([self.published, published])
+        self.cells = np.concatenate([self.cells, cells])
+        self._row_of.update({article_id: start + i for i, article_id in enumerate(ids)})
+        self.count = end
+
+        if retrain and self.count >= BRUTE_FORCE_LIMIT and self.count >= RETRAIN_GROWTH * max(self.trained_count, 1):
+            self.train()
+        else:
+            self._build_lists()
+        self.save()
+        return len(ids)
+
+    def train(self, n_cells=None, sample_size=50000, seed=42):
+        """(Re)build the coarse k-means quantizer and reassign every row."""
+        if not self.count:
+            return
+        if n_cells is None:
+            n_cells = max(1, int(np.sqrt(self.count)))
+        n_cells = min(n_cells, self.count)
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(self.count, size=min(sample_size, self.count), replace=False))
+        sample = np.asarray(self.vectors[sample_rows])
+        self.centroids = spherical_kmeans(sample, n_cells, seed=seed)
+
+        cells = np.empty(self.count, dtype=np.int32)
+        for start in range(0, self.count, SCAN_BLOCK):
+            end = min(start + SCAN_BLOCK, self.count)
+            cells[start:end] = np.argmax(self.vectors[start:end] @ self.centroids.T, axis=1)
+        self.cells = cells
+        self.trained_count = self.count
+        self._build_lists()
+
+    def candidate_rows(self, query, nprobe):
+        if nprobe is None or self._order is None or self.count < BRUTE_FORCE_LIMIT:
+            return None
+        cell_scores = self.centroids @ query
+        nprobe = min(nprobe, len(self.centroids))
+        probe = np.argpartition(-cell_scores, nprobe - 1)[:nprobe]
+        rows = np.concatenate([self._order[self._offsets[c]:self._offsets[c + 1]] for c in probe])
+        rows.sort()
+        return rows
+
+    def _filter(self, rows, since, exclude):
+        if since is not None:
+            rows = rows[self.published[rows] >= since]
+        if len(exclude):
+            rows = rows[~np.isin(self.ids[rows], exclude)]
+        return rows
+
+    def search(self, query, k=10, nprobe=8, since=None, exclude=()):
+        """
+        Return up to ``k`` ``(article_id, score)`` pairs, best first.
+
+        ``nprobe=None`` forces an exact scan, done in zero-copy blocks of the
+        memory map so it never materialises the whole matrix.
+        """
+        if not self.count:
+            return []
+        query = _normalize(np.asarray(query, dtype=np.float32).reshape(-1))
+        exclude = np.array([int(e) for e in exclude], dtype=np.int64)
+
+        rows = self.candidate_rows(query, nprobe)
+        if rows is not None:
+            rows = self._filter(rows, since, exclude)
+            scores = self.vectors[rows] @ query
+        else:
+            blocks_rows, blocks_scores = [], []
+            for start in range(0, self.count, SCAN_BLOCK):
+                end = min(start + SCAN_BLOCK, self.count)
+                block_scores = self.vectors[start:end] @ query
+                block_rows = self._filter(np.arange(start, end), since, exclude)
+                block_scores = block_scores[block_rows - start]
+                if len(block_rows) > k:
+                    best = np.argpartition(-block_scores, k - 1)[:k]
+                    block_rows, block_scores = block_rows[best], block_scores[best]
+                blocks_rows.append(block_rows)
+                blocks_scores.append(block_scores)
+            rows, scores = np.concatenate(blocks_rows), np.concatenate(blocks_scores)
+        if not len(rows):
+            return []
+
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[rows[i]]), float(scores[i])) for i in top]
+
+
+def _published_generation(path):
+    """``(generation, version)`` named by the index's ``meta.json``, zeros without one."""
+    try:
+        with open(path / META_FILE) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return 0, 0
+    return meta.get('generation', 0), meta.get('version', 0)
+
+
+def _remove_generation(path, generation):
+    """Delete a generation's files once readers have been pointed away from them."""
+    for name in (VECTORS_FILE, IDS_FILE, PUBLISHED_FILE, CELLS_FILE, CENTROIDS_FILE):
+        (path / _generation_file(name, generation)).unlink(missing_ok=True)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Shared read-only index for the current process, reopened when the
+    crawler publishes a new version.  Returns None if no index was built.
+    """
+    global _index
+    meta_path = Path(settings.VECTOR_INDEX_DIR) / META_FILE
+    try:
+        mtime = meta_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _index_lock:
+        if _index is None or _index[0] != mtime:
+            try:
+                _index = (mtime, VectorIndex.open(settings.VECTOR_INDEX_DIR))
+            except (OSError, ValueError):
+                # The generation named by meta.json was replaced while it was being opened;
+                # keep serving the previous one, the next call retries
+                if _index is None:
+                    return None
+        return _index[1]
+
+
+@contextmanager
+def write_lock(path=None):
+    """Exclusive lock held by whoever is modifying the index files."""
+    path = Path(path or settings.VECTOR_INDEX_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / LOCK_FILE, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield path
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+@contextmanager
+def index_writer(dim=None, path=None):
+    """
+    Open the index for writing under ``write_lock`` so the crawler, rebuilds
+    and the compaction job never interleave their updates.
+    """
+    with write_lock(path) as path:
+        yield VectorIndex.open(path, dim=dim, writable=True)
+
+
+def recent_cutoff(days=None):
+    days = settings.VECTOR_INDEX_DAYS if days is None else days
+    return int(time.time()) - int(days * 86400)
@@ -1,7 +1,7 @@
 import markdownify
 import markdown
-from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
-from .models import Article, Keyword, Feed, Interaction, UserFeed
+from django.http import HttpResponse, JsonResponse
+from .models import ArchivedArticle, Article, Keyword, Feed, UserFeed
 from django.shortcuts import render, redirect
 from django.db.models import Q
 from pathlib import Path
@@ -17,10 +17,21 @@ import json
 import sys
 import os
 from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.core.cache import cache
+from app.image_proxy import proxy_url
+from app import event_log, user_stats
+from app.interaction_buffer import get_buffer
+from app.databases import read_only
+from app.response_cache import cached_response, versioned_key
+from app.streaming import stream_rows
 
 module_path = os.path.abspath("feed_creator/")
 sys.path.append(module_path)
 
+# Articles loaded per query while a feed page is streamed
+STREAM_CHUNK = 200
+
 
 def index(requests):
     if requests.user.is_authenticated:
@@ -28,7 +39,12 @@ def index(requests):
     else:
         username = "sampleUser"
 
-    topics = Keyword.objects.all()
+    # The page itself embeds a per-visitor CSRF token, so only the topic list is cached
+    key = versioned_key('topics')
+    topics = cache.get(key)
+    if topics is None:
+        topics = list(Keyword.objects.all())
+        cache.set(key, topics, settings.RESPONSE_CACHE_TIMEOUT)
 
     return render(requests, "index.html", context={"username": username, "topics": topics})
 
@@ -43,28 +59,28 @@ def privacy(requests):
 
 @login_required
 def account(request):
-    user = request.user
-    viewed_count = Interaction.objects.filter(user=user, type='view').count()
-    liked_count = Interaction.objects.filter(user=user, type='like').count()
-    followed_feeds_count = UserFeed.objects.filter(user=user).count()
+    stats = user_stats.get(request.user)
 
     context = {
-        'viewed': viewed_count,
-        'liked': liked_count,
-        'followed_feeds': followed_feeds_count,
+        'viewed': stats.viewed,
+        'liked': stats.liked,
+        'followed_feeds': stats.followed_feeds,
     }
     return render(request, "account.html", context)
 
 
 def article(requests, id):
-    article = Article.objects.filter(id=id)
+    article = Article.objects.filter(public_id=id)
+    if len(article) == 0:
+        # Old links keep working once the article is archived
+        article = ArchivedArticle.objects.filter(public_id=id)
     if len(article) == 0:
         print("NotFound!")
         return render(requests, "404.html")
     article = article[0]
     n = {}
-    n["id"] = article.id
-    n["feed"] = {"id": article.feed.id, "name": article.feed.name, "favicon": article.feed.favicon}
+    n["id"] = article.public_id
+    n["feed"] = {"id": article.feed.public_id, "name": article.feed.name, "favicon": proxy_url(article.feed.favicon, 'icon')}
     n["title"] = article.title
     # n["abstract"] = thearticle.abstract[:150] + "..."
     n["abstract"] = article.abstract
@@ -78,16 +94,21 @@ def article(requests, id):
     #     continue
     n["published"] = str(jdate)
     n["published"] = "".join(list(map(lambda x: x in "1234567890" and "۰۱۲۳۴۵۶۷۸۹"[int(x)] or x, n["published"])))
-    n["image"] = article.cover
+    n["image"] = proxy_url(article.cover, 'large')
     n["link"] = article.link
     new_data = {"title": n["title"], "abstract": n["abstract"], "feed": n["feed"]}
-    from app.management.commands.crawler_tool import fetch_and_process_html
-    html_content = fetch_and_process_html(article.link)
-    html_content.strip()
-    n["html"] = html_content
+    from app.content_store import get_reader_html
+    try:
+        # Reader content is not kept for archived articles; the page links to the source
+        n["html"] = get_reader_html(article) if isinstance(article, Article) else ""
+    except Exception as e:
+        print("Error fetching article content:", e)
+        n["html"] = ""
     return render(requests, "article.html", context={"article": n})
 
 
+@cached_response
+@read_only
 def stream_articles(request, username, count=0):
     start = time.time()
     print('----------started----------')
@@ -112,69 +133,50 @@ def stream_articles(request, username, count=0):
     else:
         followed_feed_ids = set()
 
-    oldarticle = Article.objects.filter(published__gte=int(time.time()) - 86400)
+    cutoff = int(time.time()) - 86400
+    limit = (int(count) + 1) * 12
 
-    larticle = []
-    for e in oldarticle:
-        if flag:
-            i = 0
-        else:
-            # Convert the stored vector string back to a numpy array
-            new_vector = np.fromstring(e.vector, sep=',')
-            i = int(predict_star(new_vector, mlp))
-        e.star = i
-        larticle.append(e)
+    if flag:
+        ids = list(Article.objects.filter(published__gte=cutoff).order_by('-published').values_list('id', flat=True))
+        star_of = {}
+    else:
+        ids, stars = rank_recent(mlp, cutoff)
+        star_of = dict(zip(ids, stars))
+    print("articleLen:", len(ids))
 
-    larticle.sort(key=lambda x: x.star)
-    larticle.reverse()
+    # Show each near-duplicate story once, as its best ranked copy
+    if request.GET.get('collapse', '1') != '0':
+        from app.stories import collapse_stories
+        ids = collapse_stories(ids, limit)
+    ids = ids[:limit]
 
-    x = []
-    c = int(count)
-    try:
-        x = larticle[:int((c + 1) * 12)]
-    except:
-        x = larticle[:]
-
-    print("articleLen:", len(larticle))
-    print('loading article:', time.time() - start)
-
-    def regressor(x):
-        # now = time.time()
-        allArticle = []
-        for thearticle in x:
-            n = {}
-            n["id"] = thearticle.id
-            n["feed"] = {"id": thearticle.feed.id, "name": thearticle.feed.name, "favicon": thearticle.feed.favicon}
-            n["title"] = thearticle.title
-            n["abstract"] = thearticle.abstract
-            date = int(thearticle.published)
-            date = datetime.datetime.fromtimestamp(date)
-            date = pytz.timezone("GMT").localize(date)
-            date = date.astimezone(pytz.timezone("Asia/Tehran"))
-            jdate = jdatetime.datetime.fromgregorian(year=date.year, month=date.month, day=date.day, hour=date.hour,
-                                                     minute=date.minute, second=date.second)
-            n["published"] = str(jdate)
-            n["published"] = "".join(
-                list(map(lambda x: x in "1234567890" and "۰۱۲۳۴۵۶۷۸۹"[int(x)] or x, n["published"])))
-            n["image"] = thearticle.cover
-            n["link"] = thearticle.link
-            n["is_following"] = thearticle.feed.id in followed_feed_ids
-            if flag:
-                n['stars'] = 0
-            else:
-                n['stars'] = thearticle.star
-            if len(n['abstract']) > 150:
-                n['abstract'] = n['abstract'][:150] + '...'
-
-            allArticle.append(n)
-
-        print('end regressing:', time.time() - start)
-
-        print('end saving:', time.time() - start)
-        return allArticle
-
-    response = regressor(x)
-    return JsonResponse({'result': response})
+    print('ranking:', time.time() - start)
+
+    def serialize(thearticle):
+        n = {}
+        n["id"] = thearticle.public_id
+        n["feed"] = {"id": thearticle.feed.public_id, "name": thearticle.feed.name, "favicon": proxy_url(thearticle.feed.favicon, 'icon')}
+        n["title"] = thearticle.title
+        n["abstract"] = thearticle.abstract
+        n["published"] = persian_date(thearticle.published)
+        n["image"] = proxy_url(thearticle.cover)
+        n["link"] = thearticle.link
+        n["is_following"] = thearticle.feed.id in followed_feed_ids
+        n['stars'] = star_of.get(thearticle.id, 0)
+        if len(n['abstract']) > 150:
+            n['abstract'] = n['abstract'][:150] + '...'
+        return n
+
+    def rows():
+        # Articles are loaded and sent a chunk at a time, in ranking order
+        for chunk_start in range(0, len(ids), STREAM_CHUNK):
+            chunk = ids[chunk_start:chunk_start + STREAM_CHUNK]
+            found = Article.objects.select_related('feed').in_bulk(chunk)
+            for article_id in chunk:
+                if article_id in found:
+                    yield serialize(found[article_id])
+
+    return stream_rows(request, rows())
 
 
 def dbToDjango(requests):
@@ -185,8 +187,8 @@ def dbToDjango(requests):
 def fromDbToDjango():
     conn = sqlite3.connect('./../Database.db')
 
-    x = list(Article.objects.all().values("id"))
-    ids = list(map(lambda x: x['id'], x))
+    x = list(Article.objects.all().values("public_id"))
+    ids = list(map(lambda x: x['public_id'], x))
 
     cursor = list(conn.execute(
         f"SELECT id, title, feed, abstract, topic, link, published, image, vector from Article where id not in ({', '.join(ids)})"))
@@ -197,7 +199,7 @@ def fromDbToDjango():
         except:
             feed = Feed(title=row[2])
             feed.save()
-        article = Article(id=row[0], title=row[1], abstract=row[3], link=row[5], published=int(float(row[6])),
+        article = Article(public_id=row[0], title=row[1], abstract=row[3], link=row[5], published=int(float(row[6])),
                           image=row[7], feed=feed, vector=row[8])
 
         topic = row[4]
@@ -220,6 +222,51 @@ def fromDbToDjango():
             continue
 
 
+def _parsed_vectors(rows):
+    from app.vector_index import parse_vector
+
+    ids, vectors = [], []
+    for article_id, vector in rows:
+        vector = parse_vector(vector)
+        if vector is not None:
+            ids.append(article_id)
+            vectors.append(vector)
+    return ids, vectors
+
+
+def rank_recent(mlp, cutoff):
+    """
+    Score every article published since ``cutoff`` with one ``predict`` call.
+
+    Vectors come from the shared memory-mapped index.  The DB text column is
+    parsed only for recent articles the index lacks: all of them before the
+    index is (re)built, otherwise the few whose ``index.add`` failed during
+    the crawl.  Returns ``(ids, stars)`` ordered best first.
+    """
+    from app.vector_index import get_index
+
+    recent = Article.objects.filter(published__gte=cutoff, vector__isnull=False)
+    index = get_index()
+    if index is not None:
+        ids, matrix = index.recent(cutoff)
+        missing = set(recent.values_list('id', flat=True)).difference(ids)
+        if missing:
+            rows = recent.filter(id__in=missing).values_list('id', 'vector')
+            extra = [(i, v) for i, v in zip(*_parsed_vectors(rows)) if len(v) == index.dim]
+            if extra:
+                ids = list(ids) + [i for i, _ in extra]
+                matrix = np.vstack([matrix] + [v for _, v in extra])
+    else:
+        ids, vectors = _parsed_vectors(recent.values_list('id', 'vector'))
+        matrix = np.vstack(vectors) if vectors else None
+    if not len(ids):
+        return [], []
+
+    stars = mlp.predict(matrix).astype(int)
+    order = np.argsort(-stars, kind='stable')
+    return [ids[i] for i in order], stars[order].tolist()
+
+
 def predict_star(new_vector, mlp):
     """
     Predict the star rating using the precomputed vector and the trained model.
@@ -229,62 +276,128 @@ def predict_star(new_vector, mlp):
     return predicted_ratings[0]
 
 
+def persian_date(published):
+    date = datetime.datetime.fromtimestamp(int(published))
+    date = pytz.timezone("GMT").localize(date)
+    date = date.astimezone(pytz.timezone("Asia/Tehran"))
+    jdate = jdatetime.datetime.fromgregorian(year=date.year, month=date.month, day=date.day, hour=date.hour,
+                                             minute=date.minute, second=date.second)
+    return str(jdate).translate(str.maketrans('0123456789', '۰۱۲۳۴۵۶۷۸۹'))
+
+
+def serialize_article(thearticle):
+    return {
+        "id": thearticle.public_id,
+        "feed": {"id": thearticle.feed.public_id, "name": thearticle.feed.name, "favicon": proxy_url(thearticle.feed.favicon, 'icon')},
+        "title": thearticle.title,
+        "abstract": thearticle.abstract,
+        "published": persian_date(thearticle.published),
+        "image": proxy_url(thearticle.cover),
+        "link": thearticle.link,
+    }
+
+
+def image_proxy(request, size, signature, encoded):
+    """Resized WebP rendition of an external cover or favicon (see app/image_proxy.py)."""
+    from django.http import FileResponse, Http404, HttpResponseRedirect
+    from app import image_proxy as proxy
+
+    try:
+        url = proxy.decode_url(encoded)
+    except ValueError:
+        raise Http404
+    if not proxy.verify(url, size, signature):
+        raise Http404
+    try:
+        path = proxy.get_image(url, size)
+    except Exception as e:
+        print("Error proxying image:", e)
+        return HttpResponseRedirect(url)
+    response = FileResponse(open(path, 'rb'), content_type='image/webp')
+    response['Cache-Control'] = f'public, max-age={settings.IMAGE_PROXY_MAX_AGE}, immutable'
+    return response
+
+
+@read_only
+def similar_articles(request, id):
+    """"More like this": nearest neighbours of an article in the vector index."""
+    from app.vector_index import get_index, parse_vector
+
+    index = get_index()
+    if index is None:
+        return JsonResponse({'result': []})
+
+    try:
+        pk, text = Article.objects.values_list('id', 'vector').get(public_id=id)
+    except Article.DoesNotExist:
+        return JsonResponse({'error': 'Article not found'}, status=404)
+    vector = index.vector(pk)
+    if vector is None:
+        vector = parse_vector(text)
+    if vector is None or len(vector) != index.dim:
+        return JsonResponse({'result': []})
+
+    try:
+        k = max(1, min(int(request.GET.get('k', 10)), 50))
+    except ValueError:
+        k = 10
+    hits = index.search(vector, k=k, exclude=[pk])
+    articles = Article.objects.select_related('feed').in_bulk([article_id for article_id, _ in hits])
+
+    result = []
+    for article_id, score in hits:
+        if article_id in articles:
+            n = serialize_article(articles[article_id])
+            n["score"] = round(score, 4)
+            result.append(n)
+    return JsonResponse({'result': result})
+
+
+def _page_number(request):
+    try:
+        return max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        return 1
+
+
+def _listing(requests, articles, has_next, page, title):
+    if not articles:
+        return render(requests, "404.html", status=404)
+    return render(requests, "articleList.html", context={
+        "articles": articles,
+        "title": title,
+        "page": page,
+        "previous_page": page - 1 if page > 1 else None,
+        "next_page": page + 1 if has_next else None,
+    })
+
+
+@cached_response
+@read_only
 def topic(requests, topic):
-    article = Article.objects.filter(topic__title=topic)
-    if len(article) == 0:
-        return render(requests, "404.html")
-    article = article[:24]
-    allArticle = []
-    for thearticle in article:
-        n = {}
-        n["id"] = thearticle.id
-        n["feed"] = {"id": thearticle.feed.id, "name": thearticle.feed.name, "favicon": thearticle.feed.favicon}
-        n["title"] = thearticle.title
-        n["abstract"] = thearticle.abstract
-        date = int(thearticle.published)
-        date = datetime.datetime.fromtimestamp(date)
-        date = pytz.timezone("GMT").localize(date)
-        date = date.astimezone(pytz.timezone("Asia/Tehran"))
-        jdate = jdatetime.datetime.fromgregorian(year=date.year, month=date.month, day=date.day, hour=date.hour,
-                                                 minute=date.minute, second=date.second)
-        n["published"] = str(jdate)
-        n["published"] = "".join(list(map(lambda x: x in "1234567890" and "۰۱۲۳۴۵۶۷۸۹"[int(x)] or x, n["published"])))
-        n["image"] = thearticle.cover
-        n["link"] = thearticle.link
-        allArticle.append(n)
-    return render(requests, "articleList.html", context={"article": allArticle})
+    from app.listings import topic_page
 
+    page = _page_number(requests)
+    articles, has_next = topic_page(topic, page, serialize_article)
+    return _listing(requests, articles, has_next, page, topic)
 
+
+@cached_response
+@read_only
 def feed(requests, feed):
-    article = Article.objects.filter(feed__title=feed)
-    if len(article) == 0:
-        return render(requests, "404.html")
-    article = article[:24]
-    allArticle = []
-    for thearticle in article:
-        n = {}
-        n["id"] = thearticle.id
-        n["feed"] = {"id": thearticle.feed.id, "name": thearticle.feed.name, "favicon": thearticle.feed.favicon}
-        n["title"] = thearticle.title
-        n["abstract"] = thearticle.abstract
-        date = int(thearticle.published)
-        date = datetime.datetime.fromtimestamp(date)
-        date = pytz.timezone("GMT").localize(date)
-        date = date.astimezone(pytz.timezone("Asia/Tehran"))
-        jdate = jdatetime.datetime.fromgregorian(year=date.year, month=date.month, day=date.day, hour=date.hour,
-                                                 minute=date.minute, second=date.second)
-        n["published"] = str(jdate)
-        n["published"] = "".join(list(map(lambda x: x in "1234567890" and "۰۱۲۳۴۵۶۷۸۹"[int(x)] or x, n["published"])))
-        n["image"] = thearticle.cover
-        n["link"] = thearticle.link
-        allArticle.append(n)
-    return render(requests, "articleList.html", context={"article": allArticle})
+    from app.listings import feed_page
+
+    page = _page_number(requests)
+    articles, has_next = feed_page(feed, page, serialize_article)
+    return _listing(requests, articles, has_next, page, feed)
 
 
 def E404(requests, slug):
     return render(requests, "404.html")
 
 
+@cached_response
+@read_only
 def search_suggestions(request):
     query = request.GET.get('q', '').strip()
 
@@ -294,53 +407,34 @@ def search_suggestions(request):
     # Search in article titles and get both title and id, ordered by published date
     suggestions = Article.objects.filter(
         Q(title__icontains=query)
-    ).values('title', 'id', 'abstract').order_by('-published')[:5]
+    ).values_list('title', 'public_id', 'abstract').order_by('-published')[:5]
 
     # Convert QuerySet to list of dictionaries
-    suggestions = list(suggestions)
+    suggestions = [{'title': title, 'id': public_id, 'abstract': abstract}
+                   for title, public_id, abstract in suggestions]
 
     return JsonResponse({'suggestions': suggestions})
 
 
+@cached_response
+@read_only
 def search(request):
     query = request.GET.get('q', '').strip()
 
     if not query:
         return redirect('/')
 
+    mode = request.GET.get('mode', settings.SEARCH_DEFAULT_MODE)
+
     # Search in article titles
-    article = Article.objects.filter(
+    lexical_ids = Article.objects.filter(
         Q(title__icontains=query) | Q(abstract__icontains=query)
-    ).order_by('-published')[:24]
+    ).order_by('-published').values_list('id', flat=True)[:24]
 
-    allArticle = []
-    for thearticle in article:
-        n = {}
-        n["id"] = thearticle.id
-        n["feed"] = {"id": thearticle.feed.id, "name": thearticle.feed.name, "favicon": thearticle.feed.favicon}
-
-        n["title"] = thearticle.title
-        n["abstract"] = thearticle.abstract
-        date = int(thearticle.published)
-        date = datetime.datetime.fromtimestamp(date)
-        date = pytz.timezone("GMT").localize(date)
-        date = date.astimezone(pytz.timezone("Asia/Tehran"))
-        jdate = jdatetime.datetime.fromgregorian(
-            year=date.year,
-            month=date.month,
-            day=date.day,
-            hour=date.hour,
-            minute=date.minute,
-            second=date.second
-        )
-        n["published"] = str(jdate)
-        n["published"] = "".join(list(map(
-            lambda x: x in "1234567890" and "۰۱۲۳۴۵۶۷۸۹"[int(x)] or x,
-            n["published"]
-        )))
-        n["image"] = thearticle.cover
-        n["link"] = thearticle.link
-        allArticle.append(n)
+    from app.semantic_search import search_ids
+    ids = search_ids(query, lexical_ids, mode=mode, k=24)
+    found = Article.objects.select_related('feed').in_bulk(ids)
+    allArticle = [serialize_article(found[article_id]) for article_id in ids if article_id in found]
 
     return render(request, "articleList.html", context={
         "articles": allArticle,
@@ -362,7 +456,7 @@ def follow_feed(request):
         return JsonResponse({'error': 'Invalid JSON'}, status=400)
 
     try:
-        feed = Feed.objects.get(id=feed_id)
+        feed = Feed.objects.get(public_id=feed_id)
     except Feed.DoesNotExist:
         return JsonResponse({'error': 'Feed not found'}, status=404)
 
@@ -370,18 +464,26 @@ def follow_feed(request):
 
     if created:
         # User is now following the feed
+        user_stats.add({request.user.pk: {'followed_feeds': 1}})
         return JsonResponse({'status': 'followed', 'feed_id': feed_id})
     else:
         # User was already following, so unfollow
         user_feed.delete()
+        user_stats.add({request.user.pk: {'followed_feeds': -1}})
         return JsonResponse({'status': 'unfollowed', 'feed_id': feed_id})
 
 
-def getArticleContentView(request, url):
-    from app.management.commands.crawler_tool import fetch_and_process_html
-    html_content = fetch_and_process_html(url)
-    html_content.strip()
-    return html_content
+def getArticleContentView(request, id):
+    try:
+        article = Article.objects.get(public_id=id)
+    except Article.DoesNotExist:
+        return HttpResponse(status=404)
+    from app.content_store import get_reader_html
+    try:
+        return HttpResponse(get_reader_html(article))
+    except Exception as e:
+        print("Error fetching article content:", e)
+        return HttpResponse(status=502)
 
 
 def interaction(request):
@@ -394,19 +496,16 @@ def interaction(request):
     try:
         type_req = result["result[type]"][0]
         if type_req == "view":
-            article = Article.objects.get(id=result["result[article]"][0])
+            article = Article.objects.get(public_id=result["result[article]"][0])
             value = float(result["result[value]"][0])
-            interaction = Interaction(article=article, user=user, type="view", value=value)
-            interaction.save()
+            get_buffer().add([event_log.event(user.id, article.id, "view", value)])
         elif type_req == "read":
-            article = Article.objects.get(id=result["result[article]"][0])
+            article = Article.objects.get(public_id=result["result[article]"][0])
             value = float(result["result[value]"][0])
-            interaction = Interaction(article=article, user=user, type="read", value=value)
-            interaction.save()
+            get_buffer().add([event_log.event(user.id, article.id, "read", value)])
         elif type_req == "like":
-            article = Article.objects.get(id=result["result[article]"][0])
-            interaction = Interaction(article=article, user=user, type="like")
-            interaction.save()
+            article = Article.objects.get(public_id=result["result[article]"][0])
+            get_buffer().add([event_log.event(user.id, article.id, "like")])
         elif type_req == "comment":
             pass
         elif type_req == "archive":
@@ -423,3 +522,50 @@ def interaction(request):
     # id = result["result[id]"][0]
     # n = float(result["result[n]"][0])
     # record(username, id, n)
+
+
+BATCH_TYPES = ("view", "read", "like")
+
+
+def interactions(request):
+    """
+    Record a batch of events posted as JSON, e.g. ``[{"type": "view",
+    "article": "<public id>", "value": 12.5}, ...]``.  Article ids are
+    resolved in one query; unknown articles and malformed events are counted
+    as rejected.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    try:
+        events = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if isinstance(events, dict):
+        events = events.get('events')
+    if not isinstance(events, list):
+        return JsonResponse({'error': 'Expected a list of events'}, status=400)
+    if len(events) > settings.INTERACTION_BATCH_MAX:
+        return JsonResponse({'error': f'At most {settings.INTERACTION_BATCH_MAX} events per request'}, status=400)
+
+    parsed = []
+    for event in events:
+        if not isinstance(event, dict) or event.get('type') not in BATCH_TYPES or not event.get('article'):
+            continue
+        value = None
+        if event['type'] != 'like':
+            try:
+                value = float(event.get('value'))
+            except (TypeError, ValueError):
+                continue
+        parsed.append((event['type'], str(event['article']), value))
+
+    known = dict(Article.objects.filter(public_id__in={article_id for _, article_id, _ in parsed})
+                 .values_list('public_id', 'id'))
+    batch = [event_log.event(request.user.id, known[article_id], type_, value)
+             for type_, article_id, value in parsed if article_id in known]
+    get_buffer().add(batch)
+
+    return JsonResponse({'accepted': len(batch), 'rejected': len(events) - len(batch)})
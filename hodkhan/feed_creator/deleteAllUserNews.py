@@ -1,48 +1,14 @@
-import sqlite3
+# Forget every user's feed view history (interactions, aggregates and counters)
+import os
+import sys
 from pathlib import Path
 
+import django
 
-DB_PATH = Path(__file__).resolve().parent.parent.parent / 'db.sqlite3'
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hodkhan.settings')
+django.setup()
 
-conn = sqlite3.connect(DB_PATH)
+from app import event_log  # noqa: E402
 
-# find distinct usernames from app_interaction where type='view'
-rows = conn.execute(
-    "SELECT DISTINCT u.username "
-    "FROM app_interaction i LEFT JOIN auth_user u ON i.user_id = u.id "
-    "WHERE i.type = 'view'",
-)
-
-for row in rows:
-    username = row[0]
-    if not username:
-        continue
-    sql = (
-        "DELETE FROM app_interaction WHERE user_id IN (SELECT id FROM auth_user "
-        "WHERE username = ?) AND type = 'view'"
-    )
-    conn.execute(sql, (username,))
-
-conn.commit()
-conn.close()
-
-
-# import sqlite3
-
-
-# tables = ["""CREATE TABLE Viewed
-# (username TEXT NOT NULL,
-# newsId TEXT NOT NULL);""",
-# """CREATE TABLE Interests
-# (username TEXT NOT NULL,
-# interest TEXT NOT NULL);"""]
-
-# connection_obj = sqlite3.connect('./Database.db')
- 
-# # cursor object
-# cursor_obj = connection_obj.cursor()
-# for table in tables:
- 
-#     cursor_obj.execute(table)
-     
-# connection_obj.close()
+event_log.forget_views()
@@ -1,29 +1,21 @@
-import sqlite3
+import os
+import sys
 from pathlib import Path
-import datetime
 
+import django
 
-DB_PATH = Path(__file__).resolve().parent.parent.parent / 'db.sqlite3'
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hodkhan.settings')
+django.setup()
 
+from django.contrib.auth import get_user_model  # noqa: E402
 
-def record(username, news_id, n):
+from app import event_log  # noqa: E402
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
 
+def record(username, news_id, n):
     # Resolve user id from username if possible
-    try:
-        cursor.execute("SELECT id FROM auth_user WHERE username = ?", (username,))
-        uid = cursor.fetchone()
-        user_id = uid[0] if uid else None
-    except Exception:
-        user_id = None
-
-    created_at = datetime.datetime.utcnow().isoformat()
-    sql = (
-        "INSERT INTO app_interaction (user_id, article_id, type, star, is_trained, created_at, value)"
-        "\nVALUES (?, ?, 'view', ?, 0, ?, ?)"
-    )
-    cursor.execute(sql, (user_id, news_id, n, created_at, None))
-    conn.commit()
-    conn.close()
+    user_id = get_user_model().objects.filter(username=username).values_list('id', flat=True).first()
+    if user_id is None:
+        return
+    event_log.append([event_log.event(user_id, news_id, 'view', n)])
@@ -6,13 +6,25 @@ from sklearn.metrics import mean_squared_error
 from typing import Optional
 import pandas as pd
 import numpy as np
-import sqlite3
+import django
 import signal
 import pickle
 import time
 import math
+import os
+import sys
 from pathlib import Path
 
+# Run against the project's configured database through Django
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hodkhan.settings')
+django.setup()
+
+from django.db import close_old_connections  # noqa: E402
+
+from app.archive import dequantize  # noqa: E402
+from app.models import ArchivedAggregate, InteractionAggregate  # noqa: E402
+
 class TimeoutException(Exception):
     pass
 
@@ -90,32 +102,27 @@ def interest_score(
 
 
 def regression():
-    # use the project's main sqlite DB instead of the local Database.db
-    DB_PATH = Path(__file__).resolve().parent.parent / 'db.sqlite3'
-    conn = sqlite3.connect(DB_PATH)
-    # Read interactions of type 'view' and map them to the legacy Viewed schema
-    # We'll produce a DataFrame with columns: username, newsId, star, isTrained
-    interactions_q = (
-        "SELECT i.id, u.username as username, i.article_id as newsId, "
-        "i.is_trained as isTrained, i.type as type, i.value as value, i.created_at as created, n.vector "  # Removed 'cc'
-        "FROM app_interaction i "
-        "LEFT JOIN auth_user u ON i.user_id = u.id "
-        "LEFT JOIN app_article n ON i.article_id = n.id "
-        # "WHERE i.type = 'view'"
-    )
+    # One compacted row per (user, article), see app/event_log.py
+    columns = ['username', 'newsId', 'isTrained', 'liked', 'read', 'view', 'vector']
+    rows = InteractionAggregate.objects.values_list(
+        'user__username', 'article_id', 'is_trained', 'liked', 'read', 'view', 'article__vector')
+
+    # Engagement with archived articles stays in the training data, with their dequantized vectors
+    archived = ArchivedAggregate.objects.values_list(
+        'user__username', 'article_id', 'liked', 'read', 'view', 'article__vector', 'article__vector_scale')
 
     try:
-        user_news_df = pd.read_sql_query(interactions_q, conn)
-        news_df = pd.read_sql_query("SELECT * FROM app_article", conn)
+        user_news_df = pd.DataFrame.from_records(rows.iterator(chunk_size=2000), columns=columns)
+        archived_df = pd.DataFrame.from_records(
+            ((username, article_id, True, liked, read, view, dequantize(vector, scale))
+             for username, article_id, liked, read, view, vector, scale in archived.iterator(chunk_size=2000)),
+            columns=columns)
+        user_news_df = pd.concat([user_news_df, archived_df], ignore_index=True)
     except Exception as e:
         print(f"\033[31mDatabase error: {e}\033[0m")
         return
 
-    # build distinct usernames list
-    if 'username' in user_news_df.columns:
-        usernames = user_news_df['username'].dropna().unique().tolist()
-    else:
-        usernames = []
+    usernames = user_news_df['username'].dropna().unique().tolist()
 
     for username in usernames:
         user_entries = user_news_df[user_news_df['username'] == username]
@@ -129,50 +136,14 @@ def regression():
             )
             continue
 
-
-
-        # mark entries as not trained before training
-        conn.execute(
-            "UPDATE app_interaction SET is_trained = 0 WHERE type = 'view' "
-            "AND user_id IN (SELECT id FROM auth_user WHERE username = ?)",
-            (username,),
-        )
-
-        news_ids_to_train = user_entries['newsId'].dropna().unique()
-        valid_news_ids = news_df['id'].unique()
-
-
-
-        user_news_df_filtered = (
-            user_entries[user_entries['newsId'].isin(valid_news_ids)]
-        )
-
-        
-        # deduplicate keeping last  
-        user_news_df_filtered = (
-            user_news_df_filtered.sort_values(by='created')
-            .drop_duplicates(subset=['username', 'newsId', "type"], keep='last')
-        )
-
-        # Select only id and vector from news_df to avoid column conflicts during merge
-        filtered_news_df = news_df.loc[news_df['id'].isin(news_ids_to_train), ['id', 'vector']]
-
-        if filtered_news_df.empty or user_news_df_filtered.empty:
-            print(f"\033[31mNot enough data to train for {username}\033[0m")
-            continue
-
-        # user_news_df_filtered already has a vector column, we don't need to merge it again.
-        # Let's just use the vectors from user_news_df_filtered.
-        # We need to group by newsId to get one vector per news item.
-        merged_df = user_news_df_filtered.drop_duplicates(subset=['newsId']).copy()
-
-
         # Filter out rows with NULL vectors and convert vectors to numpy arrays
-        merged_df = merged_df.dropna(subset=['vector'])
+        merged_df = user_entries.dropna(subset=['vector'])
         try:
             # Convert vector strings to numpy arrays
             def convert_vector(vec_str):
                 try:
+                    if isinstance(vec_str, np.ndarray):
+                        return vec_str
                     if not isinstance(vec_str, str):
                         return None
                     # Clean the string and split
@@ -182,52 +153,30 @@ def regression():
                 except:
                     return None
 
-            # Apply conversion and show debug info
             print("Processing vectors for", username)
-            print("Vector column type:", merged_df['vector'].dtype)
-            # print("First vector raw:", merged_df['vector'].iloc[0] if not merged_df.empty else "No data")
-            
             X_vectors = merged_df['vector'].apply(convert_vector)
-            X_vectors = X_vectors[X_vectors.notna()]
-            
+            valid = X_vectors.notna()
+            X_vectors, merged_df = X_vectors[valid], merged_df[valid]
+
             if len(X_vectors) == 0:
                 print(f"\033[31mNo valid vectors found for {username}\033[0m")
                 continue
-            
+
             # Stack vectors into array
             X = np.vstack(X_vectors.values)
             print(f"Processed {len(X_vectors)} vectors with shape {X.shape}")
-            
-            # Update news_ids_to_train to match filtered data
-            news_ids_to_train = merged_df['newsId'].values
 
         except Exception as e:
             print(f"\033[31mError processing vectors for {username}:\033[0m")
             print(f"Error details: {str(e)}")
-            # print(f"Vector sample: {merged_df['vector'].iloc[0] if not merged_df.empty else 'No data'}")
             continue
 
-        # Calculate interest scores for each news item
-        y = []
-        for news_id in news_ids_to_train:
-            # Get interactions for this news
-            news_interactions = user_news_df_filtered[user_news_df_filtered['newsId'] == news_id]
-            
-            # Get like status (1 if like interaction exists, 0 otherwise)
-            like = 1 if 'like' in news_interactions['type'].values else 0
-            
-            # Get read time (value if read interaction exists, 0 otherwise)
-            read_interaction = news_interactions[news_interactions['type'] == 'read']
-            R = float(read_interaction['value'].iloc[0]) if not read_interaction.empty else 0.0
-            
-            # Get view time (value if view interaction exists, 0 otherwise) 
-            view_interaction = news_interactions[news_interactions['type'] == 'view']
-            F = float(view_interaction['value'].iloc[0]) if not view_interaction.empty else 0.0
-            
-            # Calculate interest score
-            score = interest_score(like=like, R=R, F=F)
-            y.append(score)
-
+        # Interest score per article from its aggregate: like flag, latest read and feed dwell times
+        y = [
+            interest_score(like=int(bool(row.liked)), R=0.0 if pd.isna(row.read) else float(row.read),
+                           F=0.0 if pd.isna(row.view) else float(row.view))
+            for row in merged_df.itertuples()
+        ]
         y = np.array(y)
 
         # Ensure we have enough data to split for training and testing
@@ -251,12 +200,8 @@ def regression():
         mse = mean_squared_error(y_test, y_pred)
         print(f"\033[32m{username} Mean Squared Error: {mse}\033[0m")
 
-        # mark interactions as trained for this user
-        conn.execute(
-            "UPDATE app_interaction SET is_trained = 1 WHERE type = 'view' "
-            "AND user_id IN (SELECT id FROM auth_user WHERE username = ?)",
-            (username,),
-        )
+        # mark aggregates as trained for this user
+        InteractionAggregate.objects.filter(user__username=username).update(is_trained=True)
 
         # Ensure the pickles directory exists before saving the model
         pickles_dir = Path(__file__).resolve().parent.parent / 'pickles'
@@ -278,7 +223,8 @@ if __name__ == "__main__":
         try:
             signal.signal(signal.SIGALRM, timeout_handler)
             signal.alarm(60)
-            
+
+            close_old_connections()
             regression()
 
             signal.alarm(0)
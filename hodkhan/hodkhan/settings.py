@@ -62,6 +62,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     # 'allauth.account.middleware.AccountMiddleware',
 ]
 
@@ -88,10 +89,73 @@ WSGI_APPLICATION = 'hodkhan.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
+# SQLite by default. DB_ENGINE=postgres switches to PostgreSQL with a pool of persistent
+# connections per process (needs `pip install "psycopg[binary,pool]"`).
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'hodkhan'),
+            'USER': os.environ.get('DB_USER', 'hodkhan'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN', 2)),
+                    'max_size': int(os.environ.get('DB_POOL_MAX', 10)),
+                    'timeout': 10,
+                },
+            },
+        }
+    }
+    if os.environ.get('DB_READ_HOST'):
+        # Streaming replica for views wrapped in app.databases.read_only
+        DATABASES['readonly'] = {**DATABASES['default'], 'HOST': os.environ['DB_READ_HOST'],
+                                 'TEST': {'MIRROR': 'default'}}
+else:
+    SQLITE_PATH = Path(os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'))
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': SQLITE_PATH,
+            'OPTIONS': {
+                # Writers wait up to `timeout` seconds for the lock, and take it when the transaction
+                # starts instead of failing when a read transaction tries to upgrade
+                'timeout': 20,
+                'transaction_mode': 'IMMEDIATE',
+            },
+        },
+        # Same file opened read-only, for views wrapped in app.databases.read_only
+        'readonly': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': f'{SQLITE_PATH.resolve().as_uri()}?mode=ro',
+            'OPTIONS': {'timeout': 20},
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+
+# Applied to every SQLite connection (see app/databases.py). WAL lets readers proceed while the
+# crawler writes; synchronous=NORMAL is durable in WAL mode except for the last commits on power loss
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,  # KiB, i.e. 64 MB per connection
+    'temp_store': 'MEMORY',
+}
+
+DATABASE_ROUTERS = ['app.databases.ReadOnlyRouter']
+
+# Local file cache by default; point CACHE_BACKEND/CACHE_LOCATION at a shared backend
+# (e.g. django.core.cache.backends.redis.RedisCache, redis://...) when running several hosts
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache')),
     }
 }
 
@@ -167,3 +231,61 @@ X_FRAME_OPTIONS = 'SAMEORIGIN'
 XS_SHARING_ALLOWED_METHODS = ['POST', 'GET', 'OPTIONS', 'PUT', 'DELETE']
 
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 10240  # higher than the count of fields
+
+# Approximate nearest-neighbour index over recent article vectors (see app/vector_index.py)
+VECTOR_INDEX_DIR = BASE_DIR / 'vector_index'
+VECTOR_INDEX_DAYS = 7
+
+# Articles older than this many days move to the archive tables (see app/archive.py)
+ARTICLE_RETENTION_DAYS = int(os.environ.get('ARTICLE_RETENTION_DAYS', 30))
+
+# Agency API keys are cached per process for this many seconds, and each
+# agency may burst this many requests, refilled at the given rate
+# (see news_api/authentication.py)
+API_KEY_CACHE_TTL = 60
+AGENCY_RATE_PER_SECOND = float(os.environ.get('AGENCY_RATE_PER_SECOND', 5))
+AGENCY_RATE_BURST = int(os.environ.get('AGENCY_RATE_BURST', 100))
+
+EMBEDDING_MODEL_PATH = os.environ.get('EMBEDDING_MODEL_PATH', './EmbeddingGemma')
+
+# Search mode when the request does not pass ?mode=: lexical, semantic or hybrid.
+# Hybrid only when the embedding model is installed: the first semantic query
+# makes every worker load it.
+SEARCH_DEFAULT_MODE = os.environ.get(
+    'SEARCH_DEFAULT_MODE', 'hybrid' if os.path.isdir(EMBEDDING_MODEL_PATH) else 'lexical')
+# Semantic search falls back to lexical results past this many milliseconds
+SEMANTIC_SEARCH_BUDGET_MS = 150
+
+# Anonymous list/search responses are cached this many seconds (see app/response_cache.py)
+RESPONSE_CACHE_TIMEOUT = 60
+
+# Interaction events are appended to the event log every N events or T milliseconds (see app/interaction_buffer.py)
+# and folded into aggregates by `manage.py compact_interactions` (see app/event_log.py)
+INTERACTION_LOG_DIR = BASE_DIR / 'interaction_log'
+INTERACTION_BUFFER_SIZE = 200
+INTERACTION_FLUSH_MS = 500
+INTERACTION_BATCH_MAX = 500
+
+# Cached topic/feed listing pages expire after this many seconds even without new articles (see app/listings.py)
+LISTING_CACHE_TIMEOUT = 3600
+
+# Pickled TF-IDF vectorizer and classifier that assign article topics (see app/topics.py)
+TOPIC_MODEL_DIR = BASE_DIR / 'app' / 'management' / 'commands' / 'models' / 'hazm'
+
+# Near-duplicate story clustering at ingestion (see app/stories.py)
+STORY_SIMILARITY = 0.92
+STORY_WINDOW_HOURS = 12
+
+# Extracted reader HTML is served from the DB and revalidated against the source after this many seconds
+READER_CONTENT_MAX_AGE = 6 * 3600
+
+# Shared outbound HTTP client (see app/http_client.py)
+HTTP_TIMEOUT = (5, 15)  # connect, read seconds
+HTTP_MAX_BYTES = 5 * 1024 * 1024
+HTTP_POOL_MAXSIZE = 10
+HTTP_RETRIES = 2
+
+# Resized WebP covers/favicons served by the image proxy (see app/image_proxy.py)
+IMAGE_CACHE_DIR = BASE_DIR / 'image_cache'
+IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+IMAGE_PROXY_MAX_AGE = 365 * 86400
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class NewsApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "news_api"
+
+    def ready(self):
+        from news_api import authentication  # noqa: F401  (key cache invalidation signals)
@@ -0,0 +1,101 @@
+"""
+Agency API key authentication and per-agency rate limiting.
+
+Every worker keeps the SHA-256 hashes of the active keys in memory and
+looks the presented key's hash up there, so an authenticated request costs
+no database round trip.  The table is reloaded after ``API_KEY_CACHE_TTL``
+seconds, or as soon as an ``AgencyKey`` is saved or deleted: the signal
+handlers drop this process's copy and bump a version in the shared cache
+that the other workers compare against.
+
+``AgencyRateThrottle`` gives each agency a token bucket kept in the shared
+cache: ``AGENCY_RATE_BURST`` requests at once, refilled at
+``AGENCY_RATE_PER_SECOND``.  Buckets are read and written without a lock,
+so concurrent requests may occasionally get one token more than the limit.
+
+Both rely on the default cache being shared by every worker: the file-based
+``CACHES`` default or the configured shared backend (the ``app.W001`` check
+flags a process-local one).
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.throttling import BaseThrottle
+
+from .models import AgencyKey
+
+VERSION_KEY = 'agency_keys:version'
+
+_keys = None  # (expires_at, version, {key hash: (id, name)})
+_keys_lock = threading.Lock()
+
+
+def hash_key(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def active_keys():
+    """``{key hash: (id, name)}`` of the active agencies, reloaded when stale; the keys themselves are not kept."""
+    global _keys
+    version = cache.get(VERSION_KEY, 0)
+    with _keys_lock:
+        if _keys is None or _keys[0] <= time.monotonic() or _keys[1] != version:
+            agencies = AgencyKey.objects.filter(active=True).values_list('key', 'id', 'name')
+            _keys = (time.monotonic() + settings.API_KEY_CACHE_TTL, version,
+                     {hash_key(key): (pk, name) for key, pk, name in agencies})
+        return _keys[2]
+
+
+@receiver(post_save, sender=AgencyKey)
+@receiver(post_delete, sender=AgencyKey)
+def invalidate_keys(**kwargs):
+    global _keys
+    with _keys_lock:
+        _keys = None
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+class APIKeyAuthentication(BaseAuthentication):
+    def authenticate(self, request):
+        key = request.headers.get('Authentication')
+        if not key:
+            raise AuthenticationFailed('No API key provided')
+
+        agency = active_keys().get(hash_key(key))
+        if agency is None:
+            raise AuthenticationFailed('Invalid API key')
+        # A fresh instance per request, so nothing cached on it is shared between threads
+        pk, name = agency
+        return (AgencyKey(pk=pk, name=name, active=True), None)
+
+
+class AgencyRateThrottle(BaseThrottle):
+    def allow_request(self, request, view):
+        if not isinstance(request.user, AgencyKey):
+            return True
+        rate, burst = settings.AGENCY_RATE_PER_SECOND, settings.AGENCY_RATE_BURST
+        key = f'ratelimit:agency:{request.user.pk}'
+        now = time.time()
+        tokens, updated = cache.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        else:
+            self._wait = (1 - tokens) / rate
+        # An untouched bucket is full again after burst / rate seconds
+        cache.set(key, (tokens, now), int(burst / rate) + 1)
+        return allowed
+
+    def wait(self):
+        return getattr(self, '_wait', None)
@@ -0,0 +1,18 @@
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news_api', '0002_remove_keywordtable_foruser_keywordtable_agency'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='keywordtable',
+            name='id',
+            field=models.CharField(default=uuid.uuid4, editable=False, max_length=36, primary_key=True, serialize=False),
+        ),
+    ]
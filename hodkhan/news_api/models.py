@@ -26,7 +26,7 @@ class AgencyKey(models.Model):
 
 
 class KeyWordTable(models.Model):
-    id = models.CharField(max_length=15, primary_key=True, default=uuid4, editable=False)
+    id = models.CharField(max_length=36, primary_key=True, default=uuid4, editable=False)
     agency = models.OneToOneField(AgencyKey, on_delete=models.CASCADE, related_name='keyword_table')
     words = models.ManyToManyField(SearchKeyWord)
 
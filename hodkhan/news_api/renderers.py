@@ -0,0 +1,19 @@
+from rest_framework.renderers import BaseRenderer
+
+from app.streaming import NDJSON, dumps
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline-delimited JSON (``?format=ndjson`` or ``Accept: application/x-ndjson``).
+    List views stream their rows themselves (see app/streaming.py); this
+    renders everything else, e.g. errors, one object per line.
+    """
+    media_type = NDJSON
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(dumps(row) + '\n' for row in rows).encode()
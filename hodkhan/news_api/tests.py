@@ -1,3 +1,82 @@
-from django.test import TestCase
+import gzip
+import json
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from app.models import Article, Feed, Keyword
+from app.response_cache import PROCESS_LOCAL_CACHES
+from news_api.authentication import VERSION_KEY, active_keys
+from news_api.models import AgencyKey, KeyWordTable, SearchKeyWord
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.agency = AgencyKey.objects.create(name='ایرنا')
+        KeyWordTable.objects.create(agency=self.agency).words.add(SearchKeyWord.objects.create(text='خبر'))
+        feed = Feed.objects.create(name='ایسنا', address='http://example.com/rss', favicon='', type='rss')
+        sport = Keyword.objects.create(name='ورزش')
+        self.articles = [Article.objects.create(title=f'خبر {i}', abstract='', feed=feed, link=str(i), published=i)
+                         for i in range(4)]
+        Article.objects.create(title='other', abstract='', feed=feed, link='x', published=5)
+        for article in self.articles[2:]:
+            article.keyword.add(sport)
+
+    def _export(self, **params):
+        response = self.client.get('/news_api/export/', params, HTTP_AUTHENTICATION=self.agency.key,
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        return [json.loads(line) for line in gzip.decompress(b''.join(response.streaming_content)).splitlines()]
+
+    def test_export_resumes_from_the_cursor(self):
+        rows = self._export(since=1, limit=2)
+        self.assertEqual([row['id'] for row in rows], [a.public_id for a in self.articles[1:3]])
+        rows = self._export(since=1, cursor=rows[-1]['cursor'])
+        self.assertEqual([(row['link'], row['topics']) for row in rows], [('3', ['ورزش'])])
+        self.assertEqual([row['link'] for row in self._export(topic='ورزش')], ['2', '3'])
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.client.get('/news_api/export/').status_code, 403)
+        response = self.client.get('/news_api/export/', {'since': 'x'}, HTTP_AUTHENTICATION=self.agency.key)
+        self.assertEqual(response.status_code, 400)
+
+
+class ApiKeyAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.agency = AgencyKey.objects.create(name='ایرنا')
+        KeyWordTable.objects.create(agency=self.agency)
+
+    def _get(self):
+        return self.client.get('/news_api/export/', HTTP_AUTHENTICATION=self.agency.key)
+
+    def test_keys_are_cached_until_changed(self):
+        self.assertEqual(self._get().status_code, 200)
+        with CaptureQueriesContext(connections['default']) as queries:
+            self.assertEqual(self._get().status_code, 200)
+        self.assertFalse([q for q in queries if 'news_api_agencykey' in q['sql']])
+        self.assertNotIn(self.agency.key, repr(active_keys()))
+        self.agency.active = False
+        self.agency.save()
+        self.assertEqual(self._get().status_code, 403)
+
+    def test_changes_reach_other_workers(self):
+        # A separately built backend stands in for another worker's cache
+        self.assertNotIn(settings.CACHES['default']['BACKEND'], PROCESS_LOCAL_CACHES)
+        other_worker = caches.create_connection('default')
+        before = other_worker.get(VERSION_KEY)
+        self.agency.save()
+        self.assertNotEqual(other_worker.get(VERSION_KEY), before)
+        self._get()
+        self.assertIsNotNone(other_worker.get(f'ratelimit:agency:{self.agency.pk}'))
+
+    @override_settings(AGENCY_RATE_BURST=2, AGENCY_RATE_PER_SECOND=0.01)
+    def test_agencies_are_rate_limited(self):
+        self.assertEqual([self._get().status_code for _ in range(3)], [200, 200, 429])
+        other = AgencyKey.objects.create(name='ایسنا')
+        KeyWordTable.objects.create(agency=other)
+        response = self.client.get('/news_api/export/', HTTP_AUTHENTICATION=other.key)
+        self.assertEqual(response.status_code, 200)
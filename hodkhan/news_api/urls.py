@@ -1,8 +1,11 @@
 from django.urls import path
-from .views import GetFeedView, AddKeywordsView, Search
+from app.databases import read_only
+from app.response_cache import cached_response
+from .views import GetFeedView, ExportView, AddKeywordsView, Search
 
 urlpatterns = [
     path('get_feed/', GetFeedView.as_view()),
+    path('export/', read_only(ExportView.as_view()), name='export'),
     path('add_keywords/', AddKeywordsView.as_view(), name='add-keywords'),
-    path('search/', Search.as_view()),
+    path('search/', cached_response(read_only(Search.as_view()), anonymous_only=False)),
 ]
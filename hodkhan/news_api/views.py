@@ -2,14 +2,17 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.pagination import PageNumberPagination 
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
 from django.db.models import Q
 from django.db import transaction
 from .models import KeyWordTable, SearchKeyWord
 
 from app.models import Article
-from rest_framework.authentication import BaseAuthentication
-from rest_framework.exceptions import AuthenticationFailed
-from .models import AgencyKey
+from app.stories import collapse_stories, collapse_queryset
+from app.streaming import accepts_gzip, iterate, ndjson_response, stream_rows
+from .authentication import AgencyRateThrottle, APIKeyAuthentication
+from .renderers import NDJSONRenderer
 import datetime
 import pytz
 import jdatetime
@@ -60,22 +63,36 @@ def convert_timestamp_to_jalali(timestamp):
     )
     return jdt.strftime("%Y-%m-%d %H:%M:%S") 
 
-# Agency authentication
-class APIKeyAuthentication(BaseAuthentication):
-    def authenticate(self, request):
-        key = request.headers.get('Authentication')
-        if not key:
-            raise AuthenticationFailed('No API key provided')
 
+def serialize_article(a):
+    published_jalali = None
+    if a.published is not None:
         try:
-            agency = AgencyKey.objects.get(key=key, active=True)
-            return (agency, None)
-        except AgencyKey.DoesNotExist:
-            raise AuthenticationFailed('Invalid API key')
+            published_jalali = convert_timestamp_to_jalali(a.published)
+        except (ValueError, OSError, OverflowError):
+            published_jalali = None
+
+    article_feed = a.feed
+
+    return {
+        "title": a.title,
+        "link": a.link,
+        "abstract": a.abstract,
+        "cover": a.cover,
+        "published": published_jalali,
+        "feed": {"name": article_feed.name, "icon": article_feed.favicon}
+    }
+
+
+def wants_stream(request):
+    """Bulk clients asking for NDJSON get every match streamed instead of one page."""
+    return request.accepted_renderer.format == NDJSONRenderer.format
 
 # Search Key words
 class GetFeedView(APIView):
     authentication_classes = [APIKeyAuthentication] # Authentication via APIKeyAuth class
+    throttle_classes = [AgencyRateThrottle]
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
     def get(self, request):
         agency = request.user
 
@@ -91,37 +108,70 @@ class GetFeedView(APIView):
             title_q = build_whole_word_query('title', words)
             abstract_q = build_whole_word_query('abstract', words)
             articles = Article.objects.filter(title_q | abstract_q).distinct()
+            if request.query_params.get('collapse') == '1':
+                articles = collapse_queryset(articles)
+            if wants_stream(request):
+                return stream_rows(request, map(serialize_article, iterate(articles.select_related('feed'))),
+                                   key='articles')
             paginator = PageNumberPagination()
             paginated_articles = paginator.paginate_queryset(articles, request)
 
             # Serialize data
-            data = []
-            for a in paginated_articles:
-                published_jalali = None
-                if a.published is not None:
-                    try:
-                        published_jalali = convert_timestamp_to_jalali(a.published)
-                    except (ValueError, OSError, OverflowError):
-                        published_jalali = None
-                
-                article_feed = a.feed
-
-                data.append({
-                    "title": a.title,
-                    "link": a.link,
-                    "abstract": a.abstract,
-                    "cover": a.cover,
-                    "published": published_jalali,
-                    "feed": {"name": article_feed.name, "icon": article_feed.favicon}
-                })
+            data = [serialize_article(a) for a in paginated_articles]
             return paginator.get_paginated_response({"articles": data})
         except KeyWordTable.DoesNotExist:
             return Response({"error": "User not found"}, status=404)
 
 
+class ExportView(APIView):
+    """
+    Every article matching the agency's keywords published at or after
+    ``?since=`` (unix seconds), in one NDJSON response streamed in key order
+    and gzip-compressed when the client accepts it.  Each row carries a
+    ``cursor``: passing the last one received back as ``?cursor=`` resumes
+    an interrupted export, or on the next sync returns only articles added
+    since.  ``?topic=`` (repeatable) narrows the export to topics through the
+    article-keyword table and ``?limit=`` caps the number of rows.
+    """
+    authentication_classes = [APIKeyAuthentication]
+    throttle_classes = [AgencyRateThrottle]
+    renderer_classes = [NDJSONRenderer, JSONRenderer]
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            cursor = int(request.query_params.get('cursor', 0))
+            limit = int(request.query_params['limit']) if 'limit' in request.query_params else None
+        except ValueError:
+            return Response({"error": "'since', 'cursor' and 'limit' must be integers"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            words = list(request.user.keyword_table.words.values_list('text', flat=True))
+        except KeyWordTable.DoesNotExist:
+            return Response({"error": "No keywords configured for your agency"}, status=404)
+        if not words:
+            return ndjson_response([])
+
+        articles = Article.objects.filter(published__gte=since, id__gt=cursor)
+        topics = request.query_params.getlist('topic')
+        if topics:
+            links = Article.keyword.through.objects.filter(keyword__name__in=topics)
+            articles = articles.filter(id__in=links.values('article_id'))
+        articles = articles.filter(build_whole_word_query('title', words) | build_whole_word_query('abstract', words))
+        articles = articles.select_related('feed').prefetch_related('keyword').order_by('id')[:limit]
+
+        def row(a):
+            return {"id": a.public_id, "cursor": a.id, "timestamp": a.published,
+                    "topics": [k.name for k in a.keyword.all()], **serialize_article(a)}
+
+        return ndjson_response(map(row, iterate(articles)), gzip=accepts_gzip(request))
+
+
 # Append Key words for a user
 class AddKeywordsView(APIView):
     authentication_classes = [APIKeyAuthentication]
+    throttle_classes = [AgencyRateThrottle]
 
     def post(self, request):
         agency = request.user
@@ -174,6 +224,8 @@ class AddKeywordsView(APIView):
 
 # Search Key words
 class Search(APIView):
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
+
     def get(self, request):
         query_word = request.query_params.get('q', '').strip()
 
@@ -186,27 +238,28 @@ class Search(APIView):
         articles = Article.objects.filter(
                 Q(title__icontains=query_word) | Q(abstract__icontains=query_word)
             )
-        print(len(articles))
+
+        collapse = request.query_params.get('collapse') == '1'
+        mode = request.query_params.get('mode', 'lexical')
+        if mode in ('semantic', 'hybrid'):
+            # Rank a bounded candidate set; pagination then runs over the ranked list
+            from app.semantic_search import search_ids
+            lexical_ids = articles.order_by('-published').values_list('id', flat=True)[:100]
+            ids = search_ids(query_word, lexical_ids, mode=mode, k=100)
+            if collapse:
+                ids = collapse_stories(ids)
+            found = Article.objects.select_related('feed').in_bulk(ids)
+            articles = [found[article_id] for article_id in ids if article_id in found]
+        elif collapse:
+            articles = collapse_queryset(articles)
+
+        if wants_stream(request):
+            if not isinstance(articles, list):
+                articles = iterate(articles.select_related('feed').order_by('-published'))
+            return stream_rows(request, map(serialize_article, articles), key='articles')
+
         paginator = PageNumberPagination()
 
         paginated_articles = paginator.paginate_queryset(articles, request)
-        data = []
-        for a in paginated_articles:
-            published_jalali = None
-            if a.published is not None:
-                try:
-                    published_jalali = convert_timestamp_to_jalali(a.published)
-                except (ValueError, OSError, OverflowError):
-                    published_jalali = None
-            
-            article_feed = a.feed
-
-            data.append({
-                "title": a.title,
-                "link": a.link,
-                "abstract": a.abstract,
-                "cover": a.cover,
-                "published": published_jalali,
-                "feed": {"name": article_feed.name, "icon": article_feed.favicon}
-            })
+        data = [serialize_article(a) for a in paginated_articles]
         return paginator.get_paginated_response({"articles": data})
\ No newline at end of file